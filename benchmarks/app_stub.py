@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная заглушка приложения Uniswap: записанная страница позиции и ответы ее API
+
+  python3 benchmarks/app_stub.py --port 8548 --api-delay 0.3 --render-delay 3
+  python3 uniswap_analyzer.py -p 59044 --base-url http://127.0.0.1:8548 --network-capture
+
+/positions/v3/unichain/<номер> отдает оболочку приложения (benchmarks/app/position.html),
+которая запрашивает данные позиции (POST /v1/graphql) и курсы (GET /api/prices) и
+отрисовывает их через --render-delay секунд после ответов. Ответы API берутся из
+benchmarks/app/responses.json ("МЕТОД /путь" -> тело, {position} заменяется номером
+позиции) и отдаются через --api-delay секунд. Так можно сравнить перехват ответов
+сети (--network-capture) с ожиданием отрисовки без сети и app.uniswap.org.
+"""
+
+import argparse
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+POSITION_PATH_PREFIX = '/positions/v3/unichain/'
+
+
+def make_handler(page, responses, api_delay=0.0, render_delay=0.0, counter=None):
+    counter = counter if counter is not None else {}
+    # Задержка отрисовки передается странице до ее скрипта
+    page = page.replace('<script>', f'<script>window.RENDER_DELAY_MS = {int(render_delay * 1000)};</script>\n<script>', 1)
+
+    class AppStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def reply(self, status, body, content_type):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_request(self, method):
+            url = urlparse(self.path)
+            key = f"{method} {url.path}"
+            counter[key] = counter.get(key, 0) + 1
+            if method == 'POST':
+                length = int(self.headers.get('Content-Length') or 0)
+                request = json.loads(self.rfile.read(length) or b'{}')
+                position = str((request.get('variables') or {}).get('tokenId', ''))
+            else:
+                position = url.path[len(POSITION_PATH_PREFIX):] if url.path.startswith(POSITION_PATH_PREFIX) else ''
+
+            if method == 'GET' and url.path.startswith(POSITION_PATH_PREFIX):
+                return self.reply(200, page, 'text/html; charset=utf-8')
+            if key in responses:
+                time.sleep(api_delay)
+                body = json.dumps(responses[key]).replace('{position}', position)
+                return self.reply(200, body, 'application/json')
+            return self.reply(404, json.dumps({'error': f'неизвестный путь {url.path}'}), 'application/json')
+
+        def do_GET(self):
+            self.handle_request('GET')
+
+        def do_POST(self):
+            self.handle_request('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return AppStubHandler
+
+
+def start_stub(host='127.0.0.1', port=0, api_delay=0.0, render_delay=0.0, counter=None):
+    """
+    Создает сервер заглушки (port=0 - любой свободный порт). Возвращает ThreadingHTTPServer
+    """
+    with open(os.path.join(APP_DIR, 'position.html'), 'r', encoding='utf-8') as f:
+        page = f.read()
+    with open(os.path.join(APP_DIR, 'responses.json'), 'r', encoding='utf-8') as f:
+        responses = json.load(f)
+    return ThreadingHTTPServer((host, port), make_handler(page, responses, api_delay, render_delay, counter))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка приложения Uniswap с записанными ответами API')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8548, help='Порт (по умолчанию: 8548)')
+    parser.add_argument('--api-delay', type=float, default=0.0,
+                        help='Задержка ответов API, секунд (по умолчанию: 0)')
+    parser.add_argument('--render-delay', type=float, default=0.0,
+                        help='Задержка отрисовки страницы после ответов API, секунд (по умолчанию: 0)')
+    args = parser.parse_args()
+
+    counter = {}
+    server = start_stub(args.host, args.port, args.api_delay, args.render_delay, counter)
+    print(f"Заглушка приложения: http://{args.host}:{server.server_address[1]} "
+          f"(страница позиции: {POSITION_PATH_PREFIX}<номер>)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Обслужено запросов: {counter}")
+
+
+if __name__ == "__main__":
+    main()
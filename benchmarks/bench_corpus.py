@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк разбора сохраненных страниц (без браузера)
+
+Прогоняет корпус сохраненных страниц (benchmarks/corpus или любая папка с .html
+и .html.gz, например снимки страниц анализатора из debug_snapshots/objects/..)
+через полный офлайн-разбор: построение снимка из HTML и извлечение размера
+позиции и курса ETH. Для каждой страницы выводит время
+разбора, скорость в МБ/с, пиковую память и точность относительно expected.json.
+
+Формат expected.json: {"файл.html": {"position_usd": 93676.56, "eth_rate": 2395.87}, ...}
+(null - значение на странице не должно находиться).
+
+Запуск:
+  python3 benchmarks/bench_corpus.py
+  python3 benchmarks/bench_corpus.py --corpus /path/to/snapshots --repeat 10
+  python3 benchmarks/bench_corpus.py --synthetic-mb 5
+  python3 benchmarks/bench_corpus.py --corpus /path/to/snapshots --min-accuracy 0.8
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_snapshot import snapshot_from_html
+from position_extractor import extract_from_snapshot
+from snapshot_writer import read_html
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+SYNTHETIC_BASE = 'en_us_position.html'  # страница, из которой собирается большая синтетическая
+
+# Допустимое отклонение извлеченного значения от ожидаемого
+TOLERANCE = 0.005
+
+
+def load_corpus(corpus_dir):
+    """
+    Возвращает список (имя, HTML) и словарь ожидаемых значений
+    """
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.lower().endswith(('.html', '.htm', '.html.gz')):
+            pages.append((name, read_html(os.path.join(corpus_dir, name))))
+    expected = {}
+    expected_path = os.path.join(corpus_dir, 'expected.json')
+    if os.path.exists(expected_path):
+        with open(expected_path, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+    return pages, expected
+
+
+def build_synthetic_page(base_html, size_mb):
+    """
+    Большая страница: к основе добавляются строки таблицы токенов и шум скриптов
+    """
+    row = ('<div class="css-row TokenRow"><span class="css-tk">USDC</span><span class="css-amt">1,204.5</span>'
+           '<span class="css-usd">$1,204.50</span><span class="css-ch">(+0.12%)</span></div>'
+           '<script>function f(a,b){return (a+b)*(a-1)}</script>\n')
+    count = max(0, int(size_mb * 1024 * 1024) // len(row))
+    return base_html.replace('</main>', row * count + '</main>')
+
+
+def parse_page(page_html, eth_min, eth_max):
+    """
+    Полный офлайн-разбор страницы. Возвращает (результат, время снимка, время извлечения)
+    """
+    started = time.perf_counter()
+    snapshot = snapshot_from_html(page_html)
+    snapshot_time = time.perf_counter() - started
+    started = time.perf_counter()
+    result = extract_from_snapshot(snapshot, eth_min, eth_max)
+    return result, snapshot_time, time.perf_counter() - started
+
+
+def matches(value, expected):
+    if expected is None:
+        return value is None
+    return value is not None and abs(value - expected) <= TOLERANCE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк разбора сохраненных страниц Uniswap')
+    parser.add_argument('--corpus', default=CORPUS_DIR,
+                        help='Папка с сохраненными страницами и expected.json (по умолчанию: benchmarks/corpus)')
+    parser.add_argument('--repeat', type=int, default=5, help='Число повторов замера (по умолчанию: 5)')
+    parser.add_argument('--synthetic-mb', type=float, default=0,
+                        help='Добавить синтетическую страницу указанного размера, МБ')
+    parser.add_argument('--min-accuracy', type=float, default=1.0,
+                        help='Минимальная доля верно извлеченных значений; ниже - код выхода 1 (по умолчанию: 1.0 - '
+                             'любое расхождение с expected.json считается ошибкой)')
+    parser.add_argument('-n', '--eth_min', type=float, default=2000, help='Минимальный курс ETH (по умолчанию: 2000)')
+    parser.add_argument('-x', '--eth_max', type=float, default=4000, help='Максимальный курс ETH (по умолчанию: 4000)')
+    args = parser.parse_args()
+
+    pages, expected = load_corpus(args.corpus)
+    if args.synthetic_mb > 0:
+        base = dict(pages).get(SYNTHETIC_BASE)
+        if base is None:
+            print(f"Для синтетической страницы нужен {SYNTHETIC_BASE} в корпусе")
+            return 1
+        name = f'synthetic_{args.synthetic_mb:g}mb.html'
+        pages.append((name, build_synthetic_page(base, args.synthetic_mb)))
+        expected[name] = expected.get(SYNTHETIC_BASE, {})
+
+    print(f"Страниц в корпусе: {len(pages)} ({args.corpus})")
+    print(f"{'Страница':<28} {'КБ':>8} {'Снимок, мс':>11} {'Разбор, мс':>11} {'Всего, мс':>10} "
+          f"{'МБ/с':>8} {'Пик, МБ':>8} {'Позиция':>12} {'Курс':>9} {'Точность':>9}")
+
+    checked = correct = 0
+    total_bytes = total_time = 0.0
+    for name, page_html in pages:
+        size = len(page_html.encode('utf-8'))
+        snapshot_times, extract_times = [], []
+        for _ in range(args.repeat):
+            result, snapshot_time, extract_time = parse_page(page_html, args.eth_min, args.eth_max)
+            snapshot_times.append(snapshot_time)
+            extract_times.append(extract_time)
+
+        tracemalloc.start()
+        parse_page(page_html, args.eth_min, args.eth_max)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        snapshot_time = statistics.median(snapshot_times)
+        extract_time = statistics.median(extract_times)
+        elapsed = snapshot_time + extract_time
+        total_bytes += size
+        total_time += elapsed
+
+        accuracy = '-'
+        if name in expected:
+            page_correct = sum(matches(getattr(result, field), expected[name].get(field))
+                               for field in ('position_usd', 'eth_rate'))
+            checked += 2
+            correct += page_correct
+            accuracy = f"{page_correct}/2"
+
+        position = f"{result.position_usd:,.2f}" if result.position_usd is not None else '-'
+        rate = f"{result.eth_rate:,.2f}" if result.eth_rate is not None else '-'
+        print(f"{name:<28} {size / 1024:>8.1f} {snapshot_time * 1000:>11.2f} {extract_time * 1000:>11.2f} "
+              f"{elapsed * 1000:>10.2f} {size / 1024 / 1024 / elapsed:>8.1f} {peak / 1024 / 1024:>8.2f} "
+              f"{position:>12} {rate:>9} {accuracy:>9}")
+
+    print("-" * 50)
+    if total_time > 0:
+        print(f"Общая скорость разбора: {total_bytes / 1024 / 1024 / total_time:.1f} МБ/с")
+    if checked:
+        print(f"Точность: {correct} из {checked} значений ({correct / checked:.0%})")
+        if correct / checked < args.min_accuracy:
+            print(f"Точность ниже порога {args.min_accuracy:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
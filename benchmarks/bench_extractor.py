@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк извлечения размера позиции и курса ETH
+
+Сравнивает однопроходный экстрактор (position_extractor.py) с прежним каскадом
+регулярных выражений из extract_position_data_selenium:
+1. проверяет совпадение результатов на случайно сгенерированных страницах;
+2. измеряет время разбора больших HTML-страниц.
+
+Единственное намеренное отличие от прежнего каскада: неразрывные пробелы
+(U+202F, U+00A0) экстрактор заменяет обычными, а каскад удалял их, и
+"93\u202f676,56 $" разбирался как 676,56. Такие расхождения выводятся отдельно
+как ожидаемые, если каскад с заменой вместо удаления дает тот же результат, что
+и экстрактор.
+
+Запуск:
+  python3 benchmarks/bench_extractor.py
+  python3 benchmarks/bench_extractor.py --sizes 1 5 20 --cases 2000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from position_extractor import extract_position_values
+
+
+def legacy_extract(all_texts, dollar_texts, number_texts, page_text, eth_min, eth_max, nbsp=''):
+    """
+    Прежний каскад из extract_position_data_selenium (без вывода в консоль) -
+    эталон для проверки совпадения результатов. nbsp - на что заменяются
+    неразрывные пробелы (в прежнем каскаде удалялись; ' ' - как в экстракторе)
+    """
+    position_usd = None
+    eth_rate = None
+    
+    # Поиск значения позиции (ищем крупные суммы)
+    position_patterns = [
+        r'(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\s*\$',  # 1,234.56 $ или 1 234,56 $
+        r'\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)',     # $1,234.56
+    ]
+    
+    for text in dollar_texts:
+        for pattern in position_patterns:
+            matches = re.findall(pattern, text.replace('\u202f', nbsp).replace('\xa0', nbsp))
+            for match in matches:
+                try:
+                    value = match.replace(' ', '').replace(',', '.')
+                    val = float(value)
+                    if val > 1000:  # Ищем крупные суммы (позиция обычно больше 1000$)
+                        if not position_usd or val > position_usd:
+                            position_usd = val
+                except:
+                    continue
+    
+    # Если не нашли позицию через регулярные выражения, возьмем самое большое значение из найденных
+    if not position_usd:
+        largest_value = 0
+        for text in dollar_texts:
+            # Ищем все числа в тексте
+            numbers = re.findall(r'\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)', text)
+            for num_str in numbers:
+                try:
+                    value = num_str.replace(' ', '').replace(',', '.')
+                    val = float(value)
+                    if val > largest_value and val > 1000:
+                        largest_value = val
+                except:
+                    continue
+        
+        if largest_value > 0:
+            position_usd = largest_value
+    
+    # Если все еще не нашли позицию, используем правильный парсинг
+    if not position_usd and dollar_texts:
+        # Берем первое значение (оно самое большое)
+        first_text = dollar_texts[0]
+        # Убираем символ $ и пробелы
+        clean_text = first_text.replace('$', '').replace(' ', '')
+        # Ищем все цифры и запятые
+        number_match = re.search(r'(\d{1,3}(?:,\d{3})*(?:\.\d+)?)', clean_text)
+        if number_match:
+            try:
+                # Заменяем запятые на пустую строку (разделители тысяч)
+                value_str = number_match.group(1).replace(',', '')
+                position_usd = float(value_str)
+            except:
+                pass
+    
+    # Если все еще не нашли позицию, используем самый простой способ
+    if not position_usd and dollar_texts:
+        # Берем первое значение (оно самое большое)
+        first_text = dollar_texts[0]
+        # Убираем символ $ и пробелы
+        clean_text = first_text.replace('$', '').replace(' ', '')
+        # Убираем все запятые (они разделяют тысячи)
+        clean_text = clean_text.replace(',', '')
+        # Ищем число
+        number_match = re.search(r'(\d+\.?\d*)', clean_text)
+        if number_match:
+            try:
+                position_usd = float(number_match.group(1))
+            except:
+                pass
+    
+    # Поиск курса ETH (значение в скобках)
+    eth_patterns = [
+        r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\s*\$\)',  # (1,234.56 $) или (1 234,56 $)
+        r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)',       # (1,234.56) или (1 234,56)
+    ]
+    
+    # Ищем курс ETH в тексте страницы
+    for pattern in eth_patterns:
+        matches = re.findall(pattern, page_text.replace('\u202f', nbsp).replace('\xa0', nbsp))
+        for match in matches:
+            try:
+                # Заменяем запятые на точки для правильного парсинга
+                value = match.replace(' ', '').replace(',', '.')
+                val = float(value)
+                if eth_min <= val <= eth_max:  # Курс ETH в заданном диапазоне
+                    eth_rate = val
+                    break
+            except:
+                continue
+        if eth_rate:
+            break
+    
+    # Если не нашли через регулярные выражения, попробуем найти в тексте элементов
+    if not eth_rate:
+        for text in all_texts:
+            if '(' in text and ')' in text and '$' in text:
+                # Ищем значение в скобках
+                bracket_match = re.search(r'\(([^)]+)\)', text)
+                if bracket_match:
+                    bracket_content = bracket_match.group(1)
+                    # Ищем число в скобках
+                    number_match = re.search(r'(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)', bracket_content)
+                    if number_match:
+                        try:
+                            # Заменяем запятые на точки для правильного парсинга
+                            value = number_match.group(1).replace(' ', '').replace(',', '.')
+                            val = float(value)
+                            if eth_min <= val <= eth_max:
+                                eth_rate = val
+                                break
+                        except:
+                            continue
+    
+    # Если все еще не нашли курс ETH, ищем в HTML напрямую
+    if not eth_rate:
+        # Ищем конкретно значение в скобках с долларом
+        eth_match = re.search(r'\(\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)', page_text)
+        if eth_match:
+            try:
+                value = eth_match.group(1).replace(' ', '').replace(',', '.')
+                eth_rate = float(value)
+            except:
+                pass
+    
+    # Если все еще не нашли курс ETH, ищем более точно
+    if not eth_rate:
+        # Ищем значение в скобках с долларом в любом формате
+        eth_patterns = [
+            r'\(\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)',  # ($2,314.00)
+            r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\s*\$\)',  # (2,314.00 $)
+            r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)',  # (2,314.00)
+        ]
+        
+        for pattern in eth_patterns:
+            matches = re.findall(pattern, page_text)
+            for match in matches:
+                try:
+                    # Заменяем только запятые между цифрами (разделители тысяч)
+                    # Оставляем точку как десятичный разделитель
+                    value = match.replace(' ', '')
+                    # Заменяем запятые на пустую строку только если они между цифрами
+                    value = re.sub(r'(\d),(\d)', r'\1\2', value)
+                    val = float(value)
+                    if eth_min <= val <= eth_max:
+                        eth_rate = val
+                        break
+                except Exception:
+                    continue
+            if eth_rate:
+                break
+    
+    # Если все еще не нашли курс ETH, попробуем найти в тексте элементов
+    if not eth_rate and number_texts:
+        for text in number_texts:
+            # Ищем числа в заданном диапазоне
+            numbers = re.findall(r'(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)', text)
+            for num_str in numbers:
+                try:
+                    value = num_str.replace(' ', '').replace(',', '.')
+                    val = float(value)
+                    if eth_min <= val <= eth_max:
+                        eth_rate = val
+                        break
+                except:
+                    continue
+            if eth_rate:
+                break
+    
+    return position_usd, eth_rate
+
+
+# Фрагменты, из которых собираются тестовые страницы: разные форматы чисел,
+# скобки, неразрывные пробелы и шум из скриптов
+NUMBER_PIECES = [
+    '93,676.56', '2 395,87', '2\u202f395,87', '2\xa0395,87', '2,314.00', '2,314', '2314.00',
+    '887.87', '1 234', '0,02344', '12', '3500', '0', '1,2,3', '4\n000', '999,999.1', '2\u202f000',
+]
+TEXT_TEMPLATES = [
+    '${n}', '{n} $', '({n} $)', '(${n})', '({n})', '{n} WBTC = 1 WETH (${n})',
+    '0,02344 WBTC = 1 WETH ({n} $)', 'Позиция {n} $', '{n}', 'fee {n}%', '( {n} )', '($ {n})',
+    '({n}\xa0$)', '(\xa0{n} $)', 'f({n},{n})', '(({n}))',
+]
+
+
+def random_text(rng):
+    template = rng.choice(TEXT_TEMPLATES)
+    return template.replace('{n}', rng.choice(NUMBER_PIECES), 1).replace('{n}', rng.choice(NUMBER_PIECES))
+
+
+def random_case(rng):
+    """
+    Случайная страница: тексты элементов и HTML, собранный из них и шума
+    """
+    texts = [random_text(rng) for _ in range(rng.randint(0, 12))]
+    dollar_texts = [t for t in texts if '$' in t]
+    number_texts = [] if dollar_texts else [t for t in texts if any(c.isdigit() for c in t)]
+    noise = ['<script>f(a,b)(1)</script>', '<span>(</span>', '<i>)</i>', '(x)']
+    html = ''.join('<div>%s</div>' % rng.choice([t, rng.choice(noise), random_text(rng)]) for t in texts)
+    eth_min, eth_max = rng.choice([(2000, 4000), (0, 4000), (1, 100000), (1500, 3500)])
+    return texts, dollar_texts, number_texts, html, eth_min, eth_max
+
+
+def check_equivalence(cases, seed):
+    """
+    Сравнивает результаты нового экстрактора и прежнего каскада.
+    Возвращает (число расхождений, число ожидаемых расхождений из-за неразрывных пробелов)
+    """
+    rng = random.Random(seed)
+    mismatches = nbsp_divergences = 0
+    for _ in range(cases):
+        case = random_case(rng)
+        expected = legacy_extract(*case)
+        result = extract_position_values(*case)
+        values = (result.position_usd, result.eth_rate)
+        if values == expected:
+            continue
+        if values == legacy_extract(*case, nbsp=' '):
+            nbsp_divergences += 1
+            if nbsp_divergences <= 2:
+                print(f"  Ожидаемое расхождение (неразрывный пробел): {case!r}\n    "
+                      f"прежний каскад {expected}, экстрактор {values}")
+            continue
+        mismatches += 1
+        if mismatches <= 5:
+            print(f"  Расхождение: {case!r}\n    ожидалось {expected}, получено {values}")
+    return mismatches, nbsp_divergences
+
+
+def build_large_page(size_mb, seed):
+    """
+    Большая страница: разметка с ценами, скобками и шумом скриптов, курс ETH в конце
+    """
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    target = int(size_mb * 1024 * 1024)
+    while size < target:
+        part = rng.choice([
+            '<div class="token-row"><span>$%s</span></div>' % rng.choice(['887.87', '753.86', '14,410.75']),
+            '<script>function f(a,b){return (a+b)*(a-1)}</script>',
+            '<span>(%s%%)</span>' % rng.randint(0, 99),
+            '<p>Fee tier 0.05%% (%d)</p>' % rng.randint(1, 999),
+            '<div class="css-%x">Lorem ipsum dolor sit amet</div>' % rng.randint(0, 1 << 32),
+        ])
+        parts.append(part)
+        size += len(part)
+    parts.append('<div>0.02344 WBTC = 1 WETH ($2,395.87)</div>')
+    html = ''.join(parts)
+    texts = ['$93,676.56', '$79,265.81', '$14,410.75', '0.02344 WBTC = 1 WETH ($2,395.87)']
+    dollar_texts = [t for t in texts if '$' in t]
+    return texts, dollar_texts, [], html, 2000, 4000
+
+
+def time_call(func, args, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк извлечения данных позиции')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 5, 20],
+                        help='Размеры тестовых страниц, МБ (по умолчанию: 1 5 20)')
+    parser.add_argument('--cases', type=int, default=5000,
+                        help='Число случайных страниц для проверки совпадения результатов (по умолчанию: 5000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Число повторов замера (по умолчанию: 3)')
+    parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора (по умолчанию: 1)')
+    args = parser.parse_args()
+
+    print(f"Проверка совпадения результатов на {args.cases} случайных страницах...")
+    mismatches, nbsp_divergences = check_equivalence(args.cases, args.seed)
+    print(f"Расхождений: {mismatches}")
+    print(f"Ожидаемых расхождений (неразрывные пробелы - разделители тысяч): {nbsp_divergences}")
+    print("-" * 50)
+
+    print(f"{'Размер, МБ':>10} {'Каскад, мс':>12} {'Экстрактор, мс':>15} {'Ускорение':>10} {'МБ/с':>8}")
+    for size_mb in args.sizes:
+        case = build_large_page(size_mb, args.seed)
+        legacy_time, legacy_result = time_call(legacy_extract, case, args.repeat)
+        new_time, new_result = time_call(extract_position_values, case, args.repeat)
+        if (new_result.position_usd, new_result.eth_rate) != legacy_result:
+            mismatches += 1
+            print(f"  Расхождение на странице {size_mb} МБ: {legacy_result} != {new_result}")
+        print(f"{size_mb:>10.1f} {legacy_time * 1000:>12.1f} {new_time * 1000:>15.1f} "
+              f"{legacy_time / new_time:>9.1f}x {len(case[3]) / 1024 / 1024 / new_time:>8.1f}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
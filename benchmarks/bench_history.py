@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк хранилища истории позиций (history_store.py)
+
+Заполняет базу синтетическими поминутными снимками для нескольких позиций за
+несколько месяцев и замеряет: вставку одного снимка (как при обычном запуске
+анализатора), выборку интервала и агрегаты OHLC за разные периоды.
+
+Запуск:
+  python3 benchmarks/bench_history.py
+  python3 benchmarks/bench_history.py --positions 300 --days 90 --db /tmp/history.db
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import HistoryStore
+
+STEP = 60  # Шаг синтетических снимков, секунд
+
+
+def synthetic_rows(position_id, start, count, rng):
+    """
+    Снимки позиции: случайное блуждание курса ETH и размера позиции
+    """
+    eth_rate, position_usd = 2400.0, 90000.0
+    for index in range(count):
+        change = rng.gauss(0, 0.0008)
+        eth_rate *= math.exp(change)
+        position_usd *= math.exp(change * 0.6 + rng.gauss(0, 0.0001))
+        yield position_id, start + index * STEP, position_usd, eth_rate, 38.1, 'rpc'
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк хранилища истории позиций')
+    parser.add_argument('--positions', type=int, default=20, help='Число позиций (по умолчанию: 20)')
+    parser.add_argument('--days', type=int, default=90, help='Дней поминутных данных (по умолчанию: 90)')
+    parser.add_argument('--db', help='Файл базы (по умолчанию: временный, удаляется после замера)')
+    parser.add_argument('--repeat', type=int, default=5, help='Число повторов замера (по умолчанию: 5)')
+    args = parser.parse_args()
+
+    directory = None
+    path = args.db
+    if path is None:
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'history.db')
+    store = HistoryStore(path)
+    rng = random.Random(1)
+    per_position = args.days * 86400 // STEP
+    # Начало на границе часа: агрегаты по часам и дням читаются из snapshots_hourly
+    start = int(time.time()) // 3600 * 3600 - per_position * STEP
+
+    started = time.perf_counter()
+    for number in range(args.positions):
+        store.append_many(synthetic_rows(str(60000 + number), start, per_position, rng))
+    fill_time = time.perf_counter() - started
+    total = args.positions * per_position
+    print(f"Заполнение: {total:,} снимков за {fill_time:.1f} с ({total / fill_time:,.0f} снимков/с)")
+    print(f"Размер базы: {os.path.getsize(path) / 1024 / 1024:.1f} МБ "
+          f"({os.path.getsize(path) / total:.1f} байт на снимок)")
+
+    position_id = str(60000 + args.positions // 2)
+    end = start + per_position * STEP
+    append_ms, _ = timed(lambda: store.append(position_id, 90000.0, 2400.0, 38.1, 'web', ts=end + rng.randrange(10 ** 6)),
+                         args.repeat)
+    print(f"Вставка одного снимка: {append_ms:.2f} мс")
+
+    print(f"{'Запрос':<40} {'Строк':>8} {'мс':>9}")
+    for label, days in (('1 день', 1), ('7 дней', 7), ('30 дней', 30), (f'{args.days} дней', args.days)):
+        period_start = end - days * 86400
+        query_ms, rows = timed(lambda: store.query_range(position_id, period_start, end), args.repeat)
+        print(f"{'Снимки за ' + label:<40} {len(rows):>8,} {query_ms:>9.2f}")
+        for bucket_label, bucket in (('час', 3600), ('день', 86400)):
+            if days * 86400 // bucket > 2000:
+                continue
+            aggregate_ms, bars = timed(lambda: store.aggregate(position_id, bucket, period_start, end), args.repeat)
+            print(f"{f'OHLC за {label} по 1 {bucket_label}':<40} {len(bars):>8,} {aggregate_ms:>9.2f}")
+        # Граница не на часе: агрегаты по самим снимкам
+        raw_ms, bars = timed(lambda: store.aggregate(position_id, 86400, period_start + 1, end), args.repeat)
+        print(f"{f'OHLC за {label} по 1 день (из снимков)':<40} {len(bars):>8,} {raw_ms:>9.2f}")
+    positions_ms, ids = timed(store.positions, args.repeat)
+    print(f"{'Список позиций':<40} {len(ids):>8,} {positions_ms:>9.2f}")
+
+    store.close()
+    if directory is not None:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
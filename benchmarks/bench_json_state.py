@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк и проверка поиска позиции в JSON-данных (без браузера)
+
+Прогоняет набор JSON-ответов приложения (benchmarks/json или любая папка) через
+поиск размера позиции и курса ETH:
+- файлы .json - список перехваченных ответов [{"url": ..., "data": ...}, ...],
+  разбираются как в --network-capture (NetworkCapture.find_values);
+- файлы .html - ответ сервера со встроенным JSON, разбираются как на уровне HTTP
+  (http_fetch.extract_from_response).
+Для каждого файла выводит время поиска, найденные значения с путями и точность
+относительно expected.json. В наборе есть ответы, где рядом с позицией лежат TVL
+пула и сумма портфеля, ответы только с чужой позицией и ответы с разными суммами
+позиции: размер должен браться из объекта запрошенной позиции, а в двух последних
+случаях - не находиться. Ответ сервера, где в тексте есть только TVL пула и сумма
+портфеля, не должен давать размер позиции.
+
+Формат expected.json: {"файл.json": {"position_id": "59044", "position_usd": 93676.56,
+"eth_rate": 2395.87}, ...} (null - значение не должно находиться).
+
+Запуск:
+  python3 benchmarks/bench_json_state.py
+  python3 benchmarks/bench_json_state.py --fixtures /path/to/responses --repeat 100
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_fetch import extract_from_response
+from network_capture import CapturedResponse, NetworkCapture
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json')
+
+# Допустимое отклонение извлеченного значения от ожидаемого
+TOLERANCE = 0.005
+
+
+def load_fixtures(fixtures_dir):
+    """
+    Возвращает список (имя, содержимое) и словарь ожидаемых значений
+    """
+    fixtures = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        if name == 'expected.json' or not name.endswith(('.json', '.html')):
+            continue
+        with open(os.path.join(fixtures_dir, name), 'r', encoding='utf-8') as f:
+            fixtures.append((name, json.load(f) if name.endswith('.json') else f.read()))
+    expected = {}
+    expected_path = os.path.join(fixtures_dir, 'expected.json')
+    if os.path.exists(expected_path):
+        with open(expected_path, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+    return fixtures, expected
+
+
+def find_values(name, content, position_id, eth_min, eth_max):
+    """
+    Поиск значений тем же путем, что и в анализаторе.
+    Возвращает (position_usd, eth_rate, источник позиции, источник курса)
+    """
+    if name.endswith('.html'):
+        result = extract_from_response(content, eth_min, eth_max, position_id)
+        return result.position_usd, result.eth_rate, result.position_source, result.rate_source
+    capture = NetworkCapture(driver=None)
+    capture.responses = [CapturedResponse(response['url'], response['data']) for response in content]
+    values = capture.find_values(eth_min, eth_max, position_id)
+    return values.position_usd, values.eth_rate, values.position_source, values.rate_source
+
+
+def matches(value, expected):
+    if expected is None:
+        return value is None
+    return value is not None and abs(value - expected) <= TOLERANCE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк и проверка поиска позиции в JSON-данных')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR,
+                        help='Папка с ответами и expected.json (по умолчанию: benchmarks/json)')
+    parser.add_argument('--repeat', type=int, default=20, help='Число повторов замера (по умолчанию: 20)')
+    parser.add_argument('-n', '--eth_min', type=float, default=2000, help='Минимальный курс ETH (по умолчанию: 2000)')
+    parser.add_argument('-x', '--eth_max', type=float, default=4000, help='Максимальный курс ETH (по умолчанию: 4000)')
+    args = parser.parse_args()
+
+    fixtures, expected = load_fixtures(args.fixtures)
+    print(f"Файлов с ответами: {len(fixtures)} ({args.fixtures})")
+    print(f"{'Файл':<24} {'Позиция':>8} {'Поиск, мс':>10} {'Размер, $':>12} {'Курс':>9} {'Точность':>9}")
+
+    checked = correct = 0
+    for name, content in fixtures:
+        position_id = expected.get(name, {}).get('position_id')
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            position_usd, eth_rate, position_source, rate_source = find_values(
+                name, content, position_id, args.eth_min, args.eth_max)
+            times.append(time.perf_counter() - started)
+
+        accuracy = '-'
+        if name in expected:
+            file_correct = (matches(position_usd, expected[name].get('position_usd'))
+                            + matches(eth_rate, expected[name].get('eth_rate')))
+            checked += 2
+            correct += file_correct
+            accuracy = f"{file_correct}/2"
+        position = f"{position_usd:,.2f}" if position_usd is not None else '-'
+        rate = f"{eth_rate:,.2f}" if eth_rate is not None else '-'
+        print(f"{name:<24} {position_id or '-':>8} {statistics.median(times) * 1000:>10.3f} "
+              f"{position:>12} {rate:>9} {accuracy:>9}")
+        if position_source:
+            print(f"  позиция: {position_source}")
+        if rate_source:
+            print(f"  курс: {rate_source}")
+
+    print("-" * 50)
+    if checked:
+        print(f"Точность: {correct} из {checked} значений ({correct / checked:.0%})")
+        if correct < checked:
+            print("Есть расхождения с expected.json")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк и проверка оценки позиции через JSON-RPC (без сети)
+
+Записанные ответы узла (benchmarks/rpc или любая папка с файлами --rpc-record)
+воспроизводятся локальной заглушкой (rpc_stub.py). Для каждой записи выводит
+время чтения позиции, число запросов к узлу, размер позиции и курс ETH и
+сравнивает их с expected.json. Затем те же записи портятся так, как отвечают
+узлы на неверный адрес или несуществующий пул (пустой результат "0x", нулевой
+адрес пула, ошибка строкой), и проверяется, что разбор завершается RpcError,
+а не IndexError, и что сообщение о неудаче в режиме наблюдения (--watch)
+содержит текст этой ошибки, а не служебную строку вывода.
+
+Формат expected.json: {"rpc_59044.json": {"position_id": "59044",
+"position_usd": 297824.13, "eth_rate": 2395.87}, ...}
+
+Запуск:
+  python3 benchmarks/bench_rpc.py
+  python3 benchmarks/bench_rpc.py --records /path/to/records --repeat 20
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rpc_source import (RpcClient, RpcError, SELECTOR_DECIMALS, SELECTOR_SLOT0, SELECTOR_POSITIONS,
+                        SELECTOR_GET_POOL, fetch_position_state, value_position)
+from rpc_stub import start_stub
+from uniswap_analyzer import refresh_position
+
+RECORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rpc')
+
+# Допустимое отклонение извлеченного значения от ожидаемого
+TOLERANCE = 0.005
+
+ZERO_ADDRESS_RESULT = '0x' + '0' * 64
+
+
+def load_records(records_dir):
+    """
+    Возвращает список (имя, ответы) и словарь ожидаемых значений
+    """
+    records = []
+    for name in sorted(os.listdir(records_dir)):
+        if name.endswith('.json') and name != 'expected.json':
+            with open(os.path.join(records_dir, name), 'r', encoding='utf-8') as f:
+                records.append((name, json.load(f)))
+    expected = {}
+    expected_path = os.path.join(records_dir, 'expected.json')
+    if os.path.exists(expected_path):
+        with open(expected_path, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+    return records, expected
+
+
+def call_keys(responses, selector):
+    """
+    Ключи записанных eth_call с данным селектором
+    """
+    return [key for key in responses
+            if key.startswith('eth_call ') and json.loads(key[len('eth_call '):])[0]['data'].startswith(selector)]
+
+
+def broken_cases(responses):
+    """
+    Испорченные записи: (описание, ответы, ошибки заглушки)
+    """
+    cases = []
+    for key in call_keys(responses, SELECTOR_SLOT0):
+        cases.append(("slot0() пула пустой", dict(responses, **{key: '0x'}), {}))
+        cases.append(("slot0() пула из одного слова", dict(responses, **{key: responses[key][:66]}), {}))
+    for key in call_keys(responses, SELECTOR_GET_POOL):
+        cases.append(("getPool() вернул нулевой адрес", dict(responses, **{key: ZERO_ADDRESS_RESULT}), {}))
+        cases.append(("getPool() пустой", dict(responses, **{key: '0x'}), {}))
+    for key in call_keys(responses, SELECTOR_DECIMALS):
+        cases.append(("decimals() пустой", dict(responses, **{key: '0x'}), {}))
+    for key in call_keys(responses, SELECTOR_POSITIONS):
+        cases.append(("positions() пустой", dict(responses, **{key: '0x'}), {}))
+        cases.append(("ошибка узла строкой", responses, {key: 'execution reverted'}))
+        cases.append(("ошибка узла объектом", responses, {key: {'code': 3, 'message': 'execution reverted'}}))
+    return cases
+
+
+def run_stub(responses, errors=None):
+    server = start_stub(responses, errors=errors)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch(responses, position_id, errors=None):
+    """
+    Читает и оценивает позицию через заглушку.
+    Возвращает ((position_usd, eth_rate), число запросов, время)
+    """
+    server = run_stub(responses, errors)
+    try:
+        client = RpcClient(f"http://127.0.0.1:{server.server_address[1]}")
+        started = time.perf_counter()
+        state = fetch_position_state(client, position_id)
+        values = value_position(state)
+        return values, client.requests_sent, time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def watch_reason(responses, position_id, errors=None):
+    """
+    Причина неудачи, которую режим наблюдения выводит для этих ответов узла
+    """
+    server = run_stub(responses, errors)
+    try:
+        client = RpcClient(f"http://127.0.0.1:{server.server_address[1]}")
+        with redirect_stdout(io.StringIO()):
+            _, _, reason = refresh_position(position_id, argparse.Namespace(source='rpc'), oracle=None,
+                                            rpc_client=client)
+        return reason
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def matches(value, expected):
+    if expected is None:
+        return value is None
+    return value is not None and abs(value - expected) <= TOLERANCE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк и проверка оценки позиции через JSON-RPC')
+    parser.add_argument('--records', default=RECORDS_DIR,
+                        help='Папка с записанными ответами и expected.json (по умолчанию: benchmarks/rpc)')
+    parser.add_argument('--repeat', type=int, default=5, help='Число повторов замера (по умолчанию: 5)')
+    args = parser.parse_args()
+
+    records, expected = load_records(args.records)
+    print(f"Записей ответов: {len(records)} ({args.records})")
+    print(f"{'Запись':<24} {'Позиция':>8} {'Время, мс':>10} {'Запросов':>9} {'Размер, $':>14} {'Курс':>9} {'Точность':>9}")
+
+    failures = 0
+    for name, responses in records:
+        position_id = expected.get(name, {}).get('position_id', name.rsplit('.', 1)[0].rsplit('_', 1)[-1])
+        times = []
+        try:
+            for _ in range(args.repeat):
+                (position_usd, eth_rate), requests_sent, elapsed = fetch(responses, position_id)
+                times.append(elapsed)
+        except RpcError as e:
+            print(f"{name:<24} {position_id:>8} ошибка: {e}")
+            failures += 1
+            continue
+
+        accuracy = '-'
+        if name in expected:
+            correct = (matches(position_usd, expected[name].get('position_usd'))
+                       + matches(eth_rate, expected[name].get('eth_rate')))
+            failures += correct < 2
+            accuracy = f"{correct}/2"
+        print(f"{name:<24} {position_id:>8} {statistics.median(times) * 1000:>10.2f} {requests_sent:>9} "
+              f"{position_usd:>14,.2f} {eth_rate:>9,.2f} {accuracy:>9}")
+
+        print("-" * 50)
+        print("Испорченные ответы узла (ожидается RpcError):")
+        for description, broken, errors in broken_cases(responses):
+            try:
+                fetch(broken, position_id, errors)
+                outcome, ok = "ошибка не обнаружена", False
+            except RpcError as e:
+                outcome, ok = f"RpcError: {e}", True
+                reason = watch_reason(broken, position_id, errors)
+                if not reason or str(e) not in reason:
+                    outcome, ok = f"в режиме наблюдения выведено {reason!r} вместо {str(e)!r}", False
+            except Exception as e:
+                outcome, ok = f"{type(e).__name__}: {e}", False
+            failures += not ok
+            print(f"  {'OK ' if ok else 'FAIL'} {description}: {outcome[:110]}")
+
+    print("-" * 50)
+    if failures:
+        print(f"Проверок не пройдено: {failures}")
+        return 1
+    print("Все проверки пройдены")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
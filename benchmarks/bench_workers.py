@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк масштабирования параллельного пакетного анализа (parallel_batch.py)
+
+Прогоняет один и тот же список позиций с 1, 2, ... N процессами (в каждом свой
+headless Chrome) и выводит общее время, пропускную способность, ускорение
+относительно одного процесса и доступную память до и после.
+
+Запуск (нужны Chrome и chromedriver):
+  python3 benchmarks/bench_workers.py --positions 59044 59045 59046 59047 --max-workers 4
+  python3 benchmarks/bench_workers.py --serve-corpus --count 16 --max-workers 4
+
+С --serve-corpus страницы берутся с локального HTTP-сервера из benchmarks/corpus
+(en_us_position.html), поэтому замер не зависит от сети и app.uniswap.org.
+"""
+
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parallel_batch import available_memory_mb, plan_workers, run_parallel
+from uniswap_analyzer import ETH_RATE_MAX, ETH_RATE_MIN, PAGE_LOAD_TIMEOUT, POSITION_URL_TEMPLATE
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+CORPUS_PAGE = 'en_us_position.html'
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_corpus():
+    """
+    HTTP-сервер с корпусом страниц. Возвращает шаблон URL позиции
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=CORPUS_DIR))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/{CORPUS_PAGE}#{{position}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк масштабирования параллельного пакетного анализа')
+    parser.add_argument('--positions', nargs='+', help='Номера позиций (по умолчанию: --count номеров от 59044)')
+    parser.add_argument('--count', type=int, default=8, help='Число позиций без --positions (по умолчанию: 8)')
+    parser.add_argument('--max-workers', type=int, default=0,
+                        help='Наибольшее число процессов (по умолчанию: по числу ядер и свободной памяти)')
+    parser.add_argument('--serve-corpus', action='store_true',
+                        help='Загружать сохраненную страницу с локального сервера вместо app.uniswap.org')
+    parser.add_argument('-t', '--timeout', type=float, default=PAGE_LOAD_TIMEOUT,
+                        help=f'Ожидание данных на странице, секунд (по умолчанию: {PAGE_LOAD_TIMEOUT})')
+    args = parser.parse_args()
+
+    position_ids = args.positions or [str(59044 + index) for index in range(args.count)]
+    url_template = serve_corpus() if args.serve_corpus else POSITION_URL_TEMPLATE
+    max_workers, memory_limit = plan_workers(len(position_ids), args.max_workers)
+    print(f"Позиций: {len(position_ids)}, процессов: 1 - {max_workers}"
+          + (f" (по памяти не больше {memory_limit})" if memory_limit is not None else ""))
+    print(f"Страницы: {url_template}")
+    print(f"{'Процессов':>9} {'Время, с':>9} {'Позиций/мин':>12} {'Ускорение':>10} {'Эффективность':>14} "
+          f"{'Успешно':>8} {'Память до/после, МБ':>20}")
+
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        memory_before = available_memory_mb()
+        started = time.time()
+        results = run_parallel(position_ids, url_template, ETH_RATE_MIN, ETH_RATE_MAX, args.timeout, workers)
+        elapsed = time.time() - started
+        memory_after = available_memory_mb()
+        baseline = baseline or elapsed
+        succeeded = sum(1 for result in results if result is not None and result.position_usd is not None)
+        print(f"{workers:>9} {elapsed:>9.1f} {len(position_ids) / elapsed * 60:>12.1f} "
+              f"{baseline / elapsed:>9.2f}x {baseline / elapsed / workers:>13.0%} "
+              f"{succeeded:>4}/{len(position_ids):<3} {f'{memory_before} / {memory_after}':>20}")
+        workers = workers * 2 if workers * 2 <= max_workers or workers == max_workers else max_workers
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
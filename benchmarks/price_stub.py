@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная заглушка API курсов (CoinGecko и Binance) с фиксированными курсами
+
+  python3 benchmarks/price_stub.py --port 8546 --price ETH=2395.87 --price WBTC=64000
+  python3 uniswap_analyzer.py --coingecko-url http://127.0.0.1:8546/api/v3 \\
+      --binance-url http://127.0.0.1:8546/binance/api/v3 ...
+
+Поддерживаются /api/v3/simple/price, /api/v3/simple/token_price/<сеть> и
+/binance/api/v3/ticker/price. Ключи --price - символы или адреса контрактов.
+--fail coingecko (или binance) отвечает ошибкой 429, чтобы проверить переход
+на следующий провайдер. По завершении выводится число обслуженных запросов.
+"""
+
+import argparse
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_oracle import BINANCE_SYMBOLS, COINGECKO_IDS, normalize_asset
+
+
+def make_handler(prices, fail=(), counter=None):
+    coingecko_ids = {coin_id: asset for asset, coin_id in COINGECKO_IDS.items() if asset in prices}
+    binance_pairs = {pair: asset for asset, pair in BINANCE_SYMBOLS.items() if asset in prices}
+    counter = counter if counter is not None else {}
+
+    class PriceStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящих API
+
+        def reply(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            provider = 'binance' if url.path.startswith('/binance/') else 'coingecko'
+            counter[provider] = counter.get(provider, 0) + 1
+            if provider in fail:
+                return self.reply(429, {'error': 'rate limited'})
+
+            if url.path == '/api/v3/simple/price':
+                ids = query.get('ids', '').split(',')
+                return self.reply(200, {coin_id: {'usd': prices[coingecko_ids[coin_id]]}
+                                        for coin_id in ids if coin_id in coingecko_ids})
+            if url.path.startswith('/api/v3/simple/token_price/'):
+                addresses = query.get('contract_addresses', '').lower().split(',')
+                return self.reply(200, {address: {'usd': prices[address]}
+                                        for address in addresses if address in prices})
+            if url.path == '/binance/api/v3/ticker/price':
+                pairs = json.loads(query.get('symbols', '[]'))
+                return self.reply(200, [{'symbol': pair, 'price': str(prices[binance_pairs[pair]])}
+                                        for pair in pairs if pair in binance_pairs])
+            return self.reply(404, {'error': f'неизвестный путь {url.path}'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PriceStubHandler
+
+
+def start_stub(prices, host='127.0.0.1', port=0, fail=(), counter=None):
+    """
+    Создает сервер заглушки (port=0 - любой свободный порт). Возвращает ThreadingHTTPServer
+    """
+    prices = {normalize_asset(asset): price for asset, price in prices.items()}
+    return ThreadingHTTPServer((host, port), make_handler(prices, fail, counter))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка API курсов CoinGecko/Binance')
+    parser.add_argument('--price', action='append', default=[], metavar='ASSET=USD',
+                        help='Курс актива (можно указывать несколько раз, по умолчанию ETH=2395.87)')
+    parser.add_argument('--fail', action='append', default=[], choices=['coingecko', 'binance'],
+                        help='Отвечать ошибкой 429 для провайдера')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8546, help='Порт (по умолчанию: 8546)')
+    args = parser.parse_args()
+
+    prices = {}
+    for item in args.price or ['ETH=2395.87']:
+        asset, _, value = item.partition('=')
+        prices[asset] = float(value)
+    counter = {}
+    server = start_stub(prices, args.host, args.port, args.fail, counter)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Заглушка курсов: {base}/api/v3 (CoinGecko), {base}/binance/api/v3 (Binance)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Обслужено запросов: {counter}")
+
+
+if __name__ == "__main__":
+    main()
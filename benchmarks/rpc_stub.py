@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная заглушка JSON-RPC узла, отдающая записанные ответы
+
+Ответы записываются при обычном запуске анализатора:
+  python3 uniswap_analyzer.py --source rpc -p 59044 --rpc-record rpc_59044.json
+
+и затем воспроизводятся без сети:
+  python3 benchmarks/rpc_stub.py rpc_59044.json --port 8545
+  python3 uniswap_analyzer.py --source rpc -p 59044 --rpc-url http://127.0.0.1:8545
+
+Поддерживаются одиночные и пакетные запросы. На запрос, которого нет в записи,
+возвращается ошибка JSON-RPC. Для проверки обработки ошибок (benchmarks/bench_rpc.py)
+на отдельные запросы можно вернуть заданную ошибку (errors) - объект или строку.
+"""
+
+import argparse
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rpc_source import request_key
+
+
+def make_handler(responses, errors=None):
+    errors = errors or {}
+
+    class RpcStubHandler(BaseHTTPRequestHandler):
+        def reply(self, request):
+            key = request_key(request.get('method', ''), request.get('params', []))
+            if key in errors:
+                return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': errors[key]}
+            if key in responses:
+                return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': responses[key]}
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32601, 'message': f'нет записанного ответа: {key}'}}
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+            if isinstance(body, list):
+                payload = [self.reply(request) for request in body]
+            else:
+                payload = self.reply(body or {})
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RpcStubHandler
+
+
+def start_stub(responses, host='127.0.0.1', port=0, errors=None):
+    """
+    Создает сервер заглушки (port=0 - любой свободный порт). Возвращает ThreadingHTTPServer
+    """
+    return ThreadingHTTPServer((host, port), make_handler(responses, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка JSON-RPC узла с записанными ответами')
+    parser.add_argument('record', help='Файл с ответами, записанный через --rpc-record')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8545, help='Порт (по умолчанию: 8545)')
+    args = parser.parse_args()
+
+    with open(args.record, 'r', encoding='utf-8') as f:
+        responses = json.load(f)
+    server = start_stub(responses, args.host, args.port)
+    print(f"Заглушка JSON-RPC: http://{args.host}:{server.server_address[1]} ({len(responses)} ответов)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+История значений позиций в локальной базе SQLite
+
+Каждый анализ добавляет строку (позиция, время, размер позиции, курс ETH,
+начальный эфир). Таблица WITHOUT ROWID с первичным ключом (position_id, ts)
+хранит строки кластеризованно по позиции и времени, поэтому выборка интервала
+одной позиции - последовательное чтение одного участка B-дерева, без отдельного
+индекса. Стоимость начального эфира, позиция в ETH и результат относительно HODL
+вычисляются в запросах и не хранятся.
+
+Агрегаты по интервалам (OHLC размера позиции, минимум и максимум позиции в ETH и
+результата относительно HODL) считаются одним запросом с группировкой в SQLite.
+Для интервалов, кратных часу, они собираются из часовых агрегатов snapshots_hourly,
+которые триггер обновляет при каждой вставке снимка, - запрос за месяцы поминутных
+данных читает сотни строк вместо сотен тысяч.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from collections import namedtuple
+
+HISTORY_DB_PATH = os.path.join(
+    os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'),
+    'uniswap_analyzer', 'history.db')
+
+ROLLUP_SECONDS = 3600  # Длина интервала таблицы snapshots_hourly
+TS_MAX = 2 ** 62 // ROLLUP_SECONDS * ROLLUP_SECONDS  # Граница "без ограничения" для запросов по времени
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snapshots (
+    position_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,          -- время, секунды Unix
+    position_usd REAL NOT NULL,
+    eth_rate REAL NOT NULL,
+    eth_initial REAL NOT NULL,
+    source TEXT,                  -- web или rpc
+    PRIMARY KEY (position_id, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS snapshots_hourly (
+    position_id TEXT NOT NULL,
+    hour INTEGER NOT NULL,        -- ts / {ROLLUP_SECONDS}
+    open_ts INTEGER NOT NULL,
+    open_usd REAL NOT NULL,
+    close_ts INTEGER NOT NULL,
+    close_usd REAL NOT NULL,
+    close_rate REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    eth_min REAL NOT NULL,
+    eth_max REAL NOT NULL,
+    profit_min REAL NOT NULL,
+    profit_max REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (position_id, hour)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS snapshots_rollup AFTER INSERT ON snapshots BEGIN
+    INSERT INTO snapshots_hourly VALUES (
+        NEW.position_id, NEW.ts / {ROLLUP_SECONDS},
+        NEW.ts, NEW.position_usd, NEW.ts, NEW.position_usd, NEW.eth_rate,
+        NEW.position_usd, NEW.position_usd,
+        NEW.position_usd / NEW.eth_rate, NEW.position_usd / NEW.eth_rate,
+        NEW.position_usd - NEW.eth_initial * NEW.eth_rate, NEW.position_usd - NEW.eth_initial * NEW.eth_rate,
+        1)
+    ON CONFLICT (position_id, hour) DO UPDATE SET
+        open_usd = CASE WHEN excluded.open_ts < open_ts THEN excluded.open_usd ELSE open_usd END,
+        open_ts = MIN(open_ts, excluded.open_ts),
+        close_usd = CASE WHEN excluded.close_ts > close_ts THEN excluded.close_usd ELSE close_usd END,
+        close_rate = CASE WHEN excluded.close_ts > close_ts THEN excluded.close_rate ELSE close_rate END,
+        close_ts = MAX(close_ts, excluded.close_ts),
+        high = MAX(high, excluded.high),
+        low = MIN(low, excluded.low),
+        eth_min = MIN(eth_min, excluded.eth_min),
+        eth_max = MAX(eth_max, excluded.eth_max),
+        profit_min = MIN(profit_min, excluded.profit_min),
+        profit_max = MAX(profit_max, excluded.profit_max),
+        count = count + 1;
+END;
+"""
+
+# Длительности для --history-since и --history-bucket: "90s", "15m", "4h", "7d", "2w"
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+DURATION_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$')
+
+Snapshot = namedtuple('Snapshot', ['position_id', 'ts', 'position_usd', 'eth_rate', 'eth_initial', 'source'])
+
+# Агрегат за интервал группировки
+Bar = namedtuple('Bar', [
+    'start',                       # начало интервала, секунды Unix
+    'open', 'high', 'low', 'close',  # размер позиции, $
+    'eth_min', 'eth_max',          # позиция в ETH
+    'profit_min', 'profit_max',    # позиция минус стоимость начального эфира, $
+    'eth_rate_close',              # курс ETH на конец интервала
+    'count',                       # число снимков
+])
+
+
+def parse_duration(value):
+    """
+    Длительность в секундах из строки вида "15m", "4h", "7d" (без единицы - секунды)
+    """
+    match = DURATION_RE.match(value)
+    if not match:
+        raise ValueError(f"Неверная длительность: {value} (примеры: 90s, 15m, 4h, 7d, 2w)")
+    seconds = float(match.group(1)) * DURATION_UNITS[match.group(2) or 's']
+    if seconds <= 0:
+        raise ValueError(f"Длительность должна быть больше нуля: {value}")
+    return int(seconds)
+
+
+class HistoryStore:
+    """
+    Хранилище снимков позиций (path=':memory:' - база в памяти)
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # Автокоммит: каждая вставка - отдельная короткая транзакция
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # WAL: запись не блокирует чтение из параллельных процессов
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def append(self, position_id, position_usd, eth_rate, eth_initial, source=None, ts=None):
+        """
+        Добавляет снимок позиции (повтор в ту же секунду пропускается)
+        """
+        self.append_many([(position_id, int(time.time() if ts is None else ts),
+                           position_usd, eth_rate, eth_initial, source)])
+
+    def append_many(self, rows):
+        """
+        Добавляет снимки [(position_id, ts, position_usd, eth_rate, eth_initial, source), ...]
+        одной транзакцией
+        """
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)',
+                ((str(row[0]),) + tuple(row[1:]) for row in rows))
+
+    def positions(self):
+        """
+        Номера позиций, для которых есть снимки
+        """
+        return [row[0] for row in self.connection.execute(
+            # Переход от позиции к позиции по первичному ключу без полного чтения таблицы
+            'WITH RECURSIVE ids(position_id) AS ('
+            ' SELECT MIN(position_id) FROM snapshots'
+            ' UNION ALL'
+            ' SELECT (SELECT MIN(position_id) FROM snapshots s WHERE s.position_id > ids.position_id)'
+            ' FROM ids WHERE ids.position_id IS NOT NULL)'
+            ' SELECT position_id FROM ids WHERE position_id IS NOT NULL')]
+
+    def query_range(self, position_id, start=None, end=None):
+        """
+        Снимки позиции за интервал [start, end) по времени
+        """
+        cursor = self.connection.execute(
+            'SELECT * FROM snapshots WHERE position_id = ? AND ts >= ? AND ts < ? ORDER BY ts',
+            (str(position_id), 0 if start is None else int(start), TS_MAX if end is None else int(end)))
+        return [Snapshot(*row) for row in cursor]
+
+    def latest(self, position_id):
+        """
+        Последний снимок позиции или None
+        """
+        row = self.connection.execute(
+            'SELECT * FROM snapshots WHERE position_id = ? ORDER BY ts DESC LIMIT 1',
+            (str(position_id),)).fetchone()
+        return Snapshot(*row) if row else None
+
+    def aggregate(self, position_id, bucket, start=None, end=None):
+        """
+        Агрегаты по интервалам длиной bucket секунд за [start, end): OHLC размера
+        позиции, минимум и максимум позиции в ETH и результата относительно HODL.
+        Если bucket и границы кратны часу, агрегаты собираются из snapshots_hourly,
+        иначе из снимков. Открытие и закрытие берутся по первичному ключу из первой
+        и последней строки интервала
+        """
+        start = 0 if start is None else int(start)
+        end = TS_MAX if end is None else int(end)
+        params = {'bucket': int(bucket), 'position': str(position_id), 'start': start, 'end': end}
+        if bucket % ROLLUP_SECONDS == 0 and start % ROLLUP_SECONDS == 0 and end % ROLLUP_SECONDS == 0:
+            query = (
+                'SELECT g.bucket * :bucket, o.open_usd, g.high, g.low, c.close_usd,'
+                '       g.eth_min, g.eth_max, g.profit_min, g.profit_max, c.close_rate, g.count'
+                f' FROM (SELECT hour * {ROLLUP_SECONDS} / :bucket AS bucket,'
+                '              MIN(hour) AS first_hour, MAX(hour) AS last_hour,'
+                '              MAX(high) AS high, MIN(low) AS low,'
+                '              MIN(eth_min) AS eth_min, MAX(eth_max) AS eth_max,'
+                '              MIN(profit_min) AS profit_min, MAX(profit_max) AS profit_max,'
+                '              SUM(count) AS count'
+                '       FROM snapshots_hourly WHERE position_id = :position'
+                f'        AND hour >= :start / {ROLLUP_SECONDS} AND hour < :end / {ROLLUP_SECONDS}'
+                '       GROUP BY bucket) g'
+                ' JOIN snapshots_hourly o ON o.position_id = :position AND o.hour = g.first_hour'
+                ' JOIN snapshots_hourly c ON c.position_id = :position AND c.hour = g.last_hour'
+                ' ORDER BY g.bucket')
+        else:
+            query = (
+                'SELECT g.bucket * :bucket, o.position_usd, g.high, g.low, c.position_usd,'
+                '       g.eth_min, g.eth_max, g.profit_min, g.profit_max, c.eth_rate, g.count'
+                ' FROM (SELECT ts / :bucket AS bucket, MIN(ts) AS first_ts, MAX(ts) AS last_ts,'
+                '              MAX(position_usd) AS high, MIN(position_usd) AS low,'
+                '              MIN(position_usd / eth_rate) AS eth_min, MAX(position_usd / eth_rate) AS eth_max,'
+                '              MIN(position_usd - eth_initial * eth_rate) AS profit_min,'
+                '              MAX(position_usd - eth_initial * eth_rate) AS profit_max,'
+                '              COUNT(*) AS count'
+                '       FROM snapshots WHERE position_id = :position AND ts >= :start AND ts < :end'
+                '       GROUP BY bucket) g'
+                ' JOIN snapshots o ON o.position_id = :position AND o.ts = g.first_ts'
+                ' JOIN snapshots c ON c.position_id = :position AND c.ts = g.last_ts'
+                ' ORDER BY g.bucket')
+        return [Bar(*row) for row in self.connection.execute(query, params)]
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Легкий уровень получения страницы позиции: HTTP-запрос без браузера и разбор lxml
+
+Если сервер отдает размер позиции и курс ETH уже в HTML (серверная отрисовка) или
+во встроенном JSON-состоянии (__NEXT_DATA__, window.__STATE__ = {...}), запуск
+Chrome не нужен: запрос через пул соединений занимает десятки миллисекунд против
+секунд на запуск браузера и отрисовку. Если данных в ответе нет (страница
+собирается скриптами в браузере), анализатор переходит к уровню Chrome.
+
+В ответе сервера без отрисованной позиции суммы в долларах - это TVL пула и
+портфеля, поэтому размер позиции берется только из встроенного JSON, а курс ETH из
+текста - только по правилам с проверкой диапазона.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import requests
+
+from json_state import embedded_json, find_position_values, position_tokens
+from page_snapshot import snapshot_from_html
+from position_extractor import extract_from_snapshot
+from price_oracle import create_session
+
+HTTP_TIMEOUT = 15  # Таймаут HTTP-запроса страницы, секунд
+HTTP_POOL_SIZE = 8  # Соединений в пуле и одновременных запросов при предзагрузке пакета
+# Правила курса ETH из текста ответа, которым можно верить без браузера: значение
+# в скобках в диапазоне [eth_min, eth_max]. Последние варианты каскада
+# (page_rate_prefix_first без проверки диапазона, любое число number_text) не принимаются
+HTTP_RATE_RULES = frozenset({
+    'page_rate_suffix', 'page_rate_bare', 'text_bracket',
+    'page_rate_prefix', 'page_rate_suffix_thousands', 'page_rate_bare_thousands',
+})
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# Загруженная страница: HTML (None при ошибке), текст ошибки, время запроса в секундах
+FetchedPage = namedtuple('FetchedPage', ['html', 'error', 'seconds'])
+
+# Результат разбора ответа: значения и правила, как в ExtractionResult; для значений
+# из встроенного JSON правило - "json:<путь>"; tokens - символы токенов пула позиции
+# из встроенного JSON
+HttpExtraction = namedtuple('HttpExtraction', [
+    'position_usd', 'eth_rate',
+    'position_source', 'rate_source',
+    'error_page', 'json_documents', 'tokens',
+])
+
+_session = None
+
+
+def get_session():
+    """
+    Общая сессия с пулом соединений (создается при первом запросе)
+    """
+    global _session
+    if _session is None:
+        _session = create_session(HTTP_POOL_SIZE)
+        _session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+        })
+    return _session
+
+
+def fetch_page(url, timeout=HTTP_TIMEOUT):
+    """
+    Загружает HTML страницы. Ошибки сети и HTTP-статусы возвращаются в FetchedPage.error
+    """
+    started = time.time()
+    try:
+        response = get_session().get(url, timeout=timeout)
+        response.raise_for_status()
+        return FetchedPage(response.text, None, time.time() - started)
+    except requests.RequestException as e:
+        return FetchedPage(None, str(e), time.time() - started)
+
+
+def fetch_pages(urls, timeout=HTTP_TIMEOUT, workers=HTTP_POOL_SIZE):
+    """
+    Загружает страницы параллельно (до workers запросов одновременно).
+    Возвращает список FetchedPage в порядке urls
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as executor:
+        return list(executor.map(lambda url: fetch_page(url, timeout), urls))
+
+
+def extract_from_response(page_html, eth_min, eth_max, position_id=None):
+    """
+    Ищет размер позиции и курс ETH в ответе сервера. Размер позиции - только во
+    встроенном JSON, в объекте позиции position_id (неоднозначный размер считается
+    ненайденным). Курс ETH - в тексте HTML по правилам HTTP_RATE_RULES, иначе во
+    встроенном JSON. Ненайденное значение отправляет страницу в браузер
+    """
+    snapshot = snapshot_from_html(page_html)
+    if snapshot.is_error_page():
+        return HttpExtraction(None, None, None, None, True, 0, [])
+
+    result = extract_from_snapshot(snapshot, eth_min, eth_max)
+    eth_rate, rate_source = None, None
+    if result.rate_source in HTTP_RATE_RULES:
+        eth_rate, rate_source = result.eth_rate, result.rate_source
+
+    documents = embedded_json(page_html)
+    json_usd, json_rate, position_path, rate_path = find_position_values(documents, eth_min, eth_max, position_id)
+    position_usd, position_source = None, None
+    if json_usd is not None:
+        position_usd, position_source = json_usd, f'json:{position_path}'
+    if eth_rate is None and json_rate is not None:
+        eth_rate, rate_source = json_rate, f'json:{rate_path}'
+    return HttpExtraction(position_usd, eth_rate, position_source, rate_source, False, len(documents),
+                          position_tokens(documents, position_id))
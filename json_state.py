@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Поиск размера позиции и курса ETH в JSON-данных страницы
+
+Приложения часто отдают состояние вместе с HTML (<script type="application/json">,
+__NEXT_DATA__, window.__STATE__ = {...}) или получают его отдельными JSON-ответами.
+Структура этих данных заранее неизвестна и меняется, поэтому поиск не привязан
+к конкретным путям: обходятся все числовые значения (включая числа в строках
+"$93,676.56"), а кандидаты отбираются по имени ключа и его родителя:
+- размер позиции - ключи вида positionValueUsd, totalValueUSD, amountUsd.value
+  внутри объекта позиции (с tokenId/id запрошенной позиции или под ключом
+  "position"); вложенные объекты пула, токенов и портфеля (TVL пула, сумма
+  портфеля) не рассматриваются. Если подходящих значений несколько и они
+  различаются, размер позиции считается ненайденным - лучше перейти к
+  следующему уровню получения, чем взять чужую сумму;
+- курс ETH - ключи вида ethPriceUsd, eth.price, priceUSD (первое значение
+  в диапазоне [eth_min, eth_max]).
+Если объект описывает токен ({"symbol": "ETH", "price": {"value": 2395.87}}),
+символ добавляется к имени вложенных значений: "ETH.price.value".
+"""
+
+import json
+import re
+
+from lxml import etree
+
+from position_extractor import POSITION_MIN_USD
+
+POSITION_KEY_RE = re.compile(r'(position|total|liquidity).*(usd|value)|usd.?value|value.?usd', re.IGNORECASE)
+# Ключи, прямо называющие стоимость позиции (приоритетнее общих amountUsd, valueUsd)
+POSITION_NAMED_KEY_RE = re.compile(r'(position|total).*(usd|value)', re.IGNORECASE)
+# Суммы внутри позиции, которые не являются ее размером: комиссии, доходность, изменения
+POSITION_PART_KEY_RE = re.compile(r'fee|reward|earn|pnl|profit|ap[ry]|change|price|collect', re.IGNORECASE)
+# Вложенные объекты, не относящиеся к самой позиции: пул (TVL), токены, портфель
+FOREIGN_KEY_RE = re.compile(r'pool|token|portfolio|market|tvl|protocol|chart|histor', re.IGNORECASE)
+POSITION_OBJECT_KEY_RE = re.compile(r'^positions?$', re.IGNORECASE)
+POSITION_ID_KEYS = ('tokenId', 'positionId', 'id')
+RATE_KEY_RE = re.compile(r'(eth|weth|native).*(price|usd|rate)|price.?usd|usd.?price', re.IGNORECASE)
+NUMERIC_STRING_RE = re.compile(r'^\s*\$?\s*(\d[\d,]*(?:\.\d+)?)\s*\$?\s*$')
+
+# Присваивание состояния во встроенном скрипте: window.__STATE__ = {...};
+ASSIGNED_JSON_RE = re.compile(r'^[\w.$\[\]\'"]+\s*=\s*(\{.*\}|\[.*\])\s*;?\s*$', re.DOTALL)
+JSON_SCRIPT_TYPES = ('application/json', 'application/ld+json')
+SYMBOL_KEYS = ('symbol', 'ticker')  # Ключи с символом токена в объекте токена
+
+
+def walk_numbers(data, path=(), symbol=None):
+    """
+    Все числовые значения JSON: тройки (путь из ключей и индексов, число,
+    символ ближайшего объекта токена или None)
+    """
+    if isinstance(data, dict):
+        for key in SYMBOL_KEYS:
+            if isinstance(data.get(key), str):
+                symbol = data[key]
+                break
+        for key, value in data.items():
+            yield from walk_numbers(value, path + (key,), symbol)
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            yield from walk_numbers(value, path + (index,), symbol)
+    elif isinstance(data, bool):
+        return
+    elif isinstance(data, (int, float)):
+        yield path, float(data), symbol
+    elif isinstance(data, str) and len(data) < 40:
+        match = NUMERIC_STRING_RE.match(data)
+        if match:
+            yield path, float(match.group(1).replace(',', '')), symbol
+
+
+def key_name(path, symbol=None):
+    """
+    Имя значения для сопоставления с шаблонами: символ токена и последние два
+    строковых ключа пути ("eth.price", "positionValueUsd", "ETH.price.value")
+    """
+    keys = [key for key in path if isinstance(key, str)][-2:]
+    return '.'.join(([symbol] if symbol else []) + keys)
+
+
+def format_path(path):
+    return ''.join(f'[{key}]' if isinstance(key, int) else f'.{key}' for key in path).lstrip('.')
+
+
+def position_id_of(data):
+    """
+    Номер позиции в объекте: значение tokenId/positionId/id ("59044",
+    "unichain:59044"), None - если ключей нет
+    """
+    for key in POSITION_ID_KEYS:
+        value = data.get(key)
+        if isinstance(value, (int, str)) and not isinstance(value, bool):
+            return re.split(r'[:/_-]', str(value))[-1]
+    return None
+
+
+def position_objects(data, position_id=None, path=(), under_position=False):
+    """
+    Объекты позиции в документе: пары (путь, объект). С position_id - объекты с
+    этим номером; объекты под ключом "position"/"positions" без номера тоже
+    подходят, с другим номером - нет. Без position_id - объекты под этими ключами
+    """
+    if isinstance(data, dict):
+        object_id = position_id_of(data)
+        if position_id is not None and object_id == str(position_id):
+            yield path, data
+            return
+        if under_position and (object_id is None or position_id is None):
+            yield path, data
+            return
+        for key, value in data.items():
+            if isinstance(key, str):
+                yield from position_objects(value, position_id, path + (key,),
+                                            bool(POSITION_OBJECT_KEY_RE.match(key)))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            yield from position_objects(value, position_id, path + (index,), under_position)
+
+
+def own_numbers(data, path):
+    """
+    Числовые значения объекта позиции без вложенных объектов пула, токенов и портфеля
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(key, str) and FOREIGN_KEY_RE.search(key):
+                continue
+            yield from own_numbers(value, path + (key,))
+    else:
+        for number_path, value, _ in walk_numbers(data, path):
+            yield number_path, value
+
+
+def position_candidates(documents, position_id=None):
+    """
+    Кандидаты размера позиции: список (приоритет, значение, путь). Приоритет 0 -
+    ключ прямо называет позицию (positionValueUsd), 1 - общий (amountUsd.value).
+    Без объекта позиции в документе рассматриваются только ключи приоритета 0
+    вне пула, токенов и портфеля
+    """
+    candidates = []
+    for document in documents:
+        objects = list(position_objects(document, position_id))
+        if objects:
+            numbers = [number for path, data in objects for number in own_numbers(data, path)]
+        else:
+            numbers = [(path, value) for path, value, _ in walk_numbers(document)
+                       if not any(isinstance(key, str) and FOREIGN_KEY_RE.search(key) for key in path)]
+        for path, value in numbers:
+            name = key_name(path)
+            if value <= POSITION_MIN_USD or not POSITION_KEY_RE.search(name) or POSITION_PART_KEY_RE.search(name):
+                continue
+            own_key = [key for key in path if isinstance(key, str)][-1]
+            priority = 0 if POSITION_NAMED_KEY_RE.search(own_key) else 1
+            if objects or priority == 0:
+                candidates.append((priority, value, format_path(path)))
+    return candidates
+
+
+def choose_position_value(candidates):
+    """
+    Размер позиции из кандидатов: (значение, путь) или (None, None), если
+    кандидатов нет или среди лучших по приоритету есть разные суммы
+    """
+    if not candidates:
+        return None, None
+    best = min(priority for priority, _, _ in candidates)
+    chosen = [(value, path) for priority, value, path in candidates if priority == best]
+    if len({round(value, 2) for value, _ in chosen}) > 1:
+        return None, None
+    return chosen[0]
+
+
+def token_symbols(data):
+    """
+    Символы всех объектов токенов в данных, в порядке обхода
+    """
+    if isinstance(data, dict):
+        for key in SYMBOL_KEYS:
+            if isinstance(data.get(key), str):
+                yield data[key]
+                break
+        for value in data.values():
+            yield from token_symbols(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from token_symbols(value)
+
+
+def position_tokens(documents, position_id=None):
+    """
+    Символы токенов пула из объекта позиции position_id ("ETH", "USDC") - для
+    запроса их курсов вместе с курсом ETH
+    """
+    symbols = []
+    for document in documents:
+        for _, data in position_objects(document, position_id):
+            for symbol in token_symbols(data):
+                if symbol not in symbols:
+                    symbols.append(symbol)
+    return symbols
+
+
+def find_position_values(documents, eth_min, eth_max, position_id=None):
+    """
+    Ищет размер позиции и курс ETH в списке JSON-документов. position_id -
+    номер запрошенной позиции: размер берется только из ее объекта.
+    Возвращает (position_usd, eth_rate, путь позиции, путь курса); ненайденное
+    или неоднозначное - None
+    """
+    position_usd, position_path = choose_position_value(position_candidates(documents, position_id))
+    eth_rate = rate_path = None
+    for document in documents:
+        for path, value, symbol in walk_numbers(document):
+            if RATE_KEY_RE.search(key_name(path, symbol)) and eth_min <= value <= eth_max:
+                eth_rate, rate_path = value, format_path(path)
+                break
+        if eth_rate is not None:
+            break
+    return position_usd, eth_rate, position_path, rate_path
+
+
+def embedded_json(page_html):
+    """
+    JSON-документы, встроенные в HTML: скрипты application/json, __NEXT_DATA__ и
+    присваивания вида window.__STATE__ = {...}
+    """
+    if not page_html.strip():
+        return []
+    try:
+        root = etree.fromstring(page_html, etree.HTMLParser())
+    except (etree.ParserError, ValueError):
+        root = None
+    if root is None:
+        return []
+    documents = []
+    for script in root.iter('script'):
+        text = (script.text or '').strip()
+        if not text:
+            continue
+        script_type = (script.get('type') or '').lower()
+        if script_type in JSON_SCRIPT_TYPES or script.get('id') == '__NEXT_DATA__':
+            candidate = text
+        else:
+            match = ASSIGNED_JSON_RE.match(text)
+            if not match:
+                continue
+            candidate = match.group(1)
+        try:
+            documents.append(json.loads(candidate))
+        except ValueError:
+            continue
+    return documents
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Облегченная загрузка страницы в headless Chrome (--lean) и замер ее стоимости
+
+Для анализа нужны несколько текстовых значений, а приложение загружает картинки,
+шрифты, видео, аналитику и сторонние скрипты. В режиме --lean картинки отключены
+настройками профиля, а запросы по шаблонам URL (типы ресурсов по расширениям и
+домены аналитики) блокируются командой DevTools Network.setBlockedURLs еще до
+отправки. Скрипты и JSON-ответы самого приложения не блокируются, поэтому текст
+страницы и результаты извлечения не меняются.
+
+Стоимость загрузки каждой позиции: число запросов и байты по сети (по событиям
+сети из журнала производительности, network_capture.NetworkCapture), время
+загрузки страницы (Navigation Timing) и пиковая память Chrome - сумма VmHWM
+процессов браузера (потомков chromedriver) из /proc. Пик сбрасывается перед
+загрузкой записью в /proc/<pid>/clear_refs, поэтому он относится к одной позиции.
+"""
+
+import os
+from collections import namedtuple
+
+from network_capture import NetworkCapture
+
+# Шаблоны Network.setBlockedURLs: картинки, шрифты, медиа и аналитика. Службы
+# флагов функций (Statsig) не блокируются: от их ответов зависит, какие части
+# приложения отрисовываются, и без них страница позиции может не загрузить данные
+LEAN_BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mp3',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*sentry.io*', '*segment.io*', '*segment.com*', '*amplitude.com*',
+    '*datadoghq.com*', '*hotjar.com*', '*intercom.io*', '*walletconnect.com*',
+]
+
+# Настройки профиля: без картинок и уведомлений
+LEAN_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.default_content_setting_values.notifications': 2,
+}
+
+# Фоновые службы Chrome, которые не нужны для одной страницы
+LEAN_ARGUMENTS = [
+    '--blink-settings=imagesEnabled=false',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--mute-audio',
+    '--no-first-run',
+]
+
+# Время загрузки по Navigation Timing, мс от начала навигации
+LOAD_TIMING_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+return nav ? [nav.domContentLoadedEventEnd, nav.loadEventEnd] : [0, 0];
+"""
+
+# Стоимость загрузки позиции; None - не удалось измерить
+PageLoadStats = namedtuple('PageLoadStats', [
+    'requests', 'blocked', 'bytes',
+    'dom_seconds', 'load_seconds',   # DOMContentLoaded и load; None, если событие не наступило
+    'peak_rss_mb',                   # сумма VmHWM процессов Chrome, МБ
+])
+
+
+def apply_lean_options(options):
+    """
+    Добавляет к настройкам Chrome отключение картинок и фоновых служб
+    """
+    for argument in LEAN_ARGUMENTS:
+        options.add_argument(argument)
+    options.add_experimental_option('prefs', LEAN_PREFS)
+
+
+def block_requests(driver, patterns=LEAN_BLOCKED_URL_PATTERNS):
+    """
+    Блокирует запросы по шаблонам URL во вкладке драйвера (действует на все
+    следующие загрузки страниц в ней)
+    """
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+
+
+def browser_pids(driver):
+    """
+    Процессы браузера: все потомки процесса chromedriver (пустой список, если
+    /proc недоступен или у драйвера нет своего процесса)
+    """
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None or not os.path.isdir('/proc'):
+        return []
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                # Имя процесса в скобках может содержать пробелы: PPID - второе поле после ")"
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    pids = []
+    stack = [process.pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            pids.append(child)
+            stack.append(child)
+    return pids
+
+
+def reset_peak_rss(pids):
+    """
+    Сбрасывает пиковую память процессов до текущей (clear_refs 5)
+    """
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            continue
+
+
+def peak_rss_mb(pids):
+    """
+    Сумма пиковой памяти (VmHWM) процессов, МБ, или None
+    """
+    total_kb = 0
+    found = False
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total_kb += int(line.split()[1])
+                        found = True
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024 if found else None
+
+
+class PageLoadRecorder:
+    """
+    Замер стоимости загрузки страницы: start() перед driver.get, finish() после
+    извлечения. capture - NetworkCapture, уже читающий журнал событий (режим
+    --network-capture); без него создается свой, только со счетчиками
+    """
+
+    def __init__(self, driver, capture=None):
+        self.driver = driver
+        self.capture = capture or NetworkCapture(driver, read_bodies=False)
+        self.pids = []
+
+    def start(self):
+        self.capture.reset()
+        # Процессы отрисовки создаются и завершаются по ходу работы - список на каждую страницу
+        self.pids = browser_pids(self.driver)
+        reset_peak_rss(self.pids)
+
+    def finish(self):
+        self.capture.poll()
+        timing = self.driver.execute_script(LOAD_TIMING_SCRIPT) or [0, 0]
+        dom_ms, load_ms = (list(timing) + [0, 0])[:2]
+        pids = set(self.pids) | set(browser_pids(self.driver))
+        return PageLoadStats(
+            self.capture.requests, self.capture.blocked, self.capture.bytes,
+            dom_ms / 1000 if dom_ms else None, load_ms / 1000 if load_ms else None,
+            peak_rss_mb(pids))
+
+
+def format_load_stats(load):
+    """
+    Строка для вывода: "запросов 85 (заблокировано 40), 1,234 КБ, загрузка 2.1 с, ..."
+    """
+    parts = [f"запросов {load.requests}" + (f" (заблокировано {load.blocked})" if load.blocked else ""),
+             f"{load.bytes / 1024:,.0f} КБ"]
+    if load.dom_seconds is not None:
+        parts.append(f"DOMContentLoaded {load.dom_seconds:.2f} с")
+    parts.append(f"загрузка {load.load_seconds:.2f} с" if load.load_seconds is not None else "загрузка не завершена")
+    if load.peak_rss_mb is not None:
+        parts.append(f"пиковая память Chrome {load.peak_rss_mb:,.0f} МБ")
+    return ", ".join(parts)
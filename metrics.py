@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замеры времени по фазам и счетчики анализатора
+
+Фазы (запуск браузера, навигация, ожидание данных, снимок страницы, разбор,
+запрос курса через API и т.д.) оборачиваются в span("имя"): длительность каждой
+фазы попадает в гистограмму, а при включенной трассировке (--profile) - еще и в
+список событий, который записывается в JSON в формате Trace Event (открывается в
+chrome://tracing и ui.perfetto.dev) вместе со сводкой по фазам. Счетчики
+(inc) отмечают, какое правило дало размер позиции и курс ETH, какой уровень
+получения страницы ответил, сколько позиций обработано.
+
+Для долгой работы (режим наблюдения) метрики отдаются в текстовом формате
+Prometheus на локальном порту (start_metrics_server, --metrics-port).
+
+При долгой работе с --profile (режим наблюдения) хранятся только последние
+TRACE_MAX_EVENTS событий: более старые отбрасываются, их число попадает в
+трассировку (droppedEvents). Гистограммы и счетчики при этом полные.
+
+Реестр один на процесс. Процессы параллельного режима передают свои замеры
+основному процессу (drain/merge), и они попадают в общий отчет.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PREFIX = 'uniswap_analyzer'
+# Границы гистограммы длительностей фаз, секунд
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+TRACE_MAX_EVENTS = 100000  # Событий трассировки в памяти, дальше отбрасываются самые старые
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+class Metrics:
+    """
+    Реестр замеров процесса: гистограммы фаз, счетчики и (при трассировке) события
+    """
+
+    def __init__(self, max_events=TRACE_MAX_EVENTS):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.origin = time.time()
+        self.tracing = False
+        self.max_events = max_events
+        self.events = deque(maxlen=max_events)  # последние события трассировки (только при tracing)
+        self.dropped_events = 0  # событий, вытесненных ограничением max_events
+        self.histograms = {}  # (фаза, метки) -> [счетчики по границам..., сумма, число]
+        self.counters = {}    # (имя, метки) -> значение
+
+    def enable_tracing(self):
+        self.tracing = True
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Замер фазы: with metrics.span('navigate'): ...
+        """
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(name)
+        started = time.time()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self.observe(name, time.time() - started, started, labels, parent=stack[-1] if stack else None)
+
+    def observe(self, name, seconds, started=None, labels=None, parent=None):
+        """
+        Добавляет длительность фазы (для замеров, сделанных без span)
+        """
+        labels = labels or {}
+        with self.lock:
+            histogram = self.histograms.setdefault((name, _label_key(labels)), [0] * (len(SPAN_BUCKETS) + 2))
+            for index, bound in enumerate(SPAN_BUCKETS):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            if self.tracing:
+                started = time.time() - seconds if started is None else started
+                if len(self.events) == self.max_events:
+                    self.dropped_events += 1
+                self.events.append({
+                    'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident() % 100000,
+                    'ts': round((started - self.origin) * 1e6), 'dur': round(seconds * 1e6),
+                    'args': dict(labels, **({'parent': parent} if parent else {})),
+                })
+
+    def inc(self, name, value=1, **labels):
+        """
+        Увеличивает счетчик: metrics.inc('position_source', rule='first_dollar_us')
+        """
+        with self.lock:
+            key = (name, _label_key(labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def drain(self):
+        """
+        Забирает накопленные замеры (для передачи из процесса параллельного режима)
+        """
+        with self.lock:
+            state = {'histograms': self.histograms, 'counters': self.counters,
+                     'events': list(self.events), 'dropped_events': self.dropped_events, 'origin': self.origin}
+            self.histograms, self.counters = {}, {}
+            self.events, self.dropped_events = deque(maxlen=self.max_events), 0
+        return state
+
+    def merge(self, state):
+        """
+        Добавляет замеры, полученные drain в другом процессе
+        """
+        shift = round((state['origin'] - self.origin) * 1e6)
+        with self.lock:
+            for key, values in state['histograms'].items():
+                histogram = self.histograms.setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    histogram[index] += value
+            for key, value in state['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            if self.tracing:
+                overflow = max(0, len(self.events) + len(state['events']) - self.max_events)
+                self.dropped_events += state.get('dropped_events', 0) + overflow
+                self.events.extend(dict(event, ts=event['ts'] + shift) for event in state['events'])
+
+    def summary(self):
+        """
+        Сводка по фазам: {фаза: {'count', 'total', 'mean'}} (метки суммируются)
+        """
+        result = {}
+        with self.lock:
+            for (name, _), histogram in self.histograms.items():
+                entry = result.setdefault(name, {'count': 0, 'total': 0.0})
+                entry['count'] += histogram[-1]
+                entry['total'] += histogram[-2]
+        for entry in result.values():
+            entry['mean'] = entry['total'] / entry['count'] if entry['count'] else 0.0
+        return result
+
+    def write_trace(self, path):
+        """
+        Записывает трассировку (Trace Event JSON), сводку по фазам и счетчики
+        """
+        with self.lock:
+            events = list(self.events)
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        trace = {
+            'traceEvents': sorted(events, key=lambda event: event['ts']),
+            'displayTimeUnit': 'ms',
+            'summary': self.summary(),
+            'counters': counters,
+            'droppedEvents': self.dropped_events,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f, ensure_ascii=False, indent=1)
+
+    def prometheus_text(self):
+        """
+        Метрики в текстовом формате Prometheus
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        metric = f'{METRICS_PREFIX}_phase_seconds'
+        if histograms:
+            lines.append(f'# HELP {metric} Длительность фаз анализа')
+            lines.append(f'# TYPE {metric} histogram')
+        for (name, labels), histogram in histograms:
+            key = (('phase', name),) + labels
+            for index, bound in enumerate(SPAN_BUCKETS):
+                lines.append(f'{metric}_bucket{_format_labels(key, [("le", f"{bound:g}")])} {histogram[index]}')
+            lines.append(f'{metric}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram[-1]}')
+            lines.append(f'{metric}_sum{_format_labels(key)} {histogram[-2]:.6f}')
+            lines.append(f'{metric}_count{_format_labels(key)} {histogram[-1]}')
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f'{METRICS_PREFIX}_{name}_total'
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+# Реестр процесса
+metrics = Metrics()
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=metrics):
+    """
+    Отдает метрики по http://host:port/metrics в фоновом потоке. Возвращает сервер
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            data = registry.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Перехват JSON-ответов приложения через Chrome DevTools Protocol
+
+Приложение Uniswap собирает страницу позиции из JSON/GraphQL-ответов своего API.
+Вместо разбора отрисованного текста браузер записывает события сети в журнал
+производительности (goog:loggingPrefs performance): по Network.responseReceived
+отбираются JSON-ответы, по Network.loadingFinished их тела читаются командой
+Network.getResponseBody, и размер позиции и курс ETH ищутся в структурированных
+данных (json_state.find_position_values). Ожидание заканчивается, как только
+нужные ответы пришли, - без ожидания отрисовки страницы.
+
+Попутно по тем же событиям считается трафик страницы: число запросов, байты по
+сети (encodedDataLength) и запросы, заблокированные в режиме --lean.
+"""
+
+import base64
+import json
+import time
+from collections import namedtuple
+
+from json_state import choose_position_value, find_position_values, position_candidates
+
+NETWORK_POLL_INTERVAL = 0.1  # Интервал чтения журнала событий сети, секунд
+JSON_MIME_MARKERS = ('json', 'graphql')
+
+# Тело JSON-ответа: URL и разобранные данные
+CapturedResponse = namedtuple('CapturedResponse', ['url', 'data'])
+
+# Значения из ответов сети; source - "<URL> json:<путь>"
+NetworkValues = namedtuple('NetworkValues', ['position_usd', 'eth_rate', 'position_source', 'rate_source'])
+
+
+def enable_performance_log(options):
+    """
+    Включает журнал производительности Chrome с событиями сети (Network.*)
+    """
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def enable_network_capture(options):
+    """
+    Настраивает Chrome для перехвата: журнал событий сети и возврат из driver.get
+    сразу после начала навигации (pageLoadStrategy none), чтобы ответы читались по
+    мере поступления
+    """
+    enable_performance_log(options)
+    options.page_load_strategy = 'none'
+
+
+def is_json_response(response):
+    mime_type = (response.get('mimeType') or '').lower()
+    return any(marker in mime_type for marker in JSON_MIME_MARKERS) or 'graphql' in response.get('url', '')
+
+
+class NetworkCapture:
+    """
+    Сбор JSON-ответов страницы и счетчиков трафика из журнала производительности
+    драйвера. read_bodies=False - только счетчики, без чтения тел ответов
+    """
+
+    def __init__(self, driver, read_bodies=True):
+        self.driver = driver
+        self.read_bodies = read_bodies
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.pending = {}     # requestId -> URL ответа, тело которого еще не загружено
+        self.responses = []   # CapturedResponse в порядке завершения загрузки
+        self.body_errors = 0
+        self.requests = 0     # отправленные запросы
+        self.bytes = 0        # получено по сети, байт (с заголовками и сжатием)
+        self.blocked = 0      # запросы, заблокированные Network.setBlockedURLs
+
+    def reset(self):
+        """
+        Очищает журнал событий от предыдущих страниц
+        """
+        self.driver.get_log('performance')
+        self.reset_counters()
+
+    def poll(self):
+        """
+        Читает новые события сети. Возвращает список новых CapturedResponse
+        """
+        captured = []
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            method = message.get('method')
+            params = message.get('params') or {}
+            if method == 'Network.requestWillBeSent':
+                self.requests += 1
+            elif method == 'Network.loadingFailed':
+                if params.get('blockedReason'):
+                    self.blocked += 1
+            elif method == 'Network.loadingFinished':
+                self.bytes += int(params.get('encodedDataLength') or 0)
+            if not self.read_bodies:
+                continue
+            if method == 'Network.responseReceived':
+                response = params.get('response') or {}
+                if is_json_response(response) and response.get('status', 200) < 400:
+                    self.pending[params.get('requestId')] = response.get('url', '')
+            elif method == 'Network.loadingFinished' and params.get('requestId') in self.pending:
+                url = self.pending.pop(params['requestId'])
+                data = self.response_body(params['requestId'])
+                if data is not None:
+                    captured.append(CapturedResponse(url, data))
+        self.responses.extend(captured)
+        return captured
+
+    def response_body(self, request_id):
+        """
+        Тело ответа, разобранное как JSON (None, если тело недоступно или не JSON)
+        """
+        try:
+            body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            text = body.get('body') or ''
+            if body.get('base64Encoded'):
+                text = base64.b64decode(text).decode('utf-8', errors='replace')
+            return json.loads(text)
+        except Exception:
+            # Тело могло быть уже вытеснено из буфера браузера или не быть JSON
+            self.body_errors += 1
+            return None
+
+    def find_values(self, eth_min, eth_max, position_id=None):
+        """
+        Размер позиции position_id и курс ETH (из первого ответа, где он есть) по
+        всем собранным ответам. Размер позиции выбирается из кандидатов всех
+        ответов вместе: разные суммы в разных ответах - неоднозначность, размер не найден
+        """
+        eth_rate = rate_source = None
+        candidates = []
+        for response in self.responses:
+            candidates.extend((priority, value, f"{response.url} json:{path}")
+                              for priority, value, path in position_candidates([response.data], position_id))
+            if eth_rate is None:
+                _, rate, _, rate_path = find_position_values([response.data], eth_min, eth_max)
+                if rate is not None:
+                    eth_rate, rate_source = rate, f"{response.url} json:{rate_path}"
+        position_usd, position_source = choose_position_value(candidates)
+        return NetworkValues(position_usd, eth_rate, position_source, rate_source)
+
+    def wait_for_values(self, eth_min, eth_max, timeout, poll_interval=NETWORK_POLL_INTERVAL, position_id=None):
+        """
+        Ждет ответов с размером позиции position_id и курсом ETH.
+        Возвращает (NetworkValues, статус 'ready' или 'timeout', затраченное время в секундах)
+        """
+        started = time.time()
+        values = NetworkValues(None, None, None, None)
+        while True:
+            if self.poll():
+                values = self.find_values(eth_min, eth_max, position_id)
+                if values.position_usd is not None and values.eth_rate is not None:
+                    return values, 'ready', time.time() - started
+            if time.time() - started >= timeout:
+                return values, 'timeout', time.time() - started
+            time.sleep(poll_interval)
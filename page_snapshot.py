@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Снимок текста страницы за один запрос к браузеру
+
+Вместо find_elements + чтения el.text для каждого элемента (каждое чтение - отдельный
+HTTP-запрос к chromedriver) в страницу внедряется один скрипт, который возвращает
+заголовок, HTML и все видимые текстовые элементы с путем тегов/классов.
+Дальнейший разбор идет по этому снимку в памяти.
+
+Снимок можно построить и без браузера из сохраненного HTML (snapshot_from_html) -
+это используется для офлайн-разбора и бенчмарков.
+"""
+
+from collections import namedtuple
+
+from lxml import etree
+
+# Элементы, у которых есть собственный текстовый узел (аналог XPath "//*[text()]").
+# Для каждого возвращается видимый текст (как el.text в Selenium: nbsp -> пробел, обрезка
+# пробелов), первый собственный текстовый узел (для аналога contains(text(), '$'))
+# и путь из последних предков вида "div.cls>span.cls".
+SNAPSHOT_SCRIPT = r"""
+const PATH_DEPTH = 4;
+function isVisible(el) {
+    if (el.checkVisibility) {
+        return el.checkVisibility({visibilityProperty: true});
+    }
+    return el.getClientRects().length > 0;
+}
+function elementName(el) {
+    let name = el.tagName.toLowerCase();
+    const cls = typeof el.className === 'string' ? el.className.trim() : '';
+    if (cls) {
+        name += '.' + cls.split(/\s+/).join('.');
+    }
+    return name;
+}
+function elementPath(el) {
+    const parts = [];
+    for (let node = el; node && node.nodeType === 1 && parts.length < PATH_DEPTH; node = node.parentElement) {
+        parts.unshift(elementName(node));
+    }
+    return parts.join('>');
+}
+const nodes = [];
+for (const el of document.querySelectorAll('*')) {
+    let firstText = null;
+    for (const child of el.childNodes) {
+        if (child.nodeType === 3) {
+            firstText = child.nodeValue;
+            break;
+        }
+    }
+    if (firstText === null || !isVisible(el)) {
+        continue;
+    }
+    const text = (el.innerText || '').replace(/\u00a0/g, ' ').trim();
+    if (text) {
+        nodes.push([text, firstText, elementPath(el)]);
+    }
+}
+return {
+    title: document.title,
+    html: document.documentElement.outerHTML,
+    nodes: nodes
+};
+"""
+
+# Сколько последних предков включать в путь элемента
+PATH_DEPTH = 4
+
+# Элементы, текст которых не отображается на странице
+INVISIBLE_TAGS = frozenset(['head', 'title', 'meta', 'link', 'script', 'style', 'noscript', 'template', 'svg'])
+
+TextNode = namedtuple('TextNode', ['text', 'first_text', 'path'])
+
+
+class PageSnapshot(namedtuple('PageSnapshot', ['title', 'html', 'nodes'])):
+    """
+    Снимок страницы: заголовок, HTML и список видимых текстовых элементов (TextNode)
+    """
+    __slots__ = ()
+
+    def texts(self):
+        """Тексты всех элементов с собственным текстом"""
+        return [node.text for node in self.nodes]
+
+    def dollar_texts(self):
+        """Тексты элементов, собственный текст которых содержит символ $"""
+        return [node.text for node in self.nodes if '$' in node.first_text and '$' in node.text]
+
+    def number_texts(self):
+        """Тексты элементов, содержащие цифры"""
+        return [node.text for node in self.nodes if any(c.isdigit() for c in node.text)]
+
+    def is_error_page(self):
+        """Признак страницы ошибки Chrome или приложения"""
+        return "ERR_" in self.html or "error" in (self.title or "").lower()
+
+
+def take_snapshot(driver):
+    """
+    Делает снимок текущей страницы одним вызовом execute_script
+    """
+    data = driver.execute_script(SNAPSHOT_SCRIPT)
+    nodes = [TextNode(*node) for node in data.get('nodes') or []]
+    return PageSnapshot(data.get('title') or '', data.get('html') or '', nodes)
+
+
+def _is_visible(element):
+    return element.tag not in INVISIBLE_TAGS and 'hidden' not in element.attrib
+
+
+def _visible_texts(root):
+    """
+    Видимый текст каждого элемента (аналог innerText без учета CSS) за один проход:
+    элементы обходятся от листьев к корню, текст потомков не пересчитывается
+    """
+    texts = {}
+    for element in reversed(list(root.iter(etree.Element))):
+        parts = [element.text or '']
+        for child in element:
+            if isinstance(child.tag, str) and _is_visible(child):
+                parts.append(texts[child])
+            parts.append(child.tail or '')
+        texts[element] = ''.join(parts)
+    return texts
+
+
+def _first_text(element):
+    """
+    Первый собственный текстовый узел элемента (None, если их нет)
+    """
+    if element.text is not None:
+        return element.text
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+def _element_name(element):
+    name = element.tag
+    classes = (element.get('class') or '').split()
+    if classes:
+        name += '.' + '.'.join(classes)
+    return name
+
+
+def snapshot_from_html(page_html):
+    """
+    Строит снимок из сохраненного HTML без браузера (CSS не учитывается:
+    невидимыми считаются только служебные теги и элементы с атрибутом hidden)
+    """
+    if not page_html.strip():
+        return PageSnapshot('', page_html, [])
+    try:
+        root = etree.fromstring(page_html, etree.HTMLParser())
+    except (etree.ParserError, ValueError):
+        root = None
+    if root is None:
+        return PageSnapshot('', page_html, [])
+
+    title = root.findtext('.//title') or ''
+    texts = _visible_texts(root)
+    nodes = []
+    # Обход в порядке документа с пропуском невидимых поддеревьев;
+    # для каждого элемента хранится путь из последних PATH_DEPTH предков
+    stack = [(root, ())]
+    while stack:
+        element, parent_path = stack.pop()
+        if not _is_visible(element):
+            continue
+        path = (parent_path + (_element_name(element),))[-PATH_DEPTH:]
+        first_text = _first_text(element)
+        if first_text is not None:
+            text = texts[element].replace('\xa0', ' ').strip()
+            if text:
+                nodes.append(TextNode(text, first_text, '>'.join(path)))
+        stack.extend((child, path) for child in reversed(element) if isinstance(child.tag, str))
+    return PageSnapshot(title.strip(), page_html, nodes)
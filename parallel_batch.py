@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Параллельный пакетный анализ: несколько процессов, в каждом свой headless Chrome
+
+Позиции раздаются через общую очередь заданий: свободный процесс берет следующую
+позицию, поэтому медленные страницы не задерживают остальные. Если после
+повторной попытки внутри extract_position_data_selenium позиция все равно попала
+на страницу ошибки (ERR_ / заголовок ошибки), задание возвращается в очередь и
+может достаться другому процессу. Результаты собираются в порядке входного списка
+независимо от порядка завершения.
+
+Число процессов ограничено числом ядер и свободной памятью: каждый Chrome занимает
+сотни мегабайт, и при нехватке памяти параллельные браузеры только замедляют друг
+друга или завершаются системой.
+"""
+
+import io
+import multiprocessing
+import os
+import queue
+import time
+from collections import namedtuple
+from contextlib import redirect_stdout
+
+CHROME_MEMORY_MB = 400  # Оценка памяти на один процесс с headless Chrome, МБ
+MEMORY_RESERVE_MB = 512  # Память, которая остается системе и основному процессу, МБ
+PARALLEL_RETRIES = 2  # Повторов позиции, попавшей на страницу ошибки
+WORKER_STOP_TIMEOUT = 30  # Ожидание завершения процессов (закрытия браузеров), секунд
+
+# Результат обработки позиции процессом
+TaskResult = namedtuple('TaskResult', [
+    'index', 'position_id', 'attempt', 'worker',
+    'position_usd', 'eth_rate', 'error_page',
+    'elapsed', 'waited', 'webdriver_calls',
+    'load',  # стоимость загрузки страницы (lean_load.PageLoadStats) или None
+    'metrics',  # замеры фаз и счетчики процесса за задание (metrics.Metrics.drain)
+    'log',  # вывод извлечения (печатается основным процессом)
+])
+
+
+def available_memory_mb():
+    """
+    Доступная память в МБ (MemAvailable из /proc/meminfo, иначе sysconf) или None
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def plan_workers(task_count, requested=0, chrome_memory_mb=CHROME_MEMORY_MB):
+    """
+    Число процессов: requested (0 - по числу ядер), но не больше, чем позволяет
+    свободная память, и не больше числа позиций. Возвращает (число, ограничение памятью или None)
+    """
+    workers = requested or os.cpu_count() or 1
+    memory_limit = None
+    memory = available_memory_mb()
+    if memory is not None:
+        memory_limit = max(1, (memory - MEMORY_RESERVE_MB) // chrome_memory_mb)
+        workers = min(workers, memory_limit)
+    return max(1, min(workers, task_count)), memory_limit
+
+
+def worker_main(worker, tasks, results, eth_min, eth_max, timeout, driver_options=None, tracing=False,
+                snapshot_options=None):
+    """
+    Процесс-обработчик: запускает свой Chrome и обрабатывает задания из очереди до
+    получения None. Каждое задание - (индекс, номер позиции, URL, попытка).
+    driver_options - параметры create_chrome_driver; с network_capture данные берутся
+    из перехваченных ответов API вместо отрисованной страницы. tracing - записывать
+    события трассировки фаз (--profile), snapshot_options - параметры записи
+    снимков страниц (SnapshotWriter) или None
+    """
+    # Импорт здесь: модуль анализатора импортирует этот модуль
+    from metrics import metrics
+    from snapshot_writer import SnapshotWriter
+    from uniswap_analyzer import (create_chrome_driver, extract_position_data_network,
+                                  extract_position_data_selenium)
+
+    if tracing:
+        metrics.enable_tracing()
+    driver_options = driver_options or {}
+    if driver_options.get('network_capture'):
+        extract = extract_position_data_network
+    else:
+        extract = extract_position_data_selenium
+    try:
+        driver = create_chrome_driver(**driver_options)
+    except Exception as e:
+        results.put(('failed', worker, str(e)))
+        return
+    # Снимки всех процессов - в одной папке: одинаковые страницы хранятся один раз
+    snapshots = SnapshotWriter(**snapshot_options) if snapshot_options else None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, position_id, url, attempt = task
+            results.put(('started', worker, index))
+            log = io.StringIO()
+            stats = {}
+            started = time.time()
+            with redirect_stdout(log):
+                position_usd, eth_rate = extract(
+                    url, eth_min, eth_max, driver=driver, timeout=timeout, stats=stats, snapshots=snapshots)
+            results.put(('done', worker, TaskResult(
+                index, position_id, attempt, worker, position_usd, eth_rate, stats.get('error_page', False),
+                time.time() - started, sum(seconds for _, _, seconds in stats.get('waits', [])),
+                stats.get('webdriver_calls', 0), stats.get('load'), metrics.drain(), log.getvalue())))
+    finally:
+        driver.quit()
+        if snapshots is not None:
+            # Ограничения папки применяет основной процесс после завершения всех процессов
+            snapshots.close(prune=False)
+
+
+def run_parallel(position_ids, url_template, eth_min, eth_max, timeout, workers,
+                 retries=PARALLEL_RETRIES, on_result=None, driver_options=None, tracing=False,
+                 snapshot_options=None):
+    """
+    Обрабатывает позиции в workers процессах. on_result(result, retry) вызывается
+    при каждом завершенном задании, driver_options - параметры запуска Chrome в
+    процессах, tracing - записывать в процессах события трассировки,
+    snapshot_options - параметры записи снимков страниц в процессах.
+    Возвращает список TaskResult в порядке position_ids (None для позиций,
+    которые не удалось обработать)
+    """
+    context = multiprocessing.get_context('spawn')
+    tasks, results = context.Queue(), context.Queue()
+    for index, position_id in enumerate(position_ids):
+        tasks.put((index, position_id, url_template.format(position=position_id), 1))
+
+    processes = {}
+    for worker in range(1, workers + 1):
+        process = context.Process(target=worker_main,
+                                  args=(worker, tasks, results, eth_min, eth_max, timeout, driver_options,
+                                        tracing, snapshot_options),
+                                  daemon=True)
+        process.start()
+        processes[worker] = process
+
+    final = {}
+    in_flight = {}  # процесс -> индекс позиции, которую он обрабатывает
+    failed_workers = set()
+    try:
+        while len(final) < len(position_ids):
+            try:
+                kind, worker, payload = results.get(timeout=1)
+            except queue.Empty:
+                # Задание упавшего процесса возвращается в очередь
+                for worker, process in processes.items():
+                    if worker in in_flight and not process.is_alive():
+                        index = in_flight.pop(worker)
+                        print(f"Процесс {worker} завершился аварийно, позиция {position_ids[index]} "
+                              f"возвращена в очередь")
+                        tasks.put((index, position_ids[index],
+                                   url_template.format(position=position_ids[index]), 1))
+                        failed_workers.add(worker)
+                if not any(process.is_alive() for process in processes.values()):
+                    print("Все процессы завершились")
+                    break
+                continue
+
+            if kind == 'failed':
+                print(f"Процесс {worker}: не удалось запустить браузер: {payload}")
+                failed_workers.add(worker)
+                if len(failed_workers) == len(processes):
+                    break
+            elif kind == 'started':
+                in_flight[worker] = payload
+            else:
+                result = payload
+                in_flight.pop(worker, None)
+                retry = result.error_page and result.attempt <= retries
+                if retry:
+                    tasks.put((result.index, result.position_id,
+                               url_template.format(position=result.position_id), result.attempt + 1))
+                else:
+                    final[result.index] = result
+                if on_result is not None:
+                    on_result(result, retry)
+    finally:
+        for _ in processes:
+            tasks.put(None)
+        deadline = time.time() + WORKER_STOP_TIMEOUT
+        for process in processes.values():
+            process.join(max(0.1, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+    return [final.get(index) for index in range(len(position_ids))]
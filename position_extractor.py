@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Извлечение размера позиции и курса ETH из снимка страницы Uniswap
+
+Грамматики чисел скомпилированы один раз при импорте. HTML страницы разбирается
+за один проход: из него выделяются все группы в скобках, начинающиеся с числа
+(кандидаты в курс ETH), и дальше правила выбора работают только с ними, а не
+сканируют весь HTML для каждого шаблона. Правила выбора повторяют прежний каскад
+из extract_position_data_selenium и дают те же результаты.
+"""
+
+import re
+from collections import namedtuple
+
+# === ГРАММАТИКИ ЧИСЕЛ ===
+# Число с разделителями тысяч (запятая или пробел) и дробной частью (точка или запятая):
+# "2 395,87", "2,314.00", "93676"
+NUMBER = r'\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?'
+# Число в формате США: "93,676.56"
+US_NUMBER = r'\d{1,3}(?:,\d{3})*(?:\.\d+)?'
+
+# Неразрывные пробелы (обычный и узкий) заменяются обычным пробелом перед разбором:
+# во французской и русской локалях они разделяют разряды ("93\u202f676,56 $"),
+# а пробел грамматика NUMBER принимает как разделитель тысяч
+NBSP_TABLE = str.maketrans('\u202f\xa0', '  ')
+
+DOLLAR_SUFFIX_RE = re.compile(rf'({NUMBER})\s*\$')   # 1,234.56 $ или 1 234,56 $
+DOLLAR_PREFIX_RE = re.compile(rf'\$({NUMBER})')      # $1,234.56
+US_NUMBER_RE = re.compile(rf'({US_NUMBER})')
+PLAIN_NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+NUMBER_RE = re.compile(rf'({NUMBER})')
+BRACKET_RE = re.compile(r'\(([^)]+)\)')
+DIGIT_COMMA_RE = re.compile(r'(\d),(\d)')
+
+RATE_SUFFIX_RE = re.compile(rf'\(({NUMBER})\s*\$\)')  # (2 395,87 $)
+RATE_BARE_RE = re.compile(rf'\(({NUMBER})\)')         # (2 395,87)
+RATE_PREFIX_RE = re.compile(rf'\(\$({NUMBER})\)')     # ($2,314.00)
+
+# Токенизатор HTML: группа в скобках, состоящая только из цифр, разделителей,
+# пробелов (включая неразрывные) и $, начинающаяся с числа или "$число".
+# Любое совпадение шаблонов RATE_* является такой группой целиком, поэтому
+# достаточно одного прохода по HTML.
+PAREN_GROUP_RE = re.compile(r'\([\s$]*\d[\d\s,.$]*\)')
+
+# Минимальный размер позиции для поиска по суммам в долларах
+POSITION_MIN_USD = 1000
+
+# === ТИПЫ КАНДИДАТОВ ===
+KIND_DOLLAR = 'dollar'  # сумма в долларах из текста элемента
+KIND_RATE = 'rate'      # группа в скобках из HTML
+KIND_NUMBER = 'number'  # число из текста элемента без символа $
+
+# raw - найденная строка, clean - она же с обычными пробелами вместо неразрывных,
+# context - текст элемента (или группа в скобках), где она найдена,
+# index - порядковый номер этого текста (группы) на странице
+Candidate = namedtuple('Candidate', ['kind', 'raw', 'clean', 'context', 'index'])
+
+# position_source/rate_source - имя правила, которое дало значение (None, если не найдено)
+ExtractionResult = namedtuple('ExtractionResult', [
+    'position_usd', 'eth_rate',
+    'position_source', 'rate_source',
+    'position_text', 'rate_text',
+])
+
+
+def normalize_nbsp(text):
+    """
+    Заменяет неразрывные пробелы (обычный и узкий) обычными
+    """
+    if '\xa0' in text or '\u202f' in text:
+        return text.translate(NBSP_TABLE)
+    return text
+
+
+def parse_loose(value):
+    """
+    Разбор числа как в исходном каскаде: пробелы убираются, запятая считается
+    десятичным разделителем. Возвращает None, если строка не является числом
+    """
+    try:
+        return float(value.replace(' ', '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def parse_thousands(value):
+    """
+    Разбор числа с запятыми-разделителями тысяч ("2,314.00" -> 2314.0).
+    Возвращает None, если строка не является числом
+    """
+    try:
+        return float(DIGIT_COMMA_RE.sub(r'\1\2', value.replace(' ', '')))
+    except ValueError:
+        return None
+
+
+def tokenize_dollar_texts(dollar_texts):
+    """
+    Кандидаты сумм в долларах: числа перед или после символа $ в текстах элементов
+    """
+    candidates = []
+    for index, text in enumerate(dollar_texts):
+        clean = normalize_nbsp(text)
+        for pattern in (DOLLAR_SUFFIX_RE, DOLLAR_PREFIX_RE):
+            for match in pattern.findall(clean):
+                candidates.append(Candidate(KIND_DOLLAR, match, match, text, index))
+    return candidates
+
+
+def tokenize_page(page_html):
+    """
+    Кандидаты курса: группы в скобках, начинающиеся с числа, за один проход по HTML.
+    Повторы одной и той же группы отбрасываются: правила выбора берут первое
+    подходящее значение, а оно всегда приходится на первое вхождение группы
+    """
+    groups = dict.fromkeys(PAREN_GROUP_RE.findall(page_html))
+    return [Candidate(KIND_RATE, group, normalize_nbsp(group), group, index)
+            for index, group in enumerate(groups)]
+
+
+def tokenize_number_texts(number_texts):
+    """
+    Кандидаты чисел из текстов элементов без символа $
+    """
+    return [Candidate(KIND_NUMBER, match, match, text, index)
+            for index, text in enumerate(number_texts)
+            for match in NUMBER_RE.findall(text)]
+
+
+def select_position(dollar_candidates, dollar_texts):
+    """
+    Выбор размера позиции. Возвращает (значение, правило, текст)
+    """
+    position_usd, source, source_text = None, None, None
+
+    # Самая крупная сумма больше POSITION_MIN_USD
+    for candidate in dollar_candidates:
+        val = parse_loose(candidate.raw)
+        if val is not None and val > POSITION_MIN_USD and (not position_usd or val > position_usd):
+            position_usd, source, source_text = val, 'dollar_max', candidate.context
+
+    # То же по шаблону "$число" в тексте без удаления неразрывных пробелов
+    if not position_usd:
+        for text in dollar_texts:
+            for match in DOLLAR_PREFIX_RE.findall(text):
+                val = parse_loose(match)
+                if val is not None and val > POSITION_MIN_USD and (not position_usd or val > position_usd):
+                    position_usd, source, source_text = val, 'dollar_prefix_max', text
+
+    if not position_usd and dollar_texts:
+        # Первый элемент с $ (он самый крупный) в формате США "93,676.56"
+        first_text = dollar_texts[0]
+        clean_text = first_text.replace('$', '').replace(' ', '')
+        number_match = US_NUMBER_RE.search(clean_text)
+        if number_match:
+            position_usd = float(number_match.group(1).replace(',', ''))
+            source, source_text = 'first_dollar_us', first_text
+
+        # Первый элемент с $ без разделителей тысяч
+        if not position_usd:
+            number_match = PLAIN_NUMBER_RE.search(clean_text.replace(',', ''))
+            if number_match:
+                position_usd = float(number_match.group(1))
+                source, source_text = 'first_dollar_plain', first_text
+
+    return position_usd, source, source_text
+
+
+def _first_rate_in_range(values, eth_min, eth_max):
+    """
+    Первое значение в диапазоне [eth_min, eth_max] из пар (значение, текст)
+    """
+    for val, text in values:
+        if val is not None and eth_min <= val <= eth_max:
+            return val, text
+    return None, None
+
+
+def select_rate(rate_candidates, all_texts, number_candidates, eth_min, eth_max):
+    """
+    Выбор курса ETH. Возвращает (значение, правило, текст)
+    """
+    eth_rate, source, source_text = None, None, None
+
+    def take(val, text, rule):
+        nonlocal eth_rate, source, source_text
+        if val is not None:
+            eth_rate, source, source_text = val, rule, text
+
+    # Значение в скобках "(2 395,87 $)" или "(2 395,87)" в HTML с обычными пробелами вместо неразрывных
+    for rule, pattern in (('page_rate_suffix', RATE_SUFFIX_RE), ('page_rate_bare', RATE_BARE_RE)):
+        matches = ((pattern.fullmatch(c.clean), c.context) for c in rate_candidates)
+        take(*_first_rate_in_range(((parse_loose(m.group(1)), text) for m, text in matches if m),
+                                   eth_min, eth_max), rule)
+        if eth_rate:
+            break
+
+    # Первое число в скобках в тексте элемента, содержащего $
+    if not eth_rate:
+        def bracket_values():
+            for text in all_texts:
+                if '(' in text and ')' in text and '$' in text:
+                    bracket_match = BRACKET_RE.search(text)
+                    number_match = bracket_match and NUMBER_RE.search(bracket_match.group(1))
+                    if number_match:
+                        yield parse_loose(number_match.group(1)), text
+        take(*_first_rate_in_range(bracket_values(), eth_min, eth_max), 'text_bracket')
+
+    # Первое значение "($2,314.00)" в HTML (без проверки диапазона)
+    if not eth_rate:
+        for candidate in rate_candidates:
+            match = RATE_PREFIX_RE.fullmatch(candidate.raw)
+            if match:
+                take(parse_loose(match.group(1)), candidate.context, 'page_rate_prefix_first')
+                break
+
+    # Значения в скобках в HTML с запятыми-разделителями тысяч
+    if not eth_rate:
+        for rule, pattern in (('page_rate_prefix', RATE_PREFIX_RE),
+                              ('page_rate_suffix_thousands', RATE_SUFFIX_RE),
+                              ('page_rate_bare_thousands', RATE_BARE_RE)):
+            matches = ((pattern.fullmatch(c.raw), c.context) for c in rate_candidates)
+            take(*_first_rate_in_range(((parse_thousands(m.group(1)), text) for m, text in matches if m),
+                                       eth_min, eth_max), rule)
+            if eth_rate:
+                break
+
+    # Любое число в диапазоне в текстах элементов (по первому подходящему в каждом тексте)
+    if not eth_rate and number_candidates:
+        skip_index = None
+        for candidate in number_candidates:
+            if candidate.index == skip_index:
+                continue
+            val = parse_loose(candidate.raw)
+            if val is not None and eth_min <= val <= eth_max:
+                take(val, candidate.context, 'number_text')
+                if eth_rate:
+                    break
+                skip_index = candidate.index
+
+    return eth_rate, source, source_text
+
+
+def extract_position_values(all_texts, dollar_texts, number_texts, page_html, eth_min, eth_max):
+    """
+    Извлекает размер позиции и курс ETH из текстов элементов и HTML страницы.
+    number_texts используются только как последний вариант поиска курса.
+    Возвращает ExtractionResult
+    """
+    position_usd, position_source, position_text = select_position(
+        tokenize_dollar_texts(dollar_texts), dollar_texts)
+    eth_rate, rate_source, rate_text = select_rate(
+        tokenize_page(page_html), all_texts, tokenize_number_texts(number_texts), eth_min, eth_max)
+    return ExtractionResult(position_usd, eth_rate, position_source, rate_source, position_text, rate_text)
+
+
+def extract_from_snapshot(snapshot, eth_min, eth_max):
+    """
+    Извлекает данные из снимка страницы (page_snapshot.PageSnapshot).
+    Тексты с числами используются, только если на странице нет элементов с $
+    """
+    dollar_texts = snapshot.dollar_texts()
+    number_texts = [] if dollar_texts else snapshot.number_texts()
+    return extract_position_values(snapshot.texts(), dollar_texts, number_texts, snapshot.html, eth_min, eth_max)
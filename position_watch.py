@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Состояние режима наблюдения (--watch): расписание обновлений позиций,
+отложенные повторы после ошибок и изменения относительно прошлого обновления
+
+На каждую позицию хранится только последнее значение и счетчик ошибок подряд,
+поэтому память не растет со временем работы. Расписание - куча по времени
+следующего обновления, в ней ровно одна запись на позицию.
+"""
+
+import heapq
+from collections import namedtuple
+
+WATCH_INTERVAL = 300  # Интервал обновления позиции по умолчанию, секунд
+WATCH_BACKOFF_BASE = 30  # Первая задержка повтора после ошибки, секунд
+WATCH_BACKOFF_MAX = 1800  # Максимальная задержка повтора, секунд
+
+# Сравнение с HODL при одном курсе
+HodlComparison = namedtuple('HodlComparison', [
+    'hodl_usd',        # текущая стоимость начального эфира
+    'position_eth',    # стоимость позиции в ETH
+    'profit_usd',      # позиция минус HODL, $
+    'profit_eth',      # позиция в ETH минус начальный эфир
+])
+
+
+def parse_position_spec(value, default_interval=WATCH_INTERVAL):
+    """
+    Номер позиции с необязательным интервалом обновления: "59044" или "59044:60".
+    Возвращает (номер, интервал в секундах)
+    """
+    position_id, _, interval = value.partition(':')
+    if not interval:
+        return position_id, default_interval
+    interval = float(interval)
+    if interval <= 0:
+        raise ValueError(f"Интервал позиции {position_id} должен быть больше нуля")
+    return position_id, interval
+
+
+def hodl_comparison(position_usd, eth_rate, eth_initial):
+    """
+    Те же величины, что в сравнениях print_comparison, без вывода
+    """
+    hodl_usd = eth_initial * eth_rate
+    position_eth = position_usd / eth_rate
+    return HodlComparison(hodl_usd, position_eth, position_usd - hodl_usd, position_eth - eth_initial)
+
+
+def backoff_delay(failures, interval, base=WATCH_BACKOFF_BASE, maximum=WATCH_BACKOFF_MAX):
+    """
+    Задержка перед повтором после failures ошибок подряд: удваивается с каждой
+    ошибкой, но не меньше base и не больше max(maximum, interval)
+    """
+    return min(base * 2 ** (failures - 1), max(maximum, interval))
+
+
+class PositionWatch:
+    """
+    Последнее известное состояние наблюдаемой позиции
+    """
+    __slots__ = ('position_id', 'interval', 'position_usd', 'eth_rate', 'failures', 'updates', 'changes')
+
+    def __init__(self, position_id, interval):
+        self.position_id = position_id
+        self.interval = interval
+        self.position_usd = None
+        self.eth_rate = None
+        self.failures = 0
+        self.updates = 0
+        self.changes = 0
+
+    def update(self, position_usd, eth_rate, eth_initial):
+        """
+        Записывает новое значение. Возвращает строки с изменениями и пересечениями
+        порогов или пустой список, если значения не изменились (с точностью до цента)
+        """
+        self.failures = 0
+        self.updates += 1
+        previous_usd, previous_rate = self.position_usd, self.eth_rate
+        if previous_usd is not None and round(previous_usd, 2) == round(position_usd, 2) \
+                and round(previous_rate, 2) == round(eth_rate, 2):
+            return []
+        self.position_usd, self.eth_rate = position_usd, eth_rate
+        self.changes += 1
+
+        current = hodl_comparison(position_usd, eth_rate, eth_initial)
+        prefix = f"Позиция {self.position_id}:"
+        if previous_usd is None:
+            return [f"{prefix} ${position_usd:,.2f}, курс ETH ${eth_rate:,.2f}, "
+                    f"{current.position_eth:.4f} ETH, к HODL {current.profit_usd:+,.2f} $ "
+                    f"({current.profit_eth:+.4f} ETH)"]
+
+        previous = hodl_comparison(previous_usd, previous_rate, eth_initial)
+        lines = [f"{prefix} ${position_usd:,.2f} ({position_usd - previous_usd:+,.2f} $), "
+                 f"курс ETH ${eth_rate:,.2f} ({eth_rate - previous_rate:+,.2f} $), "
+                 f"{current.position_eth:.4f} ETH ({current.position_eth - previous.position_eth:+.4f}), "
+                 f"к HODL {current.profit_usd:+,.2f} $"]
+        if (previous.profit_usd < 0) != (current.profit_usd < 0):
+            state = "прибыль" if current.profit_usd >= 0 else "убыток"
+            lines.append(f"{prefix} ПЕРЕХОД: позиция против HODL теперь показывает {state} "
+                         f"(${abs(current.profit_usd):,.2f})")
+        if (previous.profit_eth < 0) != (current.profit_eth < 0):
+            state = "рост" if current.profit_eth >= 0 else "падение"
+            lines.append(f"{prefix} ПЕРЕХОД: позиция в ETH теперь показывает {state} "
+                         f"({current.profit_eth:+.4f} ETH)")
+        return lines
+
+    def fail(self):
+        """
+        Отмечает неудачное обновление. Возвращает задержку до повтора, секунд
+        """
+        self.failures += 1
+        return backoff_delay(self.failures, self.interval)
+
+
+class WatchSchedule:
+    """
+    Очередь обновлений: куча (время, порядковый номер, номер позиции)
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, position_id, due):
+        self.counter += 1
+        heapq.heappush(self.heap, (due, self.counter, position_id))
+
+    def pop(self):
+        """
+        Ближайшее обновление: (время, номер позиции)
+        """
+        due, _, position_id = heapq.heappop(self.heap)
+        return due, position_id
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сценарный расчет позиций по сетке цен ETH (NumPy)
+
+Позиция рассматривается как концентрированная ликвидность Uniswap V3 в паре
+ETH/доллар: ликвидность L и диапазон цен ETH [price_lower, price_upper] в долларах.
+Для каждой цены сетки считаются стоимость позиции, стоимость начального эфира
+(HODL), отклонение от HODL и стоимость позиции в ETH. Все расчеты векторные:
+сетка - одномерный массив цен, несколько позиций - столбцы параметров, результат -
+двумерные массивы (позиции x цены) без циклов на Python.
+
+Параметры позиции берутся из блокчейна (--source rpc, пул WETH/USDC) или
+калибруются по найденной стоимости позиции при текущем курсе и заданному диапазону.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# Результат расчета: массивы формы (число позиций, число точек сетки)
+GridResult = namedtuple('GridResult', [
+    'prices',            # цены ETH сетки, $
+    'position_value',    # стоимость позиции, $
+    'hodl_value',        # стоимость начального эфира, $
+    'vs_hodl',           # отклонение от HODL: position_value / hodl_value - 1
+    'eth_balance',       # стоимость позиции в ETH
+    'eth_amount',        # ETH в позиции
+    'usd_amount',        # долларовая часть позиции
+])
+
+
+def price_grid(price_min, price_max, points):
+    """
+    Равномерная сетка цен ETH. При нулевой цене стоимость позиции и HODL равны
+    нулю и отклонение от HODL не определено, поэтому price_min должен быть больше 0
+    """
+    if price_min <= 0:
+        raise ValueError(f"Сетка цен ETH должна начинаться с положительной цены, задано ${price_min:g}")
+    return np.linspace(price_min, price_max, int(points))
+
+
+def _column(values):
+    """
+    Параметры позиций в виде столбца (N, 1) для broadcasting по сетке цен
+    """
+    return np.asarray(values, dtype=float).reshape(-1, 1)
+
+
+def unit_amounts(prices, price_lower, price_upper):
+    """
+    Количества ETH и долларов на единицу ликвидности при ценах prices.
+    Формулы Uniswap V3: x = 1/sqrt(P) - 1/sqrt(Pb), y = sqrt(P) - sqrt(Pa),
+    где sqrt(P) ограничен диапазоном [sqrt(Pa), sqrt(Pb)]
+    """
+    sqrt_lower = np.sqrt(_column(price_lower))
+    sqrt_upper = np.sqrt(_column(price_upper))
+    sqrt_price = np.clip(np.sqrt(np.asarray(prices, dtype=float)), sqrt_lower, sqrt_upper)
+    return 1.0 / sqrt_price - 1.0 / sqrt_upper, sqrt_price - sqrt_lower
+
+
+def liquidity_from_value(position_usd, eth_rate, price_lower, price_upper):
+    """
+    Калибровка: ликвидность, при которой стоимость позиции при курсе eth_rate
+    равна position_usd (для каждой позиции)
+    """
+    eth_rate = _column(eth_rate)
+    eth_amount, usd_amount = unit_amounts(eth_rate, price_lower, price_upper)
+    unit_value = (eth_amount * eth_rate + usd_amount)[:, 0]
+    return np.asarray(position_usd, dtype=float).reshape(-1) / unit_value
+
+
+def evaluate_grid(prices, liquidity, price_lower, price_upper, eth_initial):
+    """
+    Расчет по сетке цен для одной или нескольких позиций.
+    liquidity, price_lower, price_upper, eth_initial - числа или массивы длины N
+    """
+    prices = np.asarray(prices, dtype=float)
+    eth_per_l, usd_per_l = unit_amounts(prices, price_lower, price_upper)
+    liquidity = _column(liquidity)
+    eth_amount = eth_per_l * liquidity
+    usd_amount = usd_per_l * liquidity
+    position_value = eth_amount * prices + usd_amount
+    hodl_value = _column(eth_initial) * prices
+    return GridResult(
+        prices=prices,
+        position_value=position_value,
+        hodl_value=np.broadcast_to(hodl_value, position_value.shape),
+        vs_hodl=position_value / hodl_value - 1.0,
+        eth_balance=position_value / prices,
+        eth_amount=eth_amount,
+        usd_amount=usd_amount,
+    )
+
+
+def breakeven_prices(result):
+    """
+    Цены, где стоимость позиции пересекает HODL (линейная интерполяция между
+    точками сетки). Возвращает список массивов - по одному на позицию
+    """
+    diff = result.position_value - result.hodl_value
+    crossings = np.signbit(diff[:, :-1]) != np.signbit(diff[:, 1:])
+    rows, cols = np.nonzero(crossings)
+    left, right = diff[rows, cols], diff[rows, cols + 1]
+    prices = result.prices[cols] + (result.prices[cols + 1] - result.prices[cols]) * left / (left - right)
+    return [prices[rows == row] for row in range(diff.shape[0])]
+
+
+def summarize(result):
+    """
+    Сводка по каждой позиции: экстремумы стоимости в ETH и отклонения от HODL.
+    Неопределенные точки (NaN, например при нулевом HODL) пропускаются.
+    Возвращает словарь массивов длины N
+    """
+    return {
+        'eth_balance_min': np.nanmin(result.eth_balance, axis=1),
+        'eth_balance_max': np.nanmax(result.eth_balance, axis=1),
+        'price_at_eth_balance_min': result.prices[np.nanargmin(result.eth_balance, axis=1)],
+        'vs_hodl_min': np.nanmin(result.vs_hodl, axis=1),
+        'vs_hodl_max': np.nanmax(result.vs_hodl, axis=1),
+        'price_at_vs_hodl_min': result.prices[np.nanargmin(result.vs_hodl, axis=1)],
+    }
+
+
+def summarize_book(prices, liquidity, price_lower, price_upper, eth_initial, max_cells=5_000_000):
+    """
+    Сводка summarize() и точки безубыточности для большого числа позиций.
+    Позиции обрабатываются блоками не более max_cells ячеек (позиций x цен),
+    чтобы не держать в памяти полные матрицы всего портфеля
+    """
+    prices = np.asarray(prices, dtype=float)
+    count = np.atleast_1d(liquidity).size
+    params = [np.broadcast_to(np.asarray(values, dtype=float).reshape(-1), (count,))
+              for values in (liquidity, price_lower, price_upper, eth_initial)]
+    rows_per_chunk = max(1, max_cells // max(1, len(prices)))
+    summaries, breakevens = [], []
+    for start in range(0, len(params[0]), rows_per_chunk):
+        chunk = [values[start:start + rows_per_chunk] for values in params]
+        result = evaluate_grid(prices, *chunk)
+        summaries.append(summarize(result))
+        breakevens.extend(breakeven_prices(result))
+    summary = {key: np.concatenate([part[key] for part in summaries]) for key in summaries[0]}
+    return summary, breakevens
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Курсы активов в долларах: провайдеры с резервированием и общий кэш
+
+Активы задаются символами ("ETH", "WBTC", "USDC") или адресами контрактов
+токенов Unichain ("0x..."). Все недостающие в кэше активы запрашиваются одним
+пакетным запросом к провайдеру через общую сессию requests (keep-alive, пул
+соединений). Если провайдер не ответил или вернул не все курсы, оставшиеся
+запрашиваются у следующего провайдера в списке.
+
+Кэш двухуровневый: словарь в памяти процесса и JSON-файл на диске с TTL, общий
+для параллельно запущенных анализаторов. Запись в файл выполняется под файловой
+блокировкой с атомарной заменой, чтение не требует блокировки.
+
+Адреса провайдеров настраиваются, поэтому их можно заменить локальной заглушкой
+(benchmarks/price_stub.py).
+"""
+
+import json
+import os
+import tempfile
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # Windows: без межпроцессной блокировки
+    fcntl = None
+
+# === ПРОВАЙДЕРЫ ===
+COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
+BINANCE_BASE_URL = "https://api.binance.com/api/v3"
+COINGECKO_PLATFORM = "unichain"  # Сеть для курсов токенов по адресу контракта
+PRICE_TIMEOUT = 10  # Таймаут запроса к провайдеру, секунд
+
+# Идентификаторы CoinGecko для символов
+COINGECKO_IDS = {
+    'ETH': 'ethereum',
+    'WETH': 'weth',
+    'WBTC': 'wrapped-bitcoin',
+    'BTC': 'bitcoin',
+    'USDC': 'usd-coin',
+    'USDT': 'tether',
+    'DAI': 'dai',
+    'UNI': 'uniswap',
+}
+
+# Торговые пары Binance для символов (курс в USDT считается курсом в долларах)
+BINANCE_SYMBOLS = {
+    'ETH': 'ETHUSDT',
+    'WETH': 'ETHUSDT',
+    'WBTC': 'BTCUSDT',
+    'BTC': 'BTCUSDT',
+    'USDC': 'USDCUSDT',
+    'DAI': 'DAIUSDT',
+    'UNI': 'UNIUSDT',
+}
+
+# Активы, которые запрашиваются вместе с любым запросом курса
+DEFAULT_ASSETS = ('ETH', 'WBTC')
+
+# === КЭШ ===
+PRICE_CACHE_TTL = 60  # Время жизни курса в кэше, секунд
+PRICE_CACHE_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'uniswap_analyzer', 'prices.json')
+
+
+class PriceOracleError(Exception):
+    """Ни один провайдер не вернул курс"""
+
+
+def normalize_asset(asset):
+    """
+    Ключ актива: адрес контракта в нижнем регистре или символ в верхнем
+    """
+    asset = asset.strip()
+    return asset.lower() if asset.lower().startswith('0x') else asset.upper()
+
+
+def create_session(pool_size=4):
+    """
+    Сессия requests с пулом постоянных соединений
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CoinGeckoProvider:
+    """
+    CoinGecko: символы одним запросом /simple/price, адреса контрактов одним
+    запросом /simple/token_price/{platform}
+    """
+    name = 'coingecko'
+
+    def __init__(self, session, base_url=COINGECKO_BASE_URL, platform=COINGECKO_PLATFORM, timeout=PRICE_TIMEOUT):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.platform = platform
+        self.timeout = timeout
+        self.requests_sent = 0
+
+    def _get(self, path, params):
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        self.requests_sent += 1
+        response.raise_for_status()
+        return response.json()
+
+    def fetch(self, assets):
+        prices = {}
+        ids = {COINGECKO_IDS[asset]: asset for asset in assets if asset in COINGECKO_IDS}
+        if ids:
+            data = self._get('/simple/price', {'ids': ','.join(sorted(ids)), 'vs_currencies': 'usd'})
+            for coin_id, asset in ids.items():
+                if 'usd' in data.get(coin_id, {}):
+                    prices[asset] = float(data[coin_id]['usd'])
+        contracts = [asset for asset in assets if asset.startswith('0x')]
+        if contracts:
+            data = self._get(f'/simple/token_price/{self.platform}',
+                             {'contract_addresses': ','.join(contracts), 'vs_currencies': 'usd'})
+            data = {address.lower(): value for address, value in data.items()}
+            for asset in contracts:
+                if 'usd' in data.get(asset, {}):
+                    prices[asset] = float(data[asset]['usd'])
+        return prices
+
+
+class BinanceProvider:
+    """
+    Binance: все пары одним запросом /ticker/price?symbols=[...]
+    (только символы, адреса контрактов не поддерживаются)
+    """
+    name = 'binance'
+
+    def __init__(self, session, base_url=BINANCE_BASE_URL, timeout=PRICE_TIMEOUT):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.requests_sent = 0
+
+    def fetch(self, assets):
+        pairs = {}
+        for asset in assets:
+            if asset in BINANCE_SYMBOLS:
+                pairs.setdefault(BINANCE_SYMBOLS[asset], []).append(asset)
+        if not pairs:
+            return {}
+        response = self.session.get(f"{self.base_url}/ticker/price",
+                                    params={'symbols': json.dumps(sorted(pairs), separators=(',', ':'))},
+                                    timeout=self.timeout)
+        self.requests_sent += 1
+        response.raise_for_status()
+        prices = {}
+        for ticker in response.json():
+            for asset in pairs.get(ticker.get('symbol'), []):
+                prices[asset] = float(ticker['price'])
+        return prices
+
+
+PROVIDERS = {
+    CoinGeckoProvider.name: CoinGeckoProvider,
+    BinanceProvider.name: BinanceProvider,
+}
+
+
+class PriceCache:
+    """
+    Кэш курсов с TTL: словарь в памяти и JSON-файл на диске (path=None - только память).
+    Запись в файле: {"ETH": {"price": 2395.87, "time": 1700000000.0, "provider": "coingecko"}}
+    """
+
+    def __init__(self, path=PRICE_CACHE_PATH, ttl=PRICE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.file_mtime = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load_file(self):
+        """
+        Перечитывает файл кэша, если он изменился с прошлого чтения
+        """
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.file_mtime:
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.file_mtime = mtime
+        except (OSError, ValueError):
+            return
+        for asset, entry in data.items():
+            if asset not in self.entries or entry.get('time', 0) > self.entries[asset]['time']:
+                self.entries[asset] = entry
+
+    def get(self, assets, now=None):
+        """
+        Свежие курсы из кэша. Возвращает (найденные курсы, список промахов)
+        """
+        now = time.time() if now is None else now
+        found, missing = {}, []
+        for attempt in range(2):
+            missing = [asset for asset in assets if asset not in found]
+            for asset in missing:
+                entry = self.entries.get(asset)
+                if entry is not None and now - entry['time'] <= self.ttl:
+                    found[asset] = entry['price']
+            if len(found) == len(assets) or attempt:
+                break
+            # Курсы могли обновить другие процессы
+            self._load_file()
+        missing = [asset for asset in assets if asset not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def put(self, prices, provider, now=None):
+        """
+        Сохраняет курсы в памяти и на диске
+        """
+        now = time.time() if now is None else now
+        for asset, price in prices.items():
+            self.entries[asset] = {'price': price, 'time': now, 'provider': provider}
+        if self.path and prices:
+            try:
+                self._write_file()
+            except OSError as e:
+                print(f"Не удалось сохранить кэш курсов {self.path}: {e}")
+
+    def _write_file(self):
+        """
+        Объединяет кэш с файлом и атомарно заменяет файл под блокировкой
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self.file_mtime = None
+            self._load_file()
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.prices-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, indent=2, sort_keys=True)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self.file_mtime = os.stat(self.path).st_mtime_ns
+
+
+class PriceOracle:
+    """
+    Курсы активов через кэш и список провайдеров в порядке приоритета
+    """
+
+    def __init__(self, providers, cache=None):
+        self.providers = providers
+        self.cache = cache if cache is not None else PriceCache(path=None)
+        self.sources = {}  # актив -> провайдер последнего полученного курса ("cache" - из кэша)
+        self.unavailable = {}  # актив -> время, когда провайдеры ответили без его курса
+
+    def get_prices(self, assets):
+        """
+        Курсы в долларах для списка активов. Отсутствующие у всех провайдеров
+        активы в результат не попадают
+        """
+        assets = list(dict.fromkeys(normalize_asset(asset) for asset in assets))
+        prices, missing = self.cache.get(assets)
+        self.sources.update(dict.fromkeys(prices, 'cache'))
+        # Активы без курса у всех провайдеров не запрашиваются повторно в течение TTL
+        now = time.time()
+        missing = [asset for asset in missing if now - self.unavailable.get(asset, -self.cache.ttl - 1) > self.cache.ttl]
+        # Активы, запрос которых завершился ошибкой сети или разбора: курс мог
+        # существовать, поэтому такие активы не считаются отсутствующими
+        failed = set()
+        for provider in self.providers:
+            if not missing:
+                break
+            try:
+                fetched = provider.fetch(missing)
+            except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+                print(f"Ошибка провайдера курсов {provider.name}: {e}")
+                failed.update(missing)
+                continue
+            self.cache.put(fetched, provider.name)
+            prices.update(fetched)
+            self.sources.update(dict.fromkeys(fetched, provider.name))
+            missing = [asset for asset in missing if asset not in fetched]
+        self.unavailable.update(dict.fromkeys((asset for asset in missing if asset not in failed), now))
+        return prices
+
+    def get_price(self, asset, prefetch=DEFAULT_ASSETS):
+        """
+        Курс одного актива. Вместе с ним запрашиваются активы prefetch,
+        чтобы следующие запросы обслуживались из кэша
+        """
+        asset = normalize_asset(asset)
+        prices = self.get_prices([asset, *prefetch])
+        if asset not in prices:
+            raise PriceOracleError(f"Не удалось получить курс {asset}")
+        return prices[asset]
+
+    def stats(self):
+        """
+        Счетчики кэша и запросов к провайдерам
+        """
+        return {
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'requests': {provider.name: provider.requests_sent for provider in self.providers},
+        }
+
+
+def create_price_oracle(provider_names=('coingecko', 'binance'), cache_path=PRICE_CACHE_PATH,
+                        ttl=PRICE_CACHE_TTL, base_urls=None, session=None):
+    """
+    Оракул с провайдерами в указанном порядке. base_urls - {имя провайдера: адрес API},
+    cache_path=None - кэш только в памяти
+    """
+    session = session or create_session()
+    base_urls = base_urls or {}
+    providers = []
+    for name in provider_names:
+        if name not in PROVIDERS:
+            raise ValueError(f"Неизвестный провайдер курсов: {name} (доступны: {', '.join(PROVIDERS)})")
+        kwargs = {'base_url': base_urls[name]} if base_urls.get(name) else {}
+        providers.append(PROVIDERS[name](session, **kwargs))
+    return PriceOracle(providers, PriceCache(cache_path, ttl))
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Оценка позиции Uniswap V3 напрямую из блокчейна через JSON-RPC (без браузера)
+
+Данные позиции читаются из NonfungiblePositionManager.positions(tokenId): токены,
+комиссия пула, tickLower/tickUpper и ликвидность. Текущая цена берется из slot0()
+пула. Количества токенов считаются по точной целочисленной математике Uniswap V3
+(TickMath.getSqrtRatioAtTick и LiquidityAmounts.getAmountsForLiquidity).
+Курс ETH в долларах берется из slot0() эталонного пула WETH/USDC.
+
+Все вызовы одного шага отправляются одним пакетным JSON-RPC запросом; на оценку
+позиции уходит три запроса к узлу.
+"""
+
+import json
+from collections import namedtuple
+
+import requests
+
+# === АДРЕСА UNICHAIN ===
+UNICHAIN_RPC_URL = "https://mainnet.unichain.org"
+POSITION_MANAGER_ADDRESS = "0x943e6e07a7e8e791dafc44083e54041d743c46e9"  # NonfungiblePositionManager
+V3_FACTORY_ADDRESS = "0x1f98400000000000000000000000000000000003"        # UniswapV3Factory
+WETH_ADDRESS = "0x4200000000000000000000000000000000000006"
+USDC_ADDRESS = "0x078d782b760474a361dda0af3839290b0ef57ad6"
+ETH_USD_POOL_FEE = 500  # Комиссия эталонного пула WETH/USDC (0.05%)
+
+RPC_TIMEOUT = 10  # Таймаут запроса к узлу, секунд
+
+# === СЕЛЕКТОРЫ ФУНКЦИЙ ===
+SELECTOR_POSITIONS = '0x99fbab88'  # positions(uint256)
+SELECTOR_GET_POOL = '0x1698ee82'   # getPool(address,address,uint24)
+SELECTOR_SLOT0 = '0x3850c7bd'      # slot0()
+SELECTOR_DECIMALS = '0x313ce567'   # decimals()
+SELECTOR_SYMBOL = '0x95d89b41'     # symbol()
+
+# === МАТЕМАТИКА UNISWAP V3 ===
+Q96 = 1 << 96
+MIN_TICK = -887272
+MAX_TICK = 887272
+MAX_UINT256 = (1 << 256) - 1
+
+# Множители TickMath.getSqrtRatioAtTick для битов |tick| (1.0001^(-2^i/2) в Q128.128)
+_TICK_RATIOS = [
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+]
+
+# Состояние позиции, прочитанное из блокчейна
+PositionState = namedtuple('PositionState', [
+    'position_id', 'block_number',
+    'token0', 'token1', 'symbol0', 'symbol1', 'decimals0', 'decimals1', 'fee',
+    'tick_lower', 'tick_upper', 'liquidity',
+    'pool', 'sqrt_price_x96', 'tick',
+    'eth_usd_sqrt_price_x96', 'eth_usd_weth_is_token0', 'usdc_decimals',
+])
+
+
+class RpcError(Exception):
+    """Ошибка JSON-RPC узла или неожиданный ответ"""
+
+
+def get_sqrt_ratio_at_tick(tick):
+    """
+    sqrt(1.0001^tick) * 2^96 - точная копия TickMath.getSqrtRatioAtTick
+    """
+    if not MIN_TICK <= tick <= MAX_TICK:
+        raise ValueError(f"tick вне диапазона: {tick}")
+    abs_tick = abs(tick)
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 1 << 128
+    for bit, multiplier in _TICK_RATIOS:
+        if abs_tick & bit:
+            ratio = (ratio * multiplier) >> 128
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def get_amounts_for_liquidity(sqrt_price_x96, sqrt_ratio_a_x96, sqrt_ratio_b_x96, liquidity):
+    """
+    Количества token0 и token1 (в минимальных единицах) для ликвидности в диапазоне
+    цен - точная копия LiquidityAmounts.getAmountsForLiquidity
+    """
+    if sqrt_ratio_a_x96 > sqrt_ratio_b_x96:
+        sqrt_ratio_a_x96, sqrt_ratio_b_x96 = sqrt_ratio_b_x96, sqrt_ratio_a_x96
+
+    def amount0(sqrt_a, sqrt_b):
+        return ((liquidity << 96) * (sqrt_b - sqrt_a) // sqrt_b) // sqrt_a
+
+    def amount1(sqrt_a, sqrt_b):
+        return liquidity * (sqrt_b - sqrt_a) // Q96
+
+    if sqrt_price_x96 <= sqrt_ratio_a_x96:
+        return amount0(sqrt_ratio_a_x96, sqrt_ratio_b_x96), 0
+    if sqrt_price_x96 < sqrt_ratio_b_x96:
+        return amount0(sqrt_price_x96, sqrt_ratio_b_x96), amount1(sqrt_ratio_a_x96, sqrt_price_x96)
+    return 0, amount1(sqrt_ratio_a_x96, sqrt_ratio_b_x96)
+
+
+def price_token0_in_token1(sqrt_price_x96, decimals0, decimals1):
+    """
+    Цена одного token0 в token1 с учетом decimals
+    """
+    return (sqrt_price_x96 * sqrt_price_x96) / (1 << 192) * 10 ** (decimals0 - decimals1)
+
+
+# === КОДИРОВАНИЕ ABI ===
+
+def _encode_uint(value):
+    return format(value, '064x')
+
+
+def _encode_address(address):
+    return address.lower().replace('0x', '').rjust(64, '0')
+
+
+def _words(result):
+    data = result[2:] if result.startswith('0x') else result
+    return [data[i:i + 64] for i in range(0, len(data), 64)]
+
+
+def _result_words(result, count, what):
+    """
+    Слова ABI результата eth_call. Пустой ("0x") или короткий ответ - адрес без
+    контракта, несуществующий пул или неверный адрес - дает RpcError
+    """
+    words = _words(result) if isinstance(result, str) else []
+    if len(words) < count or len(words[count - 1]) < 64:
+        raise RpcError(f"Пустой или неполный ответ {what}: {str(result)[:80]!r} (нет контракта по адресу?)")
+    return words
+
+
+def _decode_uint(word):
+    return int(word, 16)
+
+
+def _decode_int(word):
+    value = int(word, 16)
+    return value - (1 << 256) if value >= 1 << 255 else value
+
+
+def _decode_address(word):
+    return '0x' + word[-40:]
+
+
+def _decode_string(result):
+    """
+    Строка ABI (string) или bytes32 - некоторые старые токены возвращают symbol() так
+    """
+    result = result or '0x'
+    data = bytes.fromhex(result[2:] if result.startswith('0x') else result)
+    if len(data) >= 64:
+        offset = int.from_bytes(data[:32], 'big')
+        if offset + 32 <= len(data):
+            length = int.from_bytes(data[offset:offset + 32], 'big')
+            return data[offset + 32:offset + 32 + length].decode('utf-8', errors='replace')
+    return data[:32].rstrip(b'\0').decode('utf-8', errors='replace')
+
+
+class RpcClient:
+    """
+    JSON-RPC клиент с постоянным соединением и пакетными запросами.
+    Если передан record (словарь), все ответы сохраняются в нем для
+    последующего воспроизведения заглушкой (benchmarks/rpc_stub.py)
+    """
+
+    def __init__(self, url=UNICHAIN_RPC_URL, timeout=RPC_TIMEOUT, record=None):
+        self.url = url
+        self.timeout = timeout
+        self.record = record
+        self.session = requests.Session()
+        self.requests_sent = 0
+
+    def batch(self, calls):
+        """
+        Выполняет список вызовов [(method, params), ...] одним HTTP-запросом.
+        Возвращает результаты в том же порядке
+        """
+        payload = [{'jsonrpc': '2.0', 'id': index, 'method': method, 'params': params}
+                   for index, (method, params) in enumerate(calls)]
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        self.requests_sent += 1
+        if response.status_code != 200:
+            raise RpcError(f"HTTP {response.status_code} от {self.url}")
+        replies = response.json()
+        if isinstance(replies, dict):
+            raise RpcError(f"Узел не поддерживает пакетные запросы: {replies.get('error')}")
+
+        by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for index, (method, params) in enumerate(calls):
+            reply = by_id.get(index)
+            if reply is None:
+                raise RpcError(f"Нет ответа на {method}")
+            if 'error' in reply:
+                # Узлы возвращают ошибку объектом {"code", "message"} или строкой
+                error = reply['error']
+                raise RpcError(f"{method}: {error.get('message', error) if isinstance(error, dict) else error}")
+            if self.record is not None:
+                self.record[request_key(method, params)] = reply['result']
+            results.append(reply['result'])
+        return results
+
+    def save_record(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.record or {}, f, indent=2, sort_keys=True)
+
+
+def request_key(method, params):
+    """
+    Ключ запроса для записи и воспроизведения ответов
+    """
+    return method + ' ' + json.dumps(params, sort_keys=True)
+
+
+def eth_call(to, data, block='latest'):
+    return 'eth_call', [{'to': to, 'data': data}, block]
+
+
+def fetch_position_state(client, position_id,
+                         position_manager=POSITION_MANAGER_ADDRESS, factory=V3_FACTORY_ADDRESS,
+                         weth=WETH_ADDRESS, usdc=USDC_ADDRESS, eth_usd_fee=ETH_USD_POOL_FEE):
+    """
+    Читает позицию, ее пул и эталонный пул WETH/USDC тремя пакетными запросами.
+    Все вызовы после первого выполняются на одном блоке
+    """
+    # 1. Номер блока, данные позиции и адрес эталонного пула
+    block_hex, position_raw, eth_usd_pool_raw = client.batch([
+        ('eth_blockNumber', []),
+        eth_call(position_manager, SELECTOR_POSITIONS + _encode_uint(int(position_id))),
+        eth_call(factory, SELECTOR_GET_POOL + _encode_address(weth) + _encode_address(usdc)
+                 + _encode_uint(eth_usd_fee)),
+    ])
+    words = _words(position_raw) if isinstance(position_raw, str) else []
+    if len(words) < 12:
+        raise RpcError(f"Позиция {position_id} не найдена")
+    token0, token1 = _decode_address(words[2]), _decode_address(words[3])
+    fee = _decode_uint(words[4])
+    tick_lower, tick_upper = _decode_int(words[5]), _decode_int(words[6])
+    liquidity = _decode_uint(words[7])
+    eth_usd_pool = _decode_address(_result_words(eth_usd_pool_raw, 1, 'getPool эталонного пула WETH/USDC')[0])
+    if int(eth_usd_pool, 16) == 0:
+        raise RpcError("Эталонный пул WETH/USDC не найден")
+
+    # 2. Адрес пула позиции, параметры токенов и цена эталонного пула
+    pool_raw, decimals0_raw, decimals1_raw, symbol0_raw, symbol1_raw, usdc_decimals_raw, eth_usd_slot0 = client.batch([
+        eth_call(factory, SELECTOR_GET_POOL + _encode_address(token0) + _encode_address(token1)
+                 + _encode_uint(fee), block_hex),
+        eth_call(token0, SELECTOR_DECIMALS, block_hex),
+        eth_call(token1, SELECTOR_DECIMALS, block_hex),
+        eth_call(token0, SELECTOR_SYMBOL, block_hex),
+        eth_call(token1, SELECTOR_SYMBOL, block_hex),
+        eth_call(usdc, SELECTOR_DECIMALS, block_hex),
+        eth_call(eth_usd_pool, SELECTOR_SLOT0, block_hex),
+    ])
+    pool = _decode_address(_result_words(pool_raw, 1, 'getPool пула позиции')[0])
+    if int(pool, 16) == 0:
+        raise RpcError(f"Пул позиции {position_id} не найден")
+    decimals0 = _decode_uint(_result_words(decimals0_raw, 1, f'decimals() токена {token0}')[0])
+    decimals1 = _decode_uint(_result_words(decimals1_raw, 1, f'decimals() токена {token1}')[0])
+    usdc_decimals = _decode_uint(_result_words(usdc_decimals_raw, 1, f'decimals() токена {usdc}')[0])
+    eth_usd_sqrt_price_x96 = _decode_uint(_result_words(eth_usd_slot0, 2, f'slot0() пула {eth_usd_pool}')[0])
+
+    # 3. Текущая цена пула позиции
+    slot0_words = _result_words(client.batch([eth_call(pool, SELECTOR_SLOT0, block_hex)])[0], 2,
+                                f'slot0() пула {pool}')
+
+    return PositionState(
+        position_id=str(position_id), block_number=int(block_hex, 16),
+        token0=token0, token1=token1,
+        symbol0=_decode_string(symbol0_raw), symbol1=_decode_string(symbol1_raw),
+        decimals0=decimals0, decimals1=decimals1,
+        fee=fee, tick_lower=tick_lower, tick_upper=tick_upper, liquidity=liquidity,
+        pool=pool, sqrt_price_x96=_decode_uint(slot0_words[0]), tick=_decode_int(slot0_words[1]),
+        eth_usd_sqrt_price_x96=eth_usd_sqrt_price_x96,
+        eth_usd_weth_is_token0=int(weth, 16) < int(usdc, 16),
+        usdc_decimals=usdc_decimals,
+    )
+
+
+def position_amounts(state):
+    """
+    Количества token0 и token1 в позиции (в целых токенах)
+    """
+    amount0, amount1 = get_amounts_for_liquidity(
+        state.sqrt_price_x96,
+        get_sqrt_ratio_at_tick(state.tick_lower),
+        get_sqrt_ratio_at_tick(state.tick_upper),
+        state.liquidity)
+    return amount0 / 10 ** state.decimals0, amount1 / 10 ** state.decimals1
+
+
+def eth_usd_price(state, weth_decimals=18):
+    """
+    Курс ETH в долларах по эталонному пулу WETH/USDC
+    """
+    if state.eth_usd_weth_is_token0:
+        return price_token0_in_token1(state.eth_usd_sqrt_price_x96, weth_decimals, state.usdc_decimals)
+    return 1 / price_token0_in_token1(state.eth_usd_sqrt_price_x96, state.usdc_decimals, weth_decimals)
+
+
+def value_position(state, weth=WETH_ADDRESS):
+    """
+    Возвращает (position_usd, eth_rate). Второй токен пула оценивается в WETH по
+    цене самого пула, поэтому один из токенов позиции должен быть WETH
+    """
+    amount0, amount1 = position_amounts(state)
+    price0 = price_token0_in_token1(state.sqrt_price_x96, state.decimals0, state.decimals1)
+    if state.token1.lower() == weth.lower():
+        value_in_eth = amount0 * price0 + amount1
+    elif state.token0.lower() == weth.lower():
+        value_in_eth = amount0 + (amount1 / price0 if price0 else 0.0)
+    else:
+        raise RpcError(f"В пуле {state.symbol0}/{state.symbol1} нет WETH - оценка в ETH не поддерживается")
+    eth_rate = eth_usd_price(state)
+    return value_in_eth * eth_rate, eth_rate
+
+
+def eth_usd_range(state, weth=WETH_ADDRESS, usdc=USDC_ADDRESS):
+    """
+    Параметры позиции в паре ETH/доллар для сценарного расчета (price_grid):
+    (ликвидность в единицах sqrt(ETH * $), нижняя и верхняя цена ETH диапазона).
+    Возвращает None, если пул позиции не WETH/USDC
+    """
+    tokens = (state.token0.lower(), state.token1.lower())
+    if set(tokens) != {weth.lower(), usdc.lower()}:
+        return None
+    liquidity = state.liquidity / 10 ** ((state.decimals0 + state.decimals1) / 2)
+    price_lower = 1.0001 ** state.tick_lower * 10 ** (state.decimals0 - state.decimals1)
+    price_upper = 1.0001 ** state.tick_upper * 10 ** (state.decimals0 - state.decimals1)
+    if tokens[0] == weth.lower():
+        return liquidity, price_lower, price_upper
+    return liquidity, 1 / price_upper, 1 / price_lower
@@ -12,12 +12,24 @@ show_help() {
     echo "  -x, --eth_max VALUE    Максимальный курс ETH для поиска (значение по умолчанию задается в uniswap_analyzer.py)"
     echo "  -p, --position VALUE   Номер позиции Uniswap (значение по умолчанию задается в uniswap_analyzer.py)"
     echo "  -i, --eth_initial VALUE Начальное количество ETH (значение по умолчанию задается в uniswap_analyzer.py)"
+    echo "  -P, --positions LIST   Номера позиций для пакетного анализа через запятую (один браузер на все позиции)"
+    echo "  -f, --positions-file FILE Файл с номерами позиций для пакетного анализа"
+    echo "  -t, --timeout SECONDS  Максимальное время ожидания данных на странице (значение по умолчанию задается в uniswap_analyzer.py)"
+    echo "  -s, --source SOURCE    Источник данных: web (страница в браузере) или rpc (контракты через JSON-RPC)"
+    echo "  -g, --grid POINTS      Сценарный расчет по сетке цен ETH от eth_min до eth_max"
+    echo "  -j, --workers N        Число процессов с браузером для пакетного анализа (0 - по ядрам и свободной памяти)"
+    echo "  -w, --watch            Режим наблюдения: обновлять позиции по расписанию и выводить только изменения"
     echo "  -h, --help            Показать эту справку"
     echo ""
     echo "Примеры:"
     echo "  $0"
     echo "  $0 -p 12345 -i 50.0"
     echo "  $0 --eth_min 1500 --eth_max 3500 --position 67890 --eth_initial 25.5"
+    echo "  $0 --positions 59044,59045,59046"
+    echo "  $0 --source rpc -p 59044"
+    echo "  $0 --source rpc -p 59044 --grid 100000"
+    echo "  $0 --watch --positions 59044:60,59045"
+    echo "  $0 --positions 59044,59045,59046,59047 --workers 0"
     echo ""
 }
 
@@ -41,6 +53,34 @@ while [[ $# -gt 0 ]]; do
             PYTHON_ARGS="$PYTHON_ARGS -i $2"
             shift 2
             ;;
+        -P|--positions)
+            PYTHON_ARGS="$PYTHON_ARGS -P $2"
+            shift 2
+            ;;
+        -f|--positions-file)
+            PYTHON_ARGS="$PYTHON_ARGS -f $2"
+            shift 2
+            ;;
+        -t|--timeout)
+            PYTHON_ARGS="$PYTHON_ARGS -t $2"
+            shift 2
+            ;;
+        -s|--source)
+            PYTHON_ARGS="$PYTHON_ARGS -s $2"
+            shift 2
+            ;;
+        -g|--grid)
+            PYTHON_ARGS="$PYTHON_ARGS -g $2"
+            shift 2
+            ;;
+        -j|--workers)
+            PYTHON_ARGS="$PYTHON_ARGS -j $2"
+            shift 2
+            ;;
+        -w|--watch)
+            PYTHON_ARGS="$PYTHON_ARGS -w"
+            shift
+            ;;
         -h|--help)
             show_help
             exit 0
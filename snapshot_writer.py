@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Снимки страниц для отладки: запись в фоне, сжатие, дедупликация и ограничение объема
+
+Раньше HTML каждой страницы синхронно перезаписывал debug_page.html: в пакетном и
+параллельном режиме снимки затирали друг друга, а извлечение ждало записи
+многомегабайтного файла. Теперь страница передается фоновому потоку записи через
+ограниченную очередь (submit не ждет диска; если очередь заполнена, снимок
+пропускается). Поток сжимает HTML gzip и сохраняет его под именем по SHA-256
+содержимого (objects/ab/abcd....html.gz), поэтому одинаковые страницы хранятся
+один раз, а в index.jsonl добавляется строка с позицией, временем, URL, причиной
+снимка и хэшем. Старые снимки удаляются по возрасту и суммарному размеру.
+
+Что сохраняется, задает режим (--debug-capture):
+- error - только неудачные извлечения (страница ошибки, не найдены значения);
+- sample - неудачные и случайная доля удачных (sample_rate);
+- always - каждая страница;
+- never - ничего.
+
+Несколько процессов (параллельный режим) могут писать в одну папку: объекты
+записываются через временный файл и os.replace, а индекс дополняется и
+переписывается под блокировкой fcntl (в Windows - без межпроцессной блокировки).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: без межпроцессной блокировки
+    fcntl = None
+
+SNAPSHOT_DIR = "debug_snapshots"  # Папка снимков страниц
+SNAPSHOT_INDEX = "index.jsonl"  # Индекс снимков: позиция, время, хэш
+SNAPSHOT_MAX_MB = 200  # Ограничение суммарного размера сжатых снимков, МБ
+SNAPSHOT_MAX_AGE = 7 * 24 * 3600  # Снимки старше удаляются, секунд
+SNAPSHOT_SAMPLE_RATE = 0.05  # Доля удачных извлечений, сохраняемых в режиме sample
+SNAPSHOT_QUEUE_SIZE = 16  # Снимков в очереди записи, дальше новые пропускаются
+SNAPSHOT_CLOSE_TIMEOUT = 10  # Ожидание записи очереди при завершении, секунд
+PRUNE_EVERY = 50  # Проверка ограничений после стольких записей
+CAPTURE_MODES = ('error', 'sample', 'always', 'never')
+
+
+@contextmanager
+def locked(directory):
+    """
+    Блокировка индекса снимков, общая для процессов
+    """
+    with open(os.path.join(directory, SNAPSHOT_INDEX + '.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def object_path(directory, digest):
+    return os.path.join(directory, 'objects', digest[:2], f'{digest}.html.gz')
+
+
+def read_index(directory):
+    """
+    Записи индекса снимков (пропускаются поврежденные строки)
+    """
+    entries = []
+    try:
+        with open(os.path.join(directory, SNAPSHOT_INDEX), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def list_snapshots(directory):
+    """
+    Файлы сохраненных снимков по индексу, без повторов, в порядке записи
+    """
+    paths = []
+    for entry in read_index(directory):
+        path = object_path(directory, entry.get('sha256', ''))
+        if path not in paths and os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def read_html(path):
+    """
+    Текст сохраненной страницы (.html или сжатой .html.gz)
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def position_key(url):
+    """
+    Номер позиции из URL страницы (последний элемент пути)
+    """
+    return url.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+
+
+class SnapshotWriter:
+    """
+    Фоновая запись снимков страниц. submit() вызывается из извлечения и сразу
+    возвращается; close() дожидается записи очереди (не дольше timeout) и
+    применяет ограничения
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, mode='error', sample_rate=SNAPSHOT_SAMPLE_RATE,
+                 max_mb=SNAPSHOT_MAX_MB, max_age=SNAPSHOT_MAX_AGE, queue_size=SNAPSHOT_QUEUE_SIZE):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Неизвестный режим снимков: {mode} (доступны: {', '.join(CAPTURE_MODES)})")
+        self.directory = directory
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age = max_age
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.written = 0       # новых объектов
+        self.deduplicated = 0  # страниц, уже сохраненных ранее
+        self.dropped = 0       # пропущено из-за заполненной очереди
+        self.removed = 0       # удалено по ограничениям
+        self.stored_bytes = 0  # записано сжатых байт
+
+    def should_capture(self, failed):
+        """
+        Нужно ли сохранять страницу при этом исходе извлечения
+        """
+        if self.mode == 'never':
+            return False
+        if self.mode == 'always' or failed:
+            return True
+        return self.mode == 'sample' and random.random() < self.sample_rate
+
+    def submit(self, url, page_html, reason):
+        """
+        Ставит страницу в очередь записи. Возвращает False, если очередь заполнена
+        """
+        if self.thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name='snapshot-writer', daemon=True)
+            self.thread.start()
+        try:
+            self.queue.put_nowait((url, page_html, reason, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc('snapshot', result='dropped')
+            return False
+
+    def capture(self, url, page_html, failed, reason):
+        """
+        Сохраняет страницу, если этого требует режим. Возвращает True, если снимок поставлен в очередь
+        """
+        if not self.should_capture(failed):
+            return False
+        return self.submit(url, page_html, reason if failed else self.mode)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                with metrics.span('snapshot_write'):
+                    self.write(*item)
+                if (self.written + self.deduplicated) % PRUNE_EVERY == 0:
+                    self.prune()
+            except Exception as e:
+                # Ошибка одного снимка (диск, кодировка, поврежденный индекс) не
+                # должна останавливать поток: иначе очередь заполнится и все
+                # следующие снимки будут пропускаться
+                metrics.inc('snapshot', result='error')
+                print(f"Ошибка записи снимка страницы: {e}")
+
+    def write(self, url, page_html, reason, captured_at):
+        data = page_html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = object_path(self.directory, digest)
+        if os.path.exists(path):
+            # Та же страница уже сохранена - обновляем время для ограничения по возрасту
+            os.utime(path)
+            self.deduplicated += 1
+            metrics.inc('snapshot', result='deduplicated')
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(temp_path, path)
+            self.written += 1
+            self.stored_bytes += os.path.getsize(path)
+            metrics.inc('snapshot', result='written')
+        entry = {
+            'position': position_key(url),
+            'time': round(captured_at, 3),
+            'url': url,
+            'reason': reason,
+            'sha256': digest,
+            'bytes': len(data),
+        }
+        with locked(self.directory):
+            with open(os.path.join(self.directory, SNAPSHOT_INDEX), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def prune(self):
+        """
+        Удаляет снимки старше max_age и самые старые сверх max_mb, убирает их из индекса
+        """
+        objects_dir = os.path.join(self.directory, 'objects')
+        if not os.path.isdir(objects_dir):
+            return
+        with locked(self.directory):
+            objects = []
+            for root, _, names in os.walk(objects_dir):
+                for name in names:
+                    if name.endswith('.html.gz'):
+                        path = os.path.join(root, name)
+                        stat = os.stat(path)
+                        objects.append((stat.st_mtime, stat.st_size, path))
+            objects.sort()
+            total = sum(size for _, size, _ in objects)
+            cutoff = time.time() - self.max_age
+            removed = set()
+            for mtime, size, path in objects:
+                if mtime >= cutoff and total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                removed.add(os.path.basename(path)[:-len('.html.gz')])
+            if not removed:
+                return
+            self.removed += len(removed)
+            entries = [entry for entry in read_index(self.directory) if entry.get('sha256') not in removed]
+            index_path = os.path.join(self.directory, SNAPSHOT_INDEX)
+            with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+            os.replace(index_path + '.tmp', index_path)
+
+    def close(self, prune=True, timeout=SNAPSHOT_CLOSE_TIMEOUT):
+        """
+        Дожидается записи снимков из очереди (не дольше timeout секунд) и (prune)
+        применяет ограничения. Если поток записи не успел, оставшиеся снимки
+        пропускаются: завершение анализатора не ждет диска
+        """
+        if self.thread is not None:
+            deadline = time.time() + timeout
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self.thread.join(max(0.0, deadline - time.time()))
+            if self.thread.is_alive():
+                print(f"Запись снимков страниц не завершилась за {timeout:g} с, "
+                      f"в очереди осталось {self.queue.qsize()}")
+                return
+            self.thread = None
+        if prune:
+            try:
+                self.prune()
+            except OSError as e:
+                print(f"Ошибка очистки снимков страниц: {e}")
+
+    def summary(self):
+        """
+        Строка для вывода: "новых 3, повторов 5, пропущено 0, ..."
+        """
+        return (f"новых {self.written} ({self.stored_bytes / 1024:,.0f} КБ), повторов {self.deduplicated}, "
+                f"пропущено {self.dropped}, удалено старых {self.removed}")
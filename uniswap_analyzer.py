@@ -5,23 +5,49 @@
 Извлекает данные с веб-страницы и выполняет вычисления
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import time
 import re
 import sys
 import requests
 import json
 import argparse
+import os
+import io
+import signal
+import sqlite3
+from collections import Counter
+from contextlib import redirect_stdout
+from urllib.parse import urlsplit
+
+from page_snapshot import take_snapshot, snapshot_from_html
+from position_extractor import extract_position_values
+from http_fetch import HTTP_TIMEOUT, USER_AGENT, extract_from_response, fetch_page, fetch_pages
+from json_state import position_tokens
+from lean_load import PageLoadRecorder, apply_lean_options, block_requests, format_load_stats
+from metrics import metrics, start_metrics_server
+from network_capture import NetworkCapture, enable_network_capture, enable_performance_log
+from history_store import HISTORY_DB_PATH, HistoryStore, parse_duration
+from parallel_batch import CHROME_MEMORY_MB, PARALLEL_RETRIES, plan_workers, run_parallel
+from position_watch import WATCH_INTERVAL, PositionWatch, WatchSchedule, parse_position_spec
+from snapshot_writer import (CAPTURE_MODES, SNAPSHOT_DIR, SNAPSHOT_INDEX, SNAPSHOT_MAX_MB, SNAPSHOT_SAMPLE_RATE,
+                             SnapshotWriter, list_snapshots, position_key, read_html)
+from price_oracle import (DEFAULT_ASSETS, PriceOracleError, PROVIDERS, PRICE_CACHE_PATH, PRICE_CACHE_TTL,
+                          create_price_oracle)
+from rpc_source import (RpcClient, RpcError, UNICHAIN_RPC_URL, eth_usd_range, fetch_position_state,
+                        position_amounts, value_position)
 
 # === КОНСТАНТЫ ===
 ETH_RATE_MIN = 2000  # Минимально допустимый курс ETH для поиска
 ETH_RATE_MAX = 4000  # Максимально допустимый курс ETH для поиска
 POSITION_ID = "59044"  # Номер позиции Uniswap
 ETH_INITIAL = 38.1  # Начальное количество ETH
+UNISWAP_APP_URL = "https://app.uniswap.org"  # Адрес приложения Uniswap
+POSITION_PATH_TEMPLATE = "/positions/v3/unichain/{position}"  # Путь страницы позиции
+POSITION_URL_TEMPLATE = UNISWAP_APP_URL + POSITION_PATH_TEMPLATE  # Страница позиции
+PAGE_LOAD_TIMEOUT = 40  # Максимальное время ожидания данных на странице, секунд
+READY_POLL_INTERVAL = 0.5  # Интервал проверки готовности страницы, секунд
+GRID_SAMPLE_ROWS = 11  # Число строк сетки цен в выводе
+WATCH_RECYCLE_AFTER = 50  # Перезапуск браузера в режиме наблюдения после стольких загрузок страниц
 
 def parse_arguments():
     """
@@ -35,6 +61,21 @@ def parse_arguments():
   python3 uniswap_analyzer.py
   python3 uniswap_analyzer.py -p 12345 -i 50.0
   python3 uniswap_analyzer.py --eth_min 1500 --eth_max 3500 --position 67890 --eth_initial 25.5
+  python3 uniswap_analyzer.py --positions 59044 59045 59046
+  python3 uniswap_analyzer.py --positions-file positions.txt
+  python3 uniswap_analyzer.py --positions-file positions.txt --workers 0
+  python3 uniswap_analyzer.py --from-html debug_snapshots
+  python3 uniswap_analyzer.py --positions-file positions.txt --debug-capture sample --debug-sample-rate 0.1
+  python3 uniswap_analyzer.py --source rpc -p 59044
+  python3 uniswap_analyzer.py -p 59044 --fetch browser
+  python3 uniswap_analyzer.py -p 59044 --fetch browser --network-capture
+  python3 uniswap_analyzer.py --positions-file positions.txt --workers 0 --lean
+  python3 uniswap_analyzer.py --source rpc -p 59044 --grid 100000
+  python3 uniswap_analyzer.py --watch --positions 59044:60 59045 --interval 300
+  python3 uniswap_analyzer.py --watch --positions 59044 59045 --metrics-port 9108
+  python3 uniswap_analyzer.py --positions 59044 59045 --profile trace.json
+  python3 uniswap_analyzer.py --history-report --positions 59044 --history-since 30d --history-bucket 1d
+  python3 uniswap_analyzer.py -p 59044 --grid 100000 --range-lower 2200 --range-upper 3800
         """
     )
     
@@ -58,31 +99,310 @@ def parse_arguments():
                        default=ETH_INITIAL,
                        help=f'Начальное количество ETH (по умолчанию: {ETH_INITIAL})')
     
+    parser.add_argument('-P', '--positions',
+                       nargs='+',
+                       metavar='ID',
+                       help='Список номеров позиций для пакетного анализа в одном браузере '
+                            '(через пробел или запятую)')
+    
+    parser.add_argument('-f', '--positions-file',
+                       metavar='FILE',
+                       help='Файл с номерами позиций для пакетного анализа (по одному в строке, # - комментарий)')
+    
+    parser.add_argument('-t', '--timeout',
+                       type=float,
+                       default=PAGE_LOAD_TIMEOUT,
+                       help=f'Максимальное время ожидания данных на странице, секунд (по умолчанию: {PAGE_LOAD_TIMEOUT})')
+    
+    parser.add_argument('--from-html',
+                       metavar='PATH',
+                       help='Разобрать сохраненную страницу (файл .html/.html.gz, папку с ними или папку '
+                            'снимков --debug-dir) без запуска браузера')
+    
+    parser.add_argument('-s', '--source',
+                       choices=['web', 'rpc'],
+                       default='web',
+                       help='Источник данных: web - страница app.uniswap.org в браузере, '
+                            'rpc - контракты позиции через JSON-RPC без браузера (по умолчанию: web)')
+    
+    parser.add_argument('--fetch',
+                       choices=['tiered', 'http', 'browser'],
+                       default='tiered',
+                       help='Получение страницы для --source web: tiered - сначала HTTP-запрос без браузера, '
+                            'Chrome только если в ответе нет данных; http - только HTTP; browser - только Chrome '
+                            '(по умолчанию: tiered)')
+    
+    parser.add_argument('--network-capture',
+                       action='store_true',
+                       help='В браузере читать данные позиции из JSON-ответов API приложения (события сети '
+                            'DevTools) вместо разбора отрисованной страницы')
+    
+    parser.add_argument('--lean',
+                       action='store_true',
+                       help='Облегченная загрузка в браузере: без картинок, шрифтов, медиа и аналитики '
+                            '(блокировка запросов через DevTools); включает --load-stats')
+    
+    parser.add_argument('--load-stats',
+                       action='store_true',
+                       help='Выводить для каждой позиции число запросов, байты по сети, время загрузки '
+                            'страницы и пиковую память Chrome')
+    
+    parser.add_argument('--base-url',
+                       default=UNISWAP_APP_URL,
+                       help=f'Адрес приложения Uniswap, например локальной заглушки benchmarks/app_stub.py '
+                            f'(по умолчанию: {UNISWAP_APP_URL})')
+    
+    parser.add_argument('--rpc-url',
+                       default=UNICHAIN_RPC_URL,
+                       help=f'Адрес JSON-RPC узла Unichain (по умолчанию: {UNICHAIN_RPC_URL})')
+    
+    parser.add_argument('--rpc-record',
+                       metavar='FILE',
+                       help='Сохранить ответы JSON-RPC в файл для воспроизведения (benchmarks/rpc_stub.py)')
+    
+    parser.add_argument('-j', '--workers',
+                       type=int,
+                       default=1,
+                       help='Число процессов с браузером для пакетного анализа (0 - по числу ядер и свободной памяти; '
+                            'по умолчанию: 1)')
+    
+    parser.add_argument('--chrome-memory-mb',
+                       type=int,
+                       default=CHROME_MEMORY_MB,
+                       help=f'Оценка памяти на один браузер для ограничения числа процессов, МБ '
+                            f'(по умолчанию: {CHROME_MEMORY_MB})')
+    
+    parser.add_argument('--retries',
+                       type=int,
+                       default=PARALLEL_RETRIES,
+                       help=f'Повторов позиции, попавшей на страницу ошибки, в параллельном режиме '
+                            f'(по умолчанию: {PARALLEL_RETRIES})')
+    
+    parser.add_argument('-w', '--watch',
+                       action='store_true',
+                       help='Режим наблюдения: обновлять позиции по расписанию в одном процессе и выводить только изменения')
+    
+    parser.add_argument('--interval',
+                       type=float,
+                       default=WATCH_INTERVAL,
+                       help=f'Интервал обновления позиции в режиме наблюдения, секунд (по умолчанию: {WATCH_INTERVAL}); '
+                            f'для отдельной позиции можно указать "номер:интервал"')
+    
+    parser.add_argument('--recycle-after',
+                       type=int,
+                       default=WATCH_RECYCLE_AFTER,
+                       metavar='N',
+                       help=f'Перезапускать браузер в режиме наблюдения после N загрузок страниц '
+                            f'(по умолчанию: {WATCH_RECYCLE_AFTER})')
+    
+    parser.add_argument('--profile',
+                       metavar='FILE',
+                       help='Записать трассировку фаз анализа (JSON Trace Event для chrome://tracing и '
+                            'ui.perfetto.dev) со сводкой по фазам и счетчиками правил извлечения')
+    
+    parser.add_argument('--metrics-port',
+                       type=int,
+                       metavar='PORT',
+                       help='Отдавать метрики (длительности фаз, счетчики правил и уровней) в формате '
+                            'Prometheus по http://127.0.0.1:PORT/metrics, например в режиме наблюдения')
+    
+    parser.add_argument('--debug-capture',
+                       choices=CAPTURE_MODES,
+                       default='error',
+                       help='Снимки страниц для отладки: error - только неудачные извлечения, sample - еще и '
+                            'доля удачных (--debug-sample-rate), always - все, never - не сохранять '
+                            '(по умолчанию: error)')
+    
+    parser.add_argument('--debug-sample-rate',
+                       type=float,
+                       default=SNAPSHOT_SAMPLE_RATE,
+                       help=f'Доля удачных извлечений, сохраняемых с --debug-capture sample '
+                            f'(по умолчанию: {SNAPSHOT_SAMPLE_RATE})')
+    
+    parser.add_argument('--debug-dir',
+                       default=SNAPSHOT_DIR,
+                       metavar='DIR',
+                       help=f'Папка снимков страниц: сжатые страницы и индекс {SNAPSHOT_INDEX} '
+                            f'(по умолчанию: {SNAPSHOT_DIR})')
+    
+    parser.add_argument('--debug-max-mb',
+                       type=float,
+                       default=SNAPSHOT_MAX_MB,
+                       help=f'Ограничение размера папки снимков, МБ (по умолчанию: {SNAPSHOT_MAX_MB})')
+    
+    parser.add_argument('--debug-max-age',
+                       default='7d',
+                       help='Снимки старше удаляются, например 24h, 7d (по умолчанию: 7d)')
+    
+    parser.add_argument('--history-db',
+                       default=HISTORY_DB_PATH,
+                       metavar='FILE',
+                       help=f'База SQLite с историей значений позиций (по умолчанию: {HISTORY_DB_PATH})')
+    
+    parser.add_argument('--no-history',
+                       action='store_true',
+                       help='Не записывать значения позиций в историю')
+    
+    parser.add_argument('--history-report',
+                       action='store_true',
+                       help='Вывести агрегаты истории по позициям из --positions/--positions-file (или по всем) без анализа')
+    
+    parser.add_argument('--history-since',
+                       default='7d',
+                       help='Период отчета по истории, например 24h, 30d (по умолчанию: 7d)')
+    
+    parser.add_argument('--history-bucket',
+                       default='1d',
+                       help='Интервал группировки отчета по истории, например 1h, 1d (по умолчанию: 1d)')
+    
+    parser.add_argument('--price-providers',
+                       default='coingecko,binance',
+                       help=f'Провайдеры курса ETH через API в порядке приоритета, через запятую '
+                            f'(доступны: {", ".join(PROVIDERS)}; по умолчанию: coingecko,binance)')
+    
+    parser.add_argument('--price-cache',
+                       default=PRICE_CACHE_PATH,
+                       metavar='FILE',
+                       help=f'Файл кэша курсов, общий для запущенных анализаторов (по умолчанию: {PRICE_CACHE_PATH})')
+    
+    parser.add_argument('--no-price-cache',
+                       action='store_true',
+                       help='Не использовать файл кэша курсов (кэш только в памяти процесса)')
+    
+    parser.add_argument('--price-ttl',
+                       type=float,
+                       default=PRICE_CACHE_TTL,
+                       help=f'Время жизни курса в кэше, секунд (по умолчанию: {PRICE_CACHE_TTL})')
+    
+    parser.add_argument('--coingecko-url',
+                       help='Адрес API CoinGecko (например, локальной заглушки benchmarks/price_stub.py)')
+    
+    parser.add_argument('--binance-url',
+                       help='Адрес API Binance (например, локальной заглушки benchmarks/price_stub.py)')
+    
+    parser.add_argument('-g', '--grid',
+                       type=int,
+                       default=0,
+                       metavar='POINTS',
+                       help='Сценарный расчет по сетке из POINTS цен ETH от eth_min до eth_max (по умолчанию: 0 - выключен)')
+    
+    parser.add_argument('--range-lower',
+                       type=float,
+                       help='Нижняя цена ETH диапазона позиции, $ (для --grid, если диапазон не прочитан через --source rpc)')
+    
+    parser.add_argument('--range-upper',
+                       type=float,
+                       help='Верхняя цена ETH диапазона позиции, $ (для --grid, если диапазон не прочитан через --source rpc)')
+    
     return parser.parse_args()
 
-def get_eth_price_from_api():
+def read_positions_file(path):
+    """
+    Читает номера позиций из файла: по одному (или несколько через запятую) в строке,
+    пустые строки и текст после # игнорируются. После номера через двоеточие можно
+    указать интервал обновления для режима наблюдения: "59044:60"
+    """
+    position_ids = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            position_ids.extend(split_position_ids([line]))
+    return position_ids
+
+def split_position_ids(values):
+    """
+    Разбивает значения вида "1,2 3" на отдельные номера позиций
+    """
+    position_ids = []
+    for value in values:
+        position_ids.extend(p for p in re.split(r'[,\s]+', value) if p)
+    return position_ids
+
+def position_url_template(args):
+    """
+    Шаблон URL страницы позиции с учетом --base-url
+    """
+    return args.base_url.rstrip('/') + POSITION_PATH_TEMPLATE
+
+def create_oracle(args):
     """
-    Получает текущий курс ETH через API CoinGecko
+    Оракул курсов по аргументам командной строки
+    """
+    return create_price_oracle(
+        provider_names=[name for name in re.split(r'[,\s]+', args.price_providers) if name],
+        cache_path=None if args.no_price_cache else args.price_cache,
+        ttl=args.price_ttl,
+        base_urls={'coingecko': args.coingecko_url, 'binance': args.binance_url})
+
+def print_oracle_stats(oracle):
+    """
+    Выводит счетчики кэша курсов, если курсы запрашивались
+    """
+    stats = oracle.stats()
+    if stats['hits'] or stats['misses']:
+        requests_sent = ", ".join(f"{name}: {count}" for name, count in stats['requests'].items())
+        print(f"Кэш курсов: попаданий {stats['hits']}, промахов {stats['misses']}; запросов к API: {requests_sent}")
+
+def get_eth_price_from_api(oracle, tokens=()):
+    """
+    Получает текущий курс ETH через оракул курсов (кэш, затем провайдеры по порядку).
+    Курсы токенов пула позиции tokens (символы или адреса) запрашиваются тем же
+    запросом и попадают в кэш
     """
     try:
-        url = "https://api.coingecko.com/api/v3/simple/price?ids=ethereum&vs_currencies=usd"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            eth_price = data['ethereum']['usd']
-            print(f"Получен курс ETH через API: ${eth_price:,.2f}")
-            return eth_price
-        else:
-            print(f"Ошибка API: {response.status_code}")
-            return None
-    except Exception as e:
+        with metrics.span('price_api'):
+            eth_price = oracle.get_price('ETH', prefetch=(*DEFAULT_ASSETS, *tokens))
+        metrics.inc('price_api', provider=oracle.sources['ETH'])
+        print(f"Получен курс ETH через API ({oracle.sources['ETH']}): ${eth_price:,.2f}")
+        return eth_price
+    except PriceOracleError as e:
+        metrics.inc('price_api', provider='error')
         print(f"Ошибка при получении курса ETH через API: {e}")
         return None
 
-def extract_position_data_selenium(url, eth_min, eth_max):
+def chrome_options(args):
     """
-    Извлекает данные о позиции с помощью Selenium (эмуляция браузера)
+    Параметры запуска Chrome (create_chrome_driver) по аргументам командной строки
+    """
+    return {'network_capture': args.network_capture, 'lean': args.lean,
+            'load_stats': args.lean or args.load_stats}
+
+def snapshot_options(args):
+    """
+    Параметры записи снимков страниц (SnapshotWriter) по аргументам командной строки
     """
+    return {'directory': args.debug_dir, 'mode': args.debug_capture, 'sample_rate': args.debug_sample_rate,
+            'max_mb': args.debug_max_mb, 'max_age': parse_duration(args.debug_max_age)}
+
+def create_snapshot_writer(args):
+    """
+    Фоновая запись снимков страниц или None для --debug-capture never
+    """
+    if args.debug_capture == 'never':
+        return None
+    return SnapshotWriter(**snapshot_options(args))
+
+def close_snapshot_writer(snapshots):
+    """
+    Дописывает снимки из очереди, применяет ограничения и выводит счетчики
+    """
+    if snapshots is None:
+        return
+    snapshots.close()
+    if snapshots.written or snapshots.deduplicated or snapshots.dropped or snapshots.removed:
+        print(f"Снимки страниц ({snapshots.directory}): {snapshots.summary()}")
+
+def create_chrome_driver(network_capture=False, lean=False, load_stats=False):
+    """
+    Запускает headless Chrome с настройками для обхода блокировки автоматизации.
+    network_capture - записывать события сети для перехвата ответов API,
+    lean - без картинок, шрифтов, медиа и аналитики (lean_load.py),
+    load_stats - замерять стоимость загрузки каждой страницы (driver.load_stats)
+    """
+    # Selenium импортируется только при запуске браузера: уровню HTTP он не нужен
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    
     options = Options()
     # Используем headless режим с дополнительными настройками
     options.add_argument('--headless=new')
@@ -90,334 +410,1289 @@ def extract_position_data_selenium(url, eth_min, eth_max):
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument('--window-size=1920,1080')
-    options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    options.add_argument(f'--user-agent={USER_AGENT}')
     
     # Дополнительные опции для обхода блокировки
     options.add_argument('--disable-blink-features=AutomationControlled')
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
+    if network_capture:
+        enable_network_capture(options)
+    elif load_stats:
+        enable_performance_log(options)
+    if lean:
+        apply_lean_options(options)
     
-    driver = webdriver.Chrome(options=options)
+    with metrics.span('driver_start'):
+        driver = webdriver.Chrome(options=options)
+    count_webdriver_calls(driver)
+    driver.load_stats = load_stats
     
     # Выполняем JavaScript для скрытия автоматизации
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    if lean:
+        block_requests(driver)
+    return driver
+
+def count_webdriver_calls(driver):
+    """
+    Подключает к драйверу счетчик команд WebDriver (каждая команда - HTTP-запрос к chromedriver).
+    Счетчик по именам команд доступен как driver.webdriver_calls
+    """
+    calls = Counter()
+    execute = driver.execute
+    
+    def counted_execute(driver_command, params=None):
+        calls[driver_command] += 1
+        return execute(driver_command, params)
+    
+    driver.execute = counted_execute
+    driver.webdriver_calls = calls
+    return calls
+
+class LazyChromeDriver:
+    """
+    Браузер, который запускается при первом обращении - только если позиции
+    понадобился уровень Chrome. options - параметры create_chrome_driver,
+    page_loads - число обращений с последнего запуска
+    """
+    
+    def __init__(self, **options):
+        self.options = options
+        self.driver = None
+        self.page_loads = 0
+    
+    def get(self):
+        if self.driver is None:
+            started = time.time()
+            self.driver = create_chrome_driver(**self.options)
+            self.page_loads = 0
+            print(f"Браузер запущен за {time.time() - started:.1f} с")
+        self.page_loads += 1
+        return self.driver
+    
+    def quit(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+class PositionDataReady:
+    """
+    Условие для WebDriverWait: в видимом тексте страницы те же правила, что и при
+    извлечении (position_extractor), находят курс ETH и размер позиции (или на
+    странице нет сумм в долларах и размер позиции искать негде), и найденные
+    значения не изменились с предыдущей проверки (страница дорисовалась).
+    Возвращает 'ready', 'error' (страница ошибки) или False, пока данных нет.
+    """
+    
+    def __init__(self, eth_min=ETH_RATE_MIN, eth_max=ETH_RATE_MAX, stable_polls=2):
+        self.eth_min = eth_min
+        self.eth_max = eth_max
+        self.stable_polls = stable_polls
+        self.last_values = None
+        self.same_count = 0
+    
+    def __call__(self, driver):
+        # Заголовок и видимый текст получаем одним запросом к браузеру
+        title, body_text = driver.execute_script(
+            "return [document.title, document.body ? document.body.innerText : ''];")
+        if "ERR_" in body_text or "error" in (title or "").lower():
+            return 'error'
+        
+        # Строки видимого текста вместо текстов элементов; скобки ищутся в самом тексте
+        texts = [line.strip() for line in body_text.splitlines() if line.strip()]
+        dollar_texts = [text for text in texts if '$' in text]
+        number_texts = [] if dollar_texts else [text for text in texts if any(c.isdigit() for c in text)]
+        result = extract_position_values(texts, dollar_texts, number_texts, body_text, self.eth_min, self.eth_max)
+        if result.eth_rate is None or (result.position_usd is None and dollar_texts):
+            self.last_values = None
+            self.same_count = 0
+            return False
+        
+        values = (result.position_usd, result.eth_rate)
+        if values == self.last_values:
+            self.same_count += 1
+        else:
+            self.last_values = values
+            self.same_count = 1
+        return 'ready' if self.same_count >= self.stable_polls else False
+
+def wait_for_position_data(driver, timeout=PAGE_LOAD_TIMEOUT, poll_interval=READY_POLL_INTERVAL,
+                           eth_min=ETH_RATE_MIN, eth_max=ETH_RATE_MAX):
+    """
+    Ждет, пока на странице появятся и перестанут меняться данные позиции
+    (курс ETH ищется в диапазоне [eth_min, eth_max]).
+    Возвращает (статус, затраченное время в секундах); статус 'timeout', если не дождались
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    
+    started = time.time()
+    with metrics.span('wait_position_data'):
+        try:
+            status = WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(
+                PositionDataReady(eth_min, eth_max))
+        except TimeoutException:
+            status = 'timeout'
+    metrics.inc('wait', wait='position_data', status=status)
+    return status, time.time() - started
+
+def wait_for_document_ready(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """
+    Ждет завершения загрузки документа (document.readyState == 'complete').
+    Возвращает затраченное время в секундах
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    
+    started = time.time()
+    with metrics.span('wait_document_ready'):
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=READY_POLL_INTERVAL).until(
+                lambda d: d.execute_script("return document.readyState") == 'complete')
+        except TimeoutException:
+            pass
+    return time.time() - started
+
+def extract_from_page_snapshot(snapshot, eth_min, eth_max):
+    """
+    Извлекает размер позиции и курс ETH из снимка страницы (живой или сохраненной).
+    Возвращает position_extractor.ExtractionResult
+    """
+    # Все элементы с текстом
+    all_texts = snapshot.texts()
+    
+    print(f"Найдено {len(all_texts)} текстовых элементов")
+    
+    # Элементы с символом $
+    dollar_texts = snapshot.dollar_texts()
+    
+    print(f"Найдено {len(dollar_texts)} элементов с символом $")
+    print("Примеры элементов с $:")
+    for i, text in enumerate(dollar_texts[:5]):
+        print(f"  {i+1}: {text}")
+    
+    # Если не нашли элементы с $, попробуем найти любые числа
+    number_texts = []
+    if not dollar_texts:
+        print("Не найдены элементы с $. Ищем любые числовые значения...")
+        # Фильтруем тексты снимка по наличию цифр
+        number_texts = snapshot.number_texts()
+        print(f"Найдено {len(number_texts)} элементов с числами")
+        print("Примеры элементов с числами:")
+        for i, text in enumerate(number_texts[:10]):
+            print(f"  {i+1}: {text}")
+    
+    # Разбор значений позиции и курса ETH за один проход по снимку
+    with metrics.span('parse'):
+        result = extract_position_values(all_texts, dollar_texts, number_texts, snapshot.html, eth_min, eth_max)
+    
+    if result.position_usd is not None:
+        print(f"Найдено значение позиции: ${result.position_usd:,.2f} "
+              f"(правило {result.position_source}, текст: {result.position_text})")
+    if result.eth_rate is not None:
+        print(f"Найдено значение курса ETH: ${result.eth_rate:,.2f} "
+              f"(правило {result.rate_source}, текст: {result.rate_text})")
+    return result
+
+def source_rule(source):
+    """
+    Метка правила для счетчиков: имя правила, 'json' для значений из JSON
+    ("json:<путь>", "<URL> json:<путь>") или 'none', если значение не найдено
+    """
+    if source is None:
+        return 'none'
+    return 'json' if 'json:' in source else source
+
+def count_sources(tier, position_source, rate_source):
+    """
+    Счетчики правил, давших размер позиции и курс ETH, по уровню получения данных
+    """
+    metrics.inc('position_source', tier=tier, rule=source_rule(position_source))
+    metrics.inc('rate_source', tier=tier, rule=source_rule(rate_source))
+
+def capture_snapshot(snapshots, url, snapshot, failed, reason):
+    """
+    Передает HTML страницы фоновой записи снимков (snapshot_writer.py), если этого
+    требует режим --debug-capture; snapshots=None - снимки не сохраняются
+    """
+    if snapshots is not None and snapshots.capture(url, snapshot.html, failed, reason):
+        print(f"Снимок страницы передан на запись в {snapshots.directory}")
+
+def extract_position_data_selenium(url, eth_min, eth_max, driver=None, timeout=PAGE_LOAD_TIMEOUT, stats=None,
+                                   snapshots=None):
+    """
+    Извлекает данные о позиции с помощью Selenium (эмуляция браузера)
+    
+    Если передан driver, используется уже запущенный браузер и он не закрывается
+    после извлечения (пакетный режим). Иначе браузер запускается и закрывается здесь.
+    timeout - максимальное время ожидания данных на странице. В stats (словарь), если
+    передан, записываются фактические времена ожиданий в stats['waits'], число
+    запросов к WebDriver за извлечение в stats['webdriver_calls'] и признак страницы
+    ошибки после повторной попытки в stats['error_page'], а для браузера с
+    load_stats - стоимость загрузки в stats['load']. HTML страницы передается
+    записи снимков snapshots (SnapshotWriter), если она задана.
+    """
+    if stats is None:
+        stats = {}
+    waits = stats.setdefault('waits', [])
+    
+    owns_driver = driver is None
+    if owns_driver:
+        driver = create_chrome_driver()
+    calls = getattr(driver, 'webdriver_calls', Counter())
+    calls_before = sum(calls.values())
+    recorder = PageLoadRecorder(driver) if getattr(driver, 'load_stats', False) else None
     
     try:
+        if recorder is not None:
+            recorder.start()
         print("Открываем страницу...")
-        driver.get(url)
+        with metrics.span('navigate'):
+            driver.get(url)
         
-        # Ждем загрузки страницы
+        # Ждем, пока отрисуются значения позиции и курса
         print("Ждем загрузки данных...")
-        time.sleep(15)  # Увеличиваем время ожидания
+        status, waited = wait_for_position_data(driver, timeout, eth_min=eth_min, eth_max=eth_max)
+        waits.append(('position_data', status, waited))
+        print(f"Ожидание данных: {waited:.1f} с ({status})")
         
-        # Сохраняем HTML для отладки
-        with open('debug_page.html', 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print("HTML страницы сохранен в debug_page.html")
+        # Снимок страницы (HTML и все видимые тексты) за один запрос к браузеру
+        with metrics.span('snapshot'):
+            snapshot = take_snapshot(driver)
         
         # Проверяем, не попали ли мы на страницу ошибки
-        if "ERR_" in driver.page_source or "error" in driver.title.lower():
+        if snapshot.is_error_page():
             print("Обнаружена страница ошибки. Пробуем альтернативный подход...")
-            # Попробуем перейти на главную страницу Uniswap
-            driver.get("https://app.uniswap.org/")
-            time.sleep(10)
-            # Теперь попробуем перейти к позиции
-            driver.get(url)
-            time.sleep(15)
-            
-            # Сохраняем обновленный HTML
-            with open('debug_page.html', 'w', encoding='utf-8') as f:
-                f.write(driver.page_source)
-            print("Обновленный HTML страницы сохранен в debug_page.html")
-        
-        # Ищем все элементы с текстом
-        all_elements = driver.find_elements(By.XPATH, "//*[text()]")
-        all_texts = [el.text for el in all_elements if el.text.strip()]
-        
-        print(f"Найдено {len(all_texts)} текстовых элементов")
-        
-        # Ищем элементы с символом $
-        dollar_elements = driver.find_elements(By.XPATH, "//*[contains(text(), '$')]")
-        dollar_texts = [el.text for el in dollar_elements if '$' in el.text]
-        
-        print(f"Найдено {len(dollar_texts)} элементов с символом $")
-        print("Примеры элементов с $:")
-        for i, text in enumerate(dollar_texts[:5]):
-            print(f"  {i+1}: {text}")
-        
-        # Если не нашли элементы с $, попробуем найти любые числа
-        if not dollar_texts:
-            print("Не найдены элементы с $. Ищем любые числовые значения...")
-            # Используем более простой подход - ищем все элементы с текстом и фильтруем по наличию цифр
-            all_text_elements = driver.find_elements(By.XPATH, "//*[text()]")
-            number_texts = [el.text for el in all_text_elements if any(c.isdigit() for c in el.text) and el.text.strip()]
-            print(f"Найдено {len(number_texts)} элементов с числами")
-            print("Примеры элементов с числами:")
-            for i, text in enumerate(number_texts[:10]):
-                print(f"  {i+1}: {text}")
+            capture_snapshot(snapshots, url, snapshot, True, 'error_page')
+            metrics.inc('error_page_retry')
+            with metrics.span('error_retry'):
+                # Попробуем перейти на главную страницу Uniswap
+                parts = urlsplit(url)
+                with metrics.span('navigate_home'):
+                    driver.get(f"{parts.scheme}://{parts.netloc}/")
+                waited = wait_for_document_ready(driver, timeout)
+                waits.append(('home_page', 'ready', waited))
+                # Теперь попробуем перейти к позиции
+                with metrics.span('navigate'):
+                    driver.get(url)
+                status, waited = wait_for_position_data(driver, timeout, eth_min=eth_min, eth_max=eth_max)
+                waits.append(('position_data_retry', status, waited))
+                print(f"Повторное ожидание данных: {waited:.1f} с ({status})")
+                
+                with metrics.span('snapshot'):
+                    snapshot = take_snapshot(driver)
         
-        position_usd = None
-        eth_rate = None
+        stats['error_page'] = snapshot.is_error_page()
+        result = extract_from_page_snapshot(snapshot, eth_min, eth_max)
+        count_sources('browser', result.position_source, result.rate_source)
+        failed = stats['error_page'] or result.position_usd is None or result.eth_rate is None
+        capture_snapshot(snapshots, url, snapshot, failed, 'error_page' if stats['error_page'] else 'no_data')
+        return result.position_usd, result.eth_rate
         
-        # Поиск значения позиции (ищем крупные суммы)
-        position_patterns = [
-            r'(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\s*\$',  # 1,234.56 $ или 1 234,56 $
-            r'\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)',     # $1,234.56
-        ]
-        
-        for text in dollar_texts:
-            for pattern in position_patterns:
-                matches = re.findall(pattern, text.replace('\u202f', '').replace('\xa0', ''))
-                for match in matches:
-                    try:
-                        value = match.replace(' ', '').replace(',', '.')
-                        val = float(value)
-                        if val > 1000:  # Ищем крупные суммы (позиция обычно больше 1000$)
-                            if not position_usd or val > position_usd:
-                                position_usd = val
-                                print(f"Найдено значение позиции: ${position_usd:,.2f} в тексте: {text}")
-                    except:
-                        continue
-        
-        # Если не нашли позицию через регулярные выражения, возьмем самое большое значение из найденных
-        if not position_usd:
-            largest_value = 0
-            for text in dollar_texts:
-                # Ищем все числа в тексте
-                numbers = re.findall(r'\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)', text)
-                for num_str in numbers:
-                    try:
-                        value = num_str.replace(' ', '').replace(',', '.')
-                        val = float(value)
-                        if val > largest_value and val > 1000:
-                            largest_value = val
-                    except:
-                        continue
-            
-            if largest_value > 0:
-                position_usd = largest_value
-                print(f"Используем самое большое найденное значение позиции: ${position_usd:,.2f}")
-        
-        # Если все еще не нашли позицию, используем правильный парсинг
-        if not position_usd and dollar_texts:
-            # Берем первое значение (оно самое большое)
-            first_text = dollar_texts[0]
-            # Убираем символ $ и пробелы
-            clean_text = first_text.replace('$', '').replace(' ', '')
-            # Ищем все цифры и запятые
-            number_match = re.search(r'(\d{1,3}(?:,\d{3})*(?:\.\d+)?)', clean_text)
-            if number_match:
-                try:
-                    # Заменяем запятые на пустую строку (разделители тысяч)
-                    value_str = number_match.group(1).replace(',', '')
-                    position_usd = float(value_str)
-                    print(f"Извлечено значение позиции из первого элемента: ${position_usd:,.2f}")
-                except:
-                    pass
-        
-        # Если все еще не нашли позицию, используем самый простой способ
-        if not position_usd and dollar_texts:
-            # Берем первое значение (оно самое большое)
-            first_text = dollar_texts[0]
-            # Убираем символ $ и пробелы
-            clean_text = first_text.replace('$', '').replace(' ', '')
-            # Убираем все запятые (они разделяют тысячи)
-            clean_text = clean_text.replace(',', '')
-            # Ищем число
-            number_match = re.search(r'(\d+\.?\d*)', clean_text)
-            if number_match:
-                try:
-                    position_usd = float(number_match.group(1))
-                    print(f"Извлечено значение позиции из первого элемента: ${position_usd:,.2f}")
-                except:
-                    pass
-        
-        # Поиск курса ETH (значение в скобках)
-        eth_patterns = [
-            r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\s*\$\)',  # (1,234.56 $) или (1 234,56 $)
-            r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)',       # (1,234.56) или (1 234,56)
-        ]
-        
-        # Ищем курс ETH в тексте страницы
-        page_text = driver.page_source
-        for pattern in eth_patterns:
-            matches = re.findall(pattern, page_text.replace('\u202f', '').replace('\xa0', ''))
-            for match in matches:
-                try:
-                    # Заменяем запятые на точки для правильного парсинга
-                    value = match.replace(' ', '').replace(',', '.')
-                    val = float(value)
-                    if eth_min <= val <= eth_max:  # Курс ETH в заданном диапазоне
-                        eth_rate = val
-                        print(f"Найдено значение курса ETH: ${eth_rate:,.2f}")
-                        break
-                except:
-                    continue
-            if eth_rate:
-                break
-        
-        # Если не нашли через регулярные выражения, попробуем найти в тексте элементов
-        if not eth_rate:
-            for text in all_texts:
-                if '(' in text and ')' in text and '$' in text:
-                    # Ищем значение в скобках
-                    bracket_match = re.search(r'\(([^)]+)\)', text)
-                    if bracket_match:
-                        bracket_content = bracket_match.group(1)
-                        # Ищем число в скобках
-                        number_match = re.search(r'(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)', bracket_content)
-                        if number_match:
-                            try:
-                                # Заменяем запятые на точки для правильного парсинга
-                                value = number_match.group(1).replace(' ', '').replace(',', '.')
-                                val = float(value)
-                                if eth_min <= val <= eth_max:
-                                    eth_rate = val
-                                    print(f"Найдено значение курса ETH: ${eth_rate:,.2f} в тексте: {text}")
-                                    break
-                            except:
-                                continue
-        
-        # Если все еще не нашли курс ETH, ищем в HTML напрямую
-        if not eth_rate:
-            # Ищем конкретно значение в скобках с долларом
-            eth_match = re.search(r'\(\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)', page_text)
-            if eth_match:
-                try:
-                    value = eth_match.group(1).replace(' ', '').replace(',', '.')
-                    eth_rate = float(value)
-                    print(f"Найдено значение курса ETH из HTML: ${eth_rate:,.2f}")
-                except:
-                    pass
-        
-        # Если все еще не нашли курс ETH, ищем более точно
-        if not eth_rate:
-            # Ищем значение в скобках с долларом в любом формате
-            eth_patterns = [
-                r'\(\$(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)',  # ($2,314.00)
-                r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\s*\$\)',  # (2,314.00 $)
-                r'\((\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)\)',  # (2,314.00)
-            ]
-            
-            print("Ищем курс ETH в HTML...")
-            for pattern in eth_patterns:
-                matches = re.findall(pattern, page_text)
-                print(f"Паттерн {pattern}: найдено {len(matches)} совпадений")
-                for match in matches:
-                    print(f"  Найдено: {match}")
-                    try:
-                        # Заменяем только запятые между цифрами (разделители тысяч)
-                        # Оставляем точку как десятичный разделитель
-                        value = match.replace(' ', '')
-                        # Заменяем запятые на пустую строку только если они между цифрами
-                        value = re.sub(r'(\d),(\d)', r'\1\2', value)
-                        val = float(value)
-                        print(f"  Преобразовано в число: {val}")
-                        if eth_min <= val <= eth_max:
-                            eth_rate = val
-                            print(f"Найдено значение курса ETH: ${eth_rate:,.2f}")
-                            break
-                    except Exception as e:
-                        print(f"  Ошибка преобразования: {e}")
-                        continue
-                if eth_rate:
-                    break
+    except Exception as e:
+        print(f"Ошибка при извлечении данных через Selenium: {e}")
+        stats['error'] = f"ошибка Selenium: {e}"
+        import traceback
+        traceback.print_exc()
+        return None, None
+    finally:
+        if recorder is not None:
+            record_load_stats(recorder, stats)
+        stats['webdriver_calls'] = sum(calls.values()) - calls_before
+        print(f"Запросов к WebDriver: {stats['webdriver_calls']}")
+        if owns_driver:
+            driver.quit()
+
+def record_load_stats(recorder, stats):
+    """
+    Записывает стоимость загрузки страницы в stats['load'] и выводит ее
+    """
+    try:
+        stats['load'] = recorder.finish()
+        print(f"Загрузка страницы: {format_load_stats(stats['load'])}")
+    except Exception as e:
+        print(f"Не удалось замерить загрузку страницы: {e}")
+
+def extract_position_data_network(url, eth_min, eth_max, driver=None, timeout=PAGE_LOAD_TIMEOUT, stats=None,
+                                  snapshots=None):
+    """
+    Извлекает данные о позиции из JSON-ответов API приложения, перехваченных через
+    события сети DevTools (network_capture.py), не дожидаясь отрисовки страницы
+    
+    driver должен быть запущен с create_chrome_driver(network_capture=True); без
+    него браузер запускается и закрывается здесь. Если в ответах за timeout нет
+    размера позиции или курса, недостающее ищется в отрисованной странице, как в
+    extract_position_data_selenium. В stats записываются ожидание в stats['waits'],
+    число JSON-ответов в stats['network_responses'], запросы к WebDriver в
+    stats['webdriver_calls'], признак страницы ошибки в stats['error_page'] и
+    стоимость загрузки в stats['load'] (для браузера с load_stats). Разобранная
+    страница передается записи снимков snapshots
+    """
+    if stats is None:
+        stats = {}
+    waits = stats.setdefault('waits', [])
+    
+    owns_driver = driver is None
+    if owns_driver:
+        driver = create_chrome_driver(network_capture=True)
+    calls = getattr(driver, 'webdriver_calls', Counter())
+    calls_before = sum(calls.values())
+    capture = NetworkCapture(driver)
+    recorder = PageLoadRecorder(driver, capture) if getattr(driver, 'load_stats', False) else None
+    
+    try:
+        if recorder is not None:
+            recorder.start()
+        else:
+            capture.reset()
+        print("Открываем страницу с перехватом ответов API...")
+        with metrics.span('navigate'):
+            driver.get(url)
         
-        # Если все еще не нашли курс ETH, попробуем найти в тексте элементов
-        if not eth_rate and number_texts:
-            print("Ищем курс ETH в тексте элементов...")
-            for text in number_texts:
-                # Ищем числа в заданном диапазоне
-                numbers = re.findall(r'(\d{1,3}(?:[,\s]\d{3})*(?:[.,]\d+)?)', text)
-                for num_str in numbers:
-                    try:
-                        value = num_str.replace(' ', '').replace(',', '.')
-                        val = float(value)
-                        if eth_min <= val <= eth_max:
-                            eth_rate = val
-                            print(f"Найдено значение курса ETH: ${eth_rate:,.2f} в тексте: {text}")
-                            break
-                    except:
-                        continue
-                if eth_rate:
-                    break
+        with metrics.span('wait_network'):
+            values, status, waited = capture.wait_for_values(eth_min, eth_max, timeout,
+                                                             position_id=position_key(url))
+        metrics.inc('wait', wait='network', status=status)
+        waits.append(('network', status, waited))
+        stats['network_responses'] = len(capture.responses)
+        stats['position_tokens'] = position_tokens([response.data for response in capture.responses],
+                                                   position_key(url))
+        stats['error_page'] = False
+        print(f"Ожидание ответов API: {waited:.1f} с ({status}), JSON-ответов: {len(capture.responses)}"
+              + (f", недоступных тел: {capture.body_errors}" if capture.body_errors else ""))
+        for response in capture.responses:
+            print(f"  {response.url}")
+        if values.position_usd is not None:
+            print(f"Найдено значение позиции: ${values.position_usd:,.2f} (ответ {values.position_source})")
+        if values.eth_rate is not None:
+            print(f"Найдено значение курса ETH: ${values.eth_rate:,.2f} (ответ {values.rate_source})")
+        if status == 'ready':
+            # Данные получены - дальнейшая загрузка и отрисовка страницы не нужны
+            driver.execute_script("window.stop();")
+            count_sources('network', values.position_source, values.rate_source)
+            return values.position_usd, values.eth_rate
         
+        print("В ответах API нет данных позиции, разбираем отрисованную страницу...")
+        with metrics.span('snapshot'):
+            snapshot = take_snapshot(driver)
+        stats['error_page'] = snapshot.is_error_page()
+        result = extract_from_page_snapshot(snapshot, eth_min, eth_max)
+        position_usd = values.position_usd if values.position_usd is not None else result.position_usd
+        eth_rate = values.eth_rate if values.eth_rate is not None else result.eth_rate
+        count_sources('network', values.position_source or result.position_source,
+                      values.rate_source or result.rate_source)
+        failed = stats['error_page'] or position_usd is None or eth_rate is None
+        capture_snapshot(snapshots, url, snapshot, failed, 'error_page' if stats['error_page'] else 'no_data')
         return position_usd, eth_rate
         
     except Exception as e:
-        print(f"Ошибка при извлечении данных через Selenium: {e}")
+        print(f"Ошибка при перехвате ответов API: {e}")
+        stats['error'] = f"ошибка перехвата ответов API: {e}"
         import traceback
         traceback.print_exc()
         return None, None
     finally:
-        driver.quit()
+        if recorder is not None:
+            record_load_stats(recorder, stats)
+        stats['webdriver_calls'] = sum(calls.values()) - calls_before
+        print(f"Запросов к WebDriver: {stats['webdriver_calls']}")
+        if owns_driver:
+            driver.quit()
 
-def main():
+def extract_position_data_http(url, eth_min, eth_max, timeout=HTTP_TIMEOUT, page=None, stats=None):
     """
-    Основная функция скрипта
+    Извлекает данные о позиции из ответа сервера без браузера (HTML и встроенный JSON).
+    page - страница, уже загруженная fetch_pages (пакетный режим); токены пула из
+    встроенного JSON записываются в stats['position_tokens']
     """
-    # Парсим аргументы командной строки
-    args = parse_arguments()
+    print("Запрашиваем страницу без браузера (HTTP)...")
+    if page is None:
+        page = fetch_page(url, timeout)
+    # Страницы пакета загружаются заранее и параллельно - время загрузки берется из самой страницы
+    metrics.observe('http_fetch', page.seconds)
+    if page.html is None:
+        metrics.inc('http_fetch_error')
+        print(f"Ошибка HTTP-запроса: {page.error}")
+        if stats is not None:
+            stats['error'] = f"ошибка HTTP-запроса: {page.error}"
+        return None, None
+    print(f"Получено {len(page.html):,} символов за {page.seconds:.2f} с")
     
-    # URL позиции Uniswap
-    url = f"https://app.uniswap.org/positions/v3/unichain/{args.position}"
+    with metrics.span('http_parse'):
+        result = extract_from_response(page.html, eth_min, eth_max, position_key(url))
+    if result.error_page:
+        metrics.inc('error_page', tier='http')
+        print("Сервер вернул страницу ошибки")
+        if stats is not None:
+            stats['error'] = "сервер вернул страницу ошибки"
+        return None, None
+    count_sources('http', result.position_source, result.rate_source)
+    if stats is not None and result.tokens:
+        stats['position_tokens'] = result.tokens
+    if result.json_documents:
+        print(f"Встроенных JSON-документов: {result.json_documents}")
+    if result.position_usd is not None:
+        print(f"Найдено значение позиции: ${result.position_usd:,.2f} (правило {result.position_source})")
+    if result.eth_rate is not None:
+        print(f"Найдено значение курса ETH: ${result.eth_rate:,.2f} (правило {result.rate_source})")
+    return result.position_usd, result.eth_rate
+
+def try_http_tier(url, args, stats, page=None):
+    """
+    Уровень HTTP для --fetch tiered/http. Записывает время уровня в stats['tiers'].
+    Возвращает (position_usd, eth_rate, найдены ли оба значения)
+    """
+    started = time.time()
+    position_usd, eth_rate = extract_position_data_http(url, args.eth_min, args.eth_max, page=page, stats=stats)
+    found = position_usd is not None and eth_rate is not None
+    # Время загрузки заранее полученной страницы входит во время уровня
+    seconds = time.time() - started + (page.seconds if page is not None else 0.0)
+    record_tier(stats, 'http', found, seconds)
+    if found or args.fetch == 'http':
+        stats['tier'] = 'http'
+    return position_usd, eth_rate, found
+
+def record_tier(stats, tier, found, seconds):
+    """
+    Записывает результат уровня получения страницы в stats['tiers'] и в метрики
+    """
+    stats.setdefault('tiers', []).append((tier, 'ok' if found else 'нет данных', seconds))
+    metrics.observe(f'tier_{tier}', seconds)
+    metrics.inc('tier', tier=tier, result='ok' if found else 'no_data')
+
+def format_tiers(stats):
+    """
+    Уровни получения страницы и их время: "http 0.08 с (нет данных), browser 6.2 с (ok)"
+    """
+    return ", ".join(f"{name} {seconds:.2f} с ({status})" for name, status, seconds in stats.get('tiers', []))
+
+def create_rpc_client(args):
+    """
+    JSON-RPC клиент по аргументам командной строки (с записью ответов, если задан --rpc-record)
+    """
+    return RpcClient(args.rpc_url, record={} if args.rpc_record else None)
+
+def close_rpc_client(client, args):
+    """
+    Сохраняет записанные ответы JSON-RPC, если задан --rpc-record
+    """
+    if args.rpc_record:
+        client.save_record(args.rpc_record)
+        print(f"Ответы JSON-RPC сохранены в {args.rpc_record}")
+
+def extract_position_data_rpc(position_id, client, stats=None):
+    """
+    Оценивает позицию напрямую по контрактам Uniswap V3 через JSON-RPC
+    """
+    if stats is None:
+        stats = {}
+    requests_before = client.requests_sent
+    started = time.time()
+    try:
+        print(f"Читаем позицию {position_id} через JSON-RPC ({client.url})...")
+        with metrics.span('rpc'):
+            state = fetch_position_state(client, position_id)
+        amount0, amount1 = position_amounts(state)
+        print(f"Блок {state.block_number}, пул {state.symbol0}/{state.symbol1} ({state.fee / 10000:g}%)")
+        print(f"Диапазон тиков: {state.tick_lower} .. {state.tick_upper}, текущий тик: {state.tick}")
+        print(f"В позиции: {amount0:,.6f} {state.symbol0} + {amount1:,.6f} {state.symbol1}")
+        
+        position_usd, eth_rate = value_position(state)
+        print(f"Найдено значение позиции: ${position_usd:,.2f}")
+        print(f"Найдено значение курса ETH: ${eth_rate:,.2f}")
+        count_sources('rpc', 'pool_state', 'pool_state')
+        stats['position_state'] = state
+        stats['position_tokens'] = [state.token0, state.token1]
+        return position_usd, eth_rate
+    except (RpcError, requests.RequestException, ValueError) as e:
+        print(f"Ошибка при чтении позиции через JSON-RPC: {e}")
+        stats['error'] = f"ошибка JSON-RPC: {e}"
+        return None, None
+    finally:
+        stats['rpc_requests'] = client.requests_sent - requests_before
+        print(f"Запросов к JSON-RPC: {stats['rpc_requests']} за {time.time() - started:.3f} с")
+
+def fetch_position_data(position_id, args, browser=None, rpc_client=None, stats=None, snapshots=None):
+    """
+    Получает (position_usd, eth_rate) из источника, выбранного в --source.
+    Для страницы сначала пробуется HTTP без браузера (--fetch tiered), Chrome -
+    только если в ответе нет данных. browser (LazyChromeDriver) - браузер пакета,
+    который запускается при первой позиции, дошедшей до Chrome; без него браузер
+    с параметрами chrome_options запускается и закрывается здесь. Уровень, давший
+    ответ, - в stats['tier']; snapshots - запись снимков страниц браузера
+    """
+    if args.source == 'rpc':
+        return extract_position_data_rpc(position_id, rpc_client, stats=stats)
+    if stats is None:
+        stats = {}
+    url = position_url_template(args).format(position=position_id)
     
+    if args.fetch != 'browser':
+        position_usd, eth_rate, found = try_http_tier(url, args, stats)
+        if found or args.fetch == 'http':
+            print(f"Уровни: {format_tiers(stats)}")
+            return position_usd, eth_rate
+        print("В ответе сервера нет данных позиции, переходим к браузеру...")
+        # Итог определяет браузер: ошибка уровня HTTP уже не причина неудачи
+        stats.pop('error', None)
+    
+    started = time.time()
+    owns_browser = browser is None
+    if owns_browser:
+        browser = LazyChromeDriver(**chrome_options(args))
+    try:
+        driver = browser.get()
+        if args.network_capture:
+            tier = 'network'
+            position_usd, eth_rate = extract_position_data_network(url, args.eth_min, args.eth_max,
+                                                                   driver=driver, timeout=args.timeout, stats=stats,
+                                                                   snapshots=snapshots)
+        else:
+            tier = 'browser'
+            position_usd, eth_rate = extract_position_data_selenium(url, args.eth_min, args.eth_max,
+                                                                    driver=driver, timeout=args.timeout, stats=stats,
+                                                                    snapshots=snapshots)
+    finally:
+        if owns_browser:
+            browser.quit()
+    found = position_usd is not None and eth_rate is not None
+    record_tier(stats, tier, found, time.time() - started)
+    stats['tier'] = tier
+    print(f"Уровни: {format_tiers(stats)}")
+    return position_usd, eth_rate
+
+def print_comparison(position_usd, eth_rate, eth_initial):
+    """
+    Выводит сравнение стоимости позиции с начальным вложением эфира
+    """
+    print(f"Размер позиции: ${position_usd:,.2f}")
+    print(f"Курс ETH: ${eth_rate:,.2f}")
+    print("-" * 50)
+    
+    # Вычисления
+    current_eth_value = eth_initial * eth_rate
+    current_position_in_eth = position_usd / eth_rate
+    
+    # Вывод результатов сравнения
+    print("СРАВНЕНИЕ 1:")
+    print(f"Текущая стоимость начального эфира: ${current_eth_value:,.2f}")
+    print(f"Текущее значение позиции: ${position_usd:,.2f}")
+    print("-" * 50)
+    
+    print("СРАВНЕНИЕ 2:")
+    print(f"Начальное вложение эфира: {eth_initial} ETH")
+    print(f"Текущее значение позиции в эфирах: {current_position_in_eth:.4f} ETH")
+    print("-" * 50)
+    
+    # Дополнительный анализ
+    if current_eth_value > position_usd:
+        print(f"Позиция показывает убыток: ${current_eth_value - position_usd:,.2f}")
+    else:
+        print(f"Позиция показывает прибыль: ${position_usd - current_eth_value:,.2f}")
+    
+    if current_position_in_eth > eth_initial:
+        print(f"Позиция в ETH показывает рост: +{current_position_in_eth - eth_initial:.4f} ETH")
+    else:
+        print(f"Позиция в ETH показывает падение: {current_position_in_eth - eth_initial:.4f} ETH")
+
+def grid_position_params(position_usd, eth_rate, args, stats=None):
+    """
+    Параметры позиции для сценарного расчета: (ликвидность, нижняя цена, верхняя цена).
+    Для пула WETH/USDC, прочитанного через JSON-RPC, берутся точные значения из
+    блокчейна, иначе ликвидность калибруется по размеру позиции и диапазону
+    --range-lower/--range-upper. Возвращает None, если параметры определить нельзя
+    """
+    state = (stats or {}).get('position_state')
+    if state is not None:
+        params = eth_usd_range(state)
+        if params is not None:
+            return params
+        print(f"Пул {state.symbol0}/{state.symbol1} не WETH/USDC, диапазон берется из --range-lower/--range-upper")
+    
+    if args.range_lower is None or args.range_upper is None:
+        print("Для сценарного расчета укажите --range-lower и --range-upper")
+        return None
+    if not 0 < args.range_lower < args.range_upper:
+        print("Ошибка: должно быть 0 < --range-lower < --range-upper")
+        return None
+    
+    from price_grid import liquidity_from_value
+    liquidity = liquidity_from_value(position_usd, eth_rate, args.range_lower, args.range_upper)[0]
+    return liquidity, args.range_lower, args.range_upper
+
+def print_price_grid(params, eth_rate, args):
+    """
+    Сценарный расчет одной позиции по сетке цен ETH от eth_min до eth_max:
+    стоимость позиции, стоимость начального эфира (HODL), отклонение от HODL и
+    стоимость позиции в ETH
+    """
+    from price_grid import price_grid, evaluate_grid, breakeven_prices, summarize
+    
+    liquidity, price_lower, price_upper = params
+    started = time.time()
+    prices = price_grid(args.eth_min, args.eth_max, args.grid)
+    result = evaluate_grid(prices, liquidity, price_lower, price_upper, args.eth_initial)
+    breakevens = breakeven_prices(result)[0]
+    summary = summarize(result)
+    elapsed = time.time() - started
+    
+    print(f"СЦЕНАРИИ ПО ЦЕНЕ ETH ({len(prices):,} точек, ${args.eth_min:,.0f} - ${args.eth_max:,.0f}):")
+    print(f"Диапазон позиции: ${price_lower:,.2f} - ${price_upper:,.2f}, текущий курс: ${eth_rate:,.2f}")
+    print(f"{'Курс ETH, $':>12} {'Позиция, $':>15} {'HODL, $':>15} {'К HODL':>9} {'В ETH':>10}")
+    rows = sorted({round(i * (len(prices) - 1) / (GRID_SAMPLE_ROWS - 1)) for i in range(GRID_SAMPLE_ROWS)})
+    for i in rows:
+        print(f"{prices[i]:>12,.2f} {result.position_value[0, i]:>15,.2f} {result.hodl_value[0, i]:>15,.2f} "
+              f"{result.vs_hodl[0, i]:>+9.2%} {result.eth_balance[0, i]:>10.4f}")
+    print("-" * 50)
+    if len(breakevens):
+        print("Позиция равна HODL при курсе ETH: " + ", ".join(f"${p:,.2f}" for p in breakevens))
+    else:
+        print("Позиция не пересекает HODL в этом диапазоне цен")
+    print(f"Худшее отклонение от HODL: {summary['vs_hodl_min'][0]:+.2%} "
+          f"при ${summary['price_at_vs_hodl_min'][0]:,.2f}")
+    print(f"Минимум позиции в ETH: {summary['eth_balance_min'][0]:.4f} ETH "
+          f"при ${summary['price_at_eth_balance_min'][0]:,.2f}")
+    print(f"Расчет сетки: {elapsed * 1000:.1f} мс")
+
+def print_book_grid(entries, args):
+    """
+    Сценарный расчет всех позиций пакета одной матрицей (позиции x цены)
+    """
+    from price_grid import price_grid, summarize_book
+    
+    started = time.time()
+    prices = price_grid(args.eth_min, args.eth_max, args.grid)
+    summary, breakevens = summarize_book(prices, [e[1] for e in entries], [e[2] for e in entries],
+                                         [e[3] for e in entries], args.eth_initial)
+    elapsed = time.time() - started
+    
+    print(f"СЦЕНАРИИ ПАКЕТА ({len(entries)} позиций x {len(prices):,} цен, "
+          f"${args.eth_min:,.0f} - ${args.eth_max:,.0f}):")
+    print(f"{'Позиция':>10} {'Диапазон, $':>21} {'Мин. к HODL':>12} {'при, $':>10} "
+          f"{'Мин. в ETH':>11} {'Равно HODL при, $':>20}")
+    for row, (position_id, _, price_lower, price_upper) in enumerate(entries):
+        crossings = ", ".join(f"{p:,.0f}" for p in breakevens[row]) or '-'
+        print(f"{position_id:>10} {f'{price_lower:,.0f} - {price_upper:,.0f}':>21} "
+              f"{summary['vs_hodl_min'][row]:>+12.2%} {summary['price_at_vs_hodl_min'][row]:>10,.0f} "
+              f"{summary['eth_balance_min'][row]:>11.4f} {crossings:>20}")
+    print(f"Расчет сетки: {elapsed * 1000:.1f} мс")
+
+def open_history(args):
+    """
+    Хранилище истории по аргументам командной строки (None, если отключено или недоступно)
+    """
+    if args.no_history:
+        return None
+    try:
+        return HistoryStore(args.history_db)
+    except (sqlite3.Error, OSError) as e:
+        print(f"История значений недоступна ({args.history_db}): {e}")
+        return None
+
+def record_history(history, position_id, position_usd, eth_rate, args):
+    """
+    Добавляет значение позиции в историю
+    """
+    if history is None:
+        return
+    try:
+        history.append(position_id, position_usd, eth_rate, args.eth_initial, source=args.source)
+    except sqlite3.Error as e:
+        print(f"Не удалось записать историю позиции {position_id}: {e}")
+
+def print_history_report(position_ids, args):
+    """
+    Агрегаты истории по интервалам: OHLC размера позиции, диапазон позиции в ETH,
+    результат относительно HODL и максимальная просадка
+    """
+    try:
+        since = parse_duration(args.history_since)
+        bucket = parse_duration(args.history_bucket)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    if not os.path.exists(args.history_db):
+        print(f"История значений не найдена: {args.history_db}")
+        return
+    history = HistoryStore(args.history_db)
+    try:
+        position_ids = position_ids or history.positions()
+        if not position_ids:
+            print("История значений пуста")
+            return
+        # Начало периода на границе часа, чтобы агрегаты читались из часовой таблицы
+        start = (int(time.time()) - since) // 3600 * 3600
+        print(f"История значений ({args.history_db}) с {time.strftime('%Y-%m-%d %H:%M', time.localtime(start))}, "
+              f"интервал {args.history_bucket}")
+        for position_id in position_ids:
+            started = time.perf_counter()
+            bars = history.aggregate(position_id, bucket, start)
+            elapsed = time.perf_counter() - started
+            print("=" * 50)
+            if not bars:
+                print(f"Позиция {position_id}: нет значений за период")
+                continue
+            print(f"Позиция {position_id}: {sum(bar.count for bar in bars)} значений, запрос {elapsed * 1000:.1f} мс")
+            print(f"{'Начало':>16} {'Открытие, $':>13} {'Макс., $':>13} {'Мин., $':>13} {'Закрытие, $':>13} "
+                  f"{'ETH мин.':>10} {'ETH макс.':>10} {'К HODL мин., $':>15} {'К HODL макс., $':>16}")
+            peak = drawdown = 0.0
+            for bar in bars:
+                print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(bar.start)):>16} {bar.open:>13,.2f} "
+                      f"{bar.high:>13,.2f} {bar.low:>13,.2f} {bar.close:>13,.2f} {bar.eth_min:>10.4f} "
+                      f"{bar.eth_max:>10.4f} {bar.profit_min:>15,.2f} {bar.profit_max:>16,.2f}")
+                peak = max(peak, bar.high)
+                drawdown = min(drawdown, bar.low / peak - 1)
+            print(f"Позиция в ETH: {min(bar.eth_min for bar in bars):.4f} - {max(bar.eth_max for bar in bars):.4f} ETH")
+            print(f"Максимальная просадка размера позиции (по интервалам): {drawdown:.2%}")
+    finally:
+        history.close()
+
+def print_batch_summary(results, total_time):
+    """
+    Выводит сводную таблицу пакетного анализа и пропускную способность
+    """
+    succeeded = sum(1 for result in results if result['position_usd'] is not None and result['eth_rate'] is not None)
+    
+    print("ИТОГИ ПАКЕТА:")
+    print(f"{'Позиция':>10} {'Размер, $':>15} {'Курс ETH, $':>12} {'В ETH':>10} "
+          f"{'Время, с':>9} {'Ожидание, с':>12} {'WebDriver':>10} {'Уровень':>8}")
+    for result in results:
+        timings = (f"{result['elapsed']:>9.1f} {result['waited']:>12.1f} {result['webdriver_calls']:>10} "
+                   f"{result.get('tier') or '-':>8}")
+        if result['position_usd'] is None or result['eth_rate'] is None:
+            print(f"{result['position_id']:>10} {'ошибка':>15} {'-':>12} {'-':>10} {timings}")
+        else:
+            print(f"{result['position_id']:>10} {result['position_usd']:>15,.2f} {result['eth_rate']:>12,.2f} "
+                  f"{result['position_usd'] / result['eth_rate']:>10.4f} {timings}")
+    print("-" * 50)
+    print(f"Успешно: {succeeded} из {len(results)}")
+    tiers = Counter(result.get('tier') for result in results if result.get('tier'))
+    if tiers:
+        print("Ответили уровни: " + ", ".join(f"{name} {count}" for name, count in tiers.items()))
+    loads = [result['load'] for result in results if result.get('load')]
+    if loads:
+        load_times = [load.load_seconds for load in loads if load.load_seconds is not None]
+        peaks = [load.peak_rss_mb for load in loads if load.peak_rss_mb is not None]
+        print(f"Загрузка страниц (в среднем на позицию): запросов {sum(load.requests for load in loads) / len(loads):.0f}, "
+              f"заблокировано {sum(load.blocked for load in loads) / len(loads):.0f}, "
+              f"{sum(load.bytes for load in loads) / len(loads) / 1024:,.0f} КБ"
+              + (f", загрузка {sum(load_times) / len(load_times):.2f} с" if load_times else ""))
+        if peaks:
+            print(f"Пиковая память Chrome: до {max(peaks):,.0f} МБ на браузер (ср. --chrome-memory-mb)")
+    print(f"Общее время: {total_time:.1f} с")
+    if total_time > 0:
+        print(f"Пропускная способность: {len(results) / total_time * 60:.2f} позиций/мин")
+
+def report_batch_position(position_id, position_usd, eth_rate, args, oracle, history, grid_entries, stats):
+    """
+    Завершает обработку позиции пакета: курс через API, если он не найден на
+    странице, сравнение, запись в историю и параметры для сценарного расчета.
+    Возвращает итоговый курс ETH
+    """
+    if position_usd is not None and eth_rate is None:
+        print("Не удалось найти курс ETH на странице. Используем API...")
+        eth_rate = get_eth_price_from_api(oracle, stats.get('position_tokens', ()))
+    
+    if position_usd is None or eth_rate is None:
+        metrics.inc('positions', result='failed')
+        print(f"Не удалось получить данные позиции {position_id}")
+        return eth_rate
+    
+    metrics.inc('positions', result='ok')
+    print_comparison(position_usd, eth_rate, args.eth_initial)
+    record_history(history, position_id, position_usd, eth_rate, args)
+    if args.grid > 0:
+        params = grid_position_params(position_usd, eth_rate, args, stats)
+        if params is not None:
+            grid_entries.append((position_id,) + tuple(params))
+    return eth_rate
+
+def finish_batch(results, grid_entries, batch_start, args, oracle):
+    """
+    Сводная таблица, счетчики курсов и сценарный расчет портфеля
+    """
+    print_batch_summary(results, time.time() - batch_start)
+    print_oracle_stats(oracle)
+    if grid_entries:
+        print("=" * 50)
+        print_book_grid(grid_entries, args)
+
+def run_batch(position_ids, args, oracle, history=None, snapshots=None):
+    """
+    Анализирует несколько позиций подряд в одном запущенном браузере
+    (или через один JSON-RPC клиент для --source rpc)
+    """
+    print(f"Пакетный анализ {len(position_ids)} позиций Uniswap...")
+    print(f"Начальное количество ETH: {args.eth_initial}")
+    print(f"Диапазон поиска курса ETH: ${args.eth_min:,.0f} - ${args.eth_max:,.0f}")
+    print("=" * 50)
+    
+    results = []
+    grid_entries = []
+    batch_start = time.time()
+    
+    browser = rpc_client = None
+    if args.source == 'rpc':
+        rpc_client = create_rpc_client(args)
+    else:
+        # Запуск Chrome - самая дорогая часть, поэтому браузер один на весь пакет
+        # и запускается, только если какой-то позиции не хватило ответа HTTP
+        browser = LazyChromeDriver(**chrome_options(args))
+    try:
+        for index, position_id in enumerate(position_ids, 1):
+            print(f"[{index}/{len(position_ids)}] Позиция {position_id}")
+            started = time.time()
+            stats = {}
+            
+            position_usd, eth_rate = fetch_position_data(position_id, args, browser=browser,
+                                                         rpc_client=rpc_client, stats=stats, snapshots=snapshots)
+            eth_rate = report_batch_position(position_id, position_usd, eth_rate, args, oracle,
+                                             history, grid_entries, stats)
+            results.append({
+                'position_id': position_id,
+                'position_usd': position_usd,
+                'eth_rate': eth_rate,
+                'elapsed': time.time() - started,
+                'waited': sum(seconds for _, _, seconds in stats.get('waits', [])),
+                'webdriver_calls': stats.get('webdriver_calls', 0),
+                'tier': stats.get('tier'),
+                'load': stats.get('load'),
+            })
+            print("=" * 50)
+    finally:
+        if browser is not None:
+            browser.quit()
+        if rpc_client is not None:
+            close_rpc_client(rpc_client, args)
+    
+    finish_batch(results, grid_entries, batch_start, args, oracle)
+    return results
+
+def run_parallel_batch(position_ids, args, oracle, history=None, snapshots=None):
+    """
+    Анализирует позиции пакета в нескольких процессах, в каждом свой браузер.
+    С --fetch tiered страницы сначала запрашиваются по HTTP параллельно в основном
+    процессе, и в процессы с браузером уходят только позиции без данных в ответе.
+    Процессы с браузером пишут снимки страниц сами, если задан snapshots.
+    Прогресс выводится по мере готовности, а подробности и сравнения - в порядке
+    списка позиций
+    """
+    print(f"Параллельный пакетный анализ {len(position_ids)} позиций Uniswap...")
+    print(f"Начальное количество ETH: {args.eth_initial}")
+    print(f"Диапазон поиска курса ETH: ${args.eth_min:,.0f} - ${args.eth_max:,.0f}")
+    print("=" * 50)
+    
+    batch_start = time.time()
+    http_logs = {}
+    http_stats = {}
+    http_values = {}
+    browser_ids = list(position_ids)
+    if args.fetch != 'browser':
+        urls = [position_url_template(args).format(position=position_id) for position_id in position_ids]
+        pages = fetch_pages(urls, HTTP_TIMEOUT)
+        browser_ids = []
+        for position_id, url, page in zip(position_ids, urls, pages):
+            log = io.StringIO()
+            stats = {}
+            with redirect_stdout(log):
+                position_usd, eth_rate, found = try_http_tier(url, args, stats, page=page)
+            http_logs[position_id] = log.getvalue()
+            http_stats[position_id] = stats
+            http_values[position_id] = (position_usd, eth_rate)
+            if not found and args.fetch != 'http':
+                browser_ids.append(position_id)
+        print(f"Уровень HTTP: данные найдены для {len(position_ids) - len(browser_ids)} из {len(position_ids)} "
+              f"позиций за {time.time() - batch_start:.1f} с")
+    
+    task_results = []
+    if browser_ids:
+        task_results = run_browser_workers(browser_ids, args, snapshots is not None)
+    browser_results = dict(zip(browser_ids, task_results))
+    tier = 'network' if args.network_capture else 'browser'
+    print("=" * 50)
+    
+    results = []
+    grid_entries = []
+    for index, position_id in enumerate(position_ids, 1):
+        print(f"[{index}/{len(position_ids)}] Позиция {position_id}")
+        stats = http_stats.get(position_id, {})
+        print(http_logs.get(position_id, ''), end='')
+        position_usd, eth_rate = http_values.get(position_id, (None, None))
+        result = None
+        if position_id in browser_results:
+            result = browser_results[position_id]
+            if result is None:
+                print("Позиция не обработана")
+                position_usd = eth_rate = None
+            else:
+                print(result.log, end='')
+                position_usd, eth_rate = result.position_usd, result.eth_rate
+                found = position_usd is not None and eth_rate is not None
+                record_tier(stats, tier, found, result.elapsed)
+            stats['tier'] = tier
+        if stats.get('tiers'):
+            print(f"Уровни: {format_tiers(stats)}")
+        eth_rate = report_batch_position(position_id, position_usd, eth_rate, args, oracle,
+                                         history, grid_entries, stats)
+        results.append({
+            'position_id': position_id,
+            'position_usd': position_usd,
+            'eth_rate': eth_rate,
+            'elapsed': sum(seconds for _, _, seconds in stats.get('tiers', [])),
+            'waited': result.waited if result else 0.0,
+            'webdriver_calls': result.webdriver_calls if result else 0,
+            'tier': stats.get('tier'),
+            'load': result.load if result else None,
+        })
+        print("=" * 50)
+    
+    finish_batch(results, grid_entries, batch_start, args, oracle)
+    return results
+
+def run_browser_workers(position_ids, args, capture_snapshots=False):
+    """
+    Обрабатывает позиции в процессах с браузером (parallel_batch.run_parallel) и
+    выводит прогресс по мере готовности. capture_snapshots - сохранять снимки
+    страниц в процессах. Возвращает список TaskResult
+    """
+    workers, memory_limit = plan_workers(len(position_ids), args.workers, args.chrome_memory_mb)
+    print(f"Позиций для браузера: {len(position_ids)}, процессов с браузером: {workers}"
+          + (f" (по свободной памяти не больше {memory_limit})" if memory_limit is not None else ""))
+    completed = 0
+    
+    def on_result(result, retry):
+        nonlocal completed
+        # Замеры фаз процесса с браузером - в общий реестр
+        metrics.merge(result.metrics)
+        if retry:
+            print(f"Позиция {result.position_id}: страница ошибки (попытка {result.attempt}), "
+                  f"позиция возвращена в очередь")
+            return
+        completed += 1
+        state = "готово" if result.position_usd is not None else "нет данных"
+        print(f"[{completed}/{len(position_ids)}] Позиция {result.position_id}: {state} "
+              f"(процесс {result.worker}, {result.elapsed:.1f} с)")
+    
+    return run_parallel(position_ids, position_url_template(args), args.eth_min, args.eth_max,
+                        args.timeout, workers, retries=args.retries, on_result=on_result,
+                        driver_options=chrome_options(args), tracing=metrics.tracing,
+                        snapshot_options=snapshot_options(args) if capture_snapshots else None)
+
+def refresh_position(position_id, args, oracle, browser=None, rpc_client=None, snapshots=None):
+    """
+    Одно обновление позиции в режиме наблюдения. Подробный вывод извлечения
+    перехватывается, чтобы печатать только изменения. Возвращает
+    (position_usd, eth_rate, причина неудачи или None)
+    """
+    log = io.StringIO()
+    stats = {}
+    with redirect_stdout(log):
+        position_usd, eth_rate = fetch_position_data(position_id, args, browser=browser, rpc_client=rpc_client,
+                                                     stats=stats, snapshots=snapshots)
+        if position_usd is not None and eth_rate is None:
+            eth_rate = get_eth_price_from_api(oracle, stats.get('position_tokens', ()))
+    if position_usd is not None and eth_rate is not None:
+        return position_usd, eth_rate, None
+    return position_usd, eth_rate, failure_reason(stats, position_usd)
+
+def failure_reason(stats, position_usd):
+    """
+    Причина неудачного извлечения для вывода: ошибка, записанная извлечением в
+    stats['error'], страница ошибки или ненайденное значение
+    """
+    if stats.get('error'):
+        return stats['error']
+    if stats.get('error_page'):
+        return "страница ошибки"
+    if position_usd is None:
+        return "размер позиции не найден"
+    return "курс ETH не найден ни на странице, ни через API"
+
+def run_watch(position_specs, args, oracle, history=None, snapshots=None):
+    """
+    Режим наблюдения: браузер (или JSON-RPC клиент) запущен все время работы,
+    каждая позиция обновляется со своим интервалом, выводятся только изменения
+    и пересечения порогов. После ошибки обновление повторяется с нарастающей задержкой
+    """
+    watches = {}
+    schedule = WatchSchedule()
+    started = time.time()
+    for position_id, interval in position_specs:
+        if position_id not in watches:
+            watches[position_id] = PositionWatch(position_id, interval)
+            schedule.add(position_id, started)
+    
+    print(f"Наблюдение за {len(watches)} позициями Uniswap (Ctrl+C - остановка)...")
+    for watch in watches.values():
+        print(f"Позиция {watch.position_id}: обновление каждые {watch.interval:g} с")
+    print(f"Начальное количество ETH: {args.eth_initial}")
+    print("=" * 50)
+    
+    # SIGTERM (systemd, docker stop) завершает наблюдение так же, как Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    browser = LazyChromeDriver(**chrome_options(args)) if args.source == 'web' else None
+    rpc_client = None
+    try:
+        while True:
+            due, position_id = schedule.pop()
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            watch = watches[position_id]
+            
+            if args.source == 'rpc':
+                if rpc_client is None:
+                    # Без записи ответов: за дни работы запись росла бы без ограничений
+                    rpc_client = RpcClient(args.rpc_url)
+            elif browser.page_loads >= args.recycle_after:
+                # Браузер запускается при первой позиции, которой не хватило ответа HTTP
+                browser.quit()
+            
+            try:
+                with metrics.span('refresh'):
+                    position_usd, eth_rate, reason = refresh_position(position_id, args, oracle, browser=browser,
+                                                                      rpc_client=rpc_client, snapshots=snapshots)
+            except Exception as e:
+                # Любая ошибка обновления (упавший драйвер, ошибка разбора) - неудачное
+                # обновление этой позиции, а не остановка наблюдения за всеми
+                metrics.inc('refresh_error', error=type(e).__name__)
+                position_usd = eth_rate = None
+                reason = f"{type(e).__name__}: {e}"
+                rpc_client = None
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            if position_usd is None or eth_rate is None:
+                metrics.inc('positions', result='failed')
+                retry = watch.fail()
+                print(f"[{stamp}] Позиция {position_id}: ошибка обновления ({watch.failures} подряд): "
+                      f"{reason}; повтор через {retry:.0f} с")
+                schedule.add(position_id, time.time() + retry)
+                if browser is not None:
+                    # Браузер мог зависнуть или упасть - следующая загрузка в новом
+                    browser.quit()
+                continue
+            
+            metrics.inc('positions', result='ok')
+            record_history(history, position_id, position_usd, eth_rate, args)
+            for line in watch.update(position_usd, eth_rate, args.eth_initial):
+                print(f"[{stamp}] {line}")
+            next_due = due + watch.interval
+            schedule.add(position_id, next_due if next_due > time.time() else time.time() + watch.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if browser is not None:
+            browser.quit()
+        print("=" * 50)
+        print(f"Наблюдение остановлено через {time.time() - started:.0f} с")
+        for watch in watches.values():
+            print(f"Позиция {watch.position_id}: обновлений {watch.updates}, изменений {watch.changes}")
+        print_oracle_stats(oracle)
+
+def list_html_files(path):
+    """
+    Список сохраненных страниц: сам файл, снимки папки --debug-dir (по индексу)
+    или все .html/.htm/.html.gz файлы папки по алфавиту
+    """
+    if not os.path.isdir(path):
+        return [path]
+    if os.path.exists(os.path.join(path, SNAPSHOT_INDEX)):
+        return list_snapshots(path)
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if name.lower().endswith(('.html', '.htm', '.html.gz')))
+
+def run_from_html(path, args):
+    """
+    Офлайн-разбор сохраненных страниц: извлечение и сравнения без Selenium и сети
+    """
+    html_files = list_html_files(path)
+    if not html_files:
+        print(f"В {path} не найдено сохраненных страниц (.html, .html.gz)")
+        return []
+    
+    print(f"Разбор сохраненных страниц: {len(html_files)}")
+    print(f"Начальное количество ETH: {args.eth_initial}")
+    print(f"Диапазон поиска курса ETH: ${args.eth_min:,.0f} - ${args.eth_max:,.0f}")
+    print("=" * 50)
+    
+    results = []
+    batch_start = time.time()
+    for index, file_path in enumerate(html_files, 1):
+        print(f"[{index}/{len(html_files)}] Файл {file_path}")
+        started = time.time()
+        
+        snapshot = snapshot_from_html(read_html(file_path))
+        if snapshot.is_error_page():
+            print("Сохранена страница ошибки")
+        result = extract_from_page_snapshot(snapshot, args.eth_min, args.eth_max)
+        count_sources('html', result.position_source, result.rate_source)
+        
+        results.append({
+            'position_id': os.path.basename(file_path),
+            'position_usd': result.position_usd,
+            'eth_rate': result.eth_rate,
+            'elapsed': time.time() - started,
+            'waited': 0.0,
+            'webdriver_calls': 0,
+        })
+        
+        print("-" * 50)
+        if result.position_usd is None:
+            print("Не удалось извлечь данные о позиции из сохраненной страницы.")
+        elif result.eth_rate is None:
+            print("Не удалось найти курс ETH в сохраненной странице.")
+        else:
+            print_comparison(result.position_usd, result.eth_rate, args.eth_initial)
+            if args.grid > 0:
+                params = grid_position_params(result.position_usd, result.eth_rate, args)
+                if params is not None:
+                    print("-" * 50)
+                    print_price_grid(params, result.eth_rate, args)
+        print("=" * 50)
+    
+    if len(results) > 1:
+        print_batch_summary(results, time.time() - batch_start)
+    return results
+
+def analyze_position(args, oracle, history=None, snapshots=None):
+    """
+    Анализ одной позиции --position
+    """
     print("Анализ позиции Uniswap...")
-    print(f"URL: {url}")
+    if args.source == 'rpc':
+        print(f"Позиция: {args.position} (JSON-RPC: {args.rpc_url})")
+    else:
+        # URL позиции Uniswap
+        print(f"URL: {position_url_template(args).format(position=args.position)}")
     print(f"Начальное количество ETH: {args.eth_initial}")
     print(f"Диапазон поиска курса ETH: ${args.eth_min:,.0f} - ${args.eth_max:,.0f}")
     print("-" * 50)
     
-    # Извлекаем данные с помощью Selenium
-    position_usd, eth_rate = extract_position_data_selenium(url, args.eth_min, args.eth_max)
+    # Извлекаем данные из выбранного источника
+    rpc_client = create_rpc_client(args) if args.source == 'rpc' else None
+    stats = {}
+    position_usd, eth_rate = fetch_position_data(args.position, args, rpc_client=rpc_client, stats=stats,
+                                                 snapshots=snapshots)
+    if rpc_client is not None:
+        close_rpc_client(rpc_client, args)
+    
+    if position_usd is None and args.source == 'rpc':
+        print("Не удалось получить данные о позиции через JSON-RPC.")
+        return
     
     # Если не удалось найти курс ETH на странице, используем API
     if eth_rate is None:
         print("Не удалось найти курс ETH на странице. Используем API...")
-        eth_rate = get_eth_price_from_api()
+        eth_rate = get_eth_price_from_api(oracle, stats.get('position_tokens', ()))
+        print_oracle_stats(oracle)
     
+    metrics.inc('positions', result='ok' if position_usd is not None and eth_rate is not None else 'failed')
     if position_usd is None:
         print("Не удалось извлечь данные о позиции с веб-страницы.")
         print("Возможные причины:")
         print("1. Страница требует JavaScript для загрузки данных")
         print("2. Изменилась структура страницы")
         print("3. Проблемы с сетевым подключением")
-        print("4. Проверьте файл debug_page.html для анализа структуры страницы")
+        print(f"4. Проверьте снимки страниц в {args.debug_dir} ({SNAPSHOT_INDEX}; разбор: --from-html {args.debug_dir})")
         return
     
     if eth_rate is None:
         print("Не удалось получить курс ETH ни с веб-страницы, ни через API.")
         return
     
-    print(f"Размер позиции: ${position_usd:,.2f}")
-    print(f"Курс ETH: ${eth_rate:,.2f}")
-    print("-" * 50)
+    print_comparison(position_usd, eth_rate, args.eth_initial)
+    record_history(history, args.position, position_usd, eth_rate, args)
     
-    # Вычисления
-    current_eth_value = args.eth_initial * eth_rate
-    current_position_in_eth = position_usd / eth_rate
+    if args.grid > 0:
+        params = grid_position_params(position_usd, eth_rate, args, stats)
+        if params is not None:
+            print("-" * 50)
+            print_price_grid(params, eth_rate, args)
+
+def write_profile(path):
+    """
+    Записывает трассировку --profile и выводит сводку по фазам
+    """
+    try:
+        metrics.write_trace(path)
+    except OSError as e:
+        print(f"Не удалось записать трассировку {path}: {e}")
+        return
+    print("=" * 50)
+    print(f"Трассировка фаз сохранена в {path}")
+    if metrics.dropped_events:
+        print(f"Старых событий отброшено: {metrics.dropped_events} (хранятся последние {metrics.max_events})")
+    print(f"{'Фаза':<22} {'Число':>6} {'Всего, с':>10} {'Среднее, с':>11}")
+    for name, entry in sorted(metrics.summary().items(), key=lambda item: -item[1]['total']):
+        print(f"{name:<22} {entry['count']:>6} {entry['total']:>10.3f} {entry['mean']:>11.3f}")
+
+def main():
+    """
+    Основная функция скрипта
+    """
+    # Парсим аргументы командной строки
+    args = parse_arguments()
+    if args.grid > 0 and args.eth_min <= 0:
+        print(f"Ошибка: для --grid минимальный курс ETH (--eth_min) должен быть больше 0, задано {args.eth_min:g}")
+        return
+    if args.profile:
+        metrics.enable_tracing()
     
-    # Вывод результатов сравнения
-    print("СРАВНЕНИЕ 1:")
-    print(f"Текущая стоимость начального эфира: ${current_eth_value:,.2f}")
-    print(f"Текущее значение позиции: ${position_usd:,.2f}")
-    print("-" * 50)
+    # Офлайн-разбор сохраненных страниц без браузера
+    if args.from_html:
+        with metrics.span('run', mode='from_html'):
+            run_from_html(args.from_html, args)
+        if args.profile:
+            write_profile(args.profile)
+        return
     
-    print("СРАВНЕНИЕ 2:")
-    print(f"Начальное вложение эфира: {args.eth_initial} ETH")
-    print(f"Текущее значение позиции в эфирах: {current_position_in_eth:.4f} ETH")
-    print("-" * 50)
+    # Пакетный режим: несколько позиций в одном браузере
+    position_specs = []
+    if args.positions:
+        position_specs.extend(split_position_ids(args.positions))
+    if args.positions_file:
+        position_specs.extend(read_positions_file(args.positions_file))
+    try:
+        position_specs = [parse_position_spec(spec, args.interval)
+                          for spec in position_specs or ([args.position] if args.watch else [])]
+        oracle = create_oracle(args)
+        snapshots = create_snapshot_writer(args)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    position_ids = [position_id for position_id, _ in position_specs]
+    if args.history_report:
+        print_history_report(position_ids, args)
+        return
     
-    # Дополнительный анализ
-    if current_eth_value > position_usd:
-        print(f"Позиция показывает убыток: ${current_eth_value - position_usd:,.2f}")
-    else:
-        print(f"Позиция показывает прибыль: ${position_usd - current_eth_value:,.2f}")
+    if args.metrics_port is not None:
+        try:
+            start_metrics_server(args.metrics_port)
+            print(f"Метрики: http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            print(f"Не удалось открыть порт метрик {args.metrics_port}: {e}")
     
-    if current_position_in_eth > args.eth_initial:
-        print(f"Позиция в ETH показывает рост: +{current_position_in_eth - args.eth_initial:.4f} ETH")
-    else:
-        print(f"Позиция в ETH показывает падение: {current_position_in_eth - args.eth_initial:.4f} ETH")
+    history = open_history(args)
+    try:
+        if args.watch:
+            with metrics.span('run', mode='watch'):
+                run_watch(position_specs, args, oracle, history, snapshots)
+        elif position_ids and args.source == 'web' and args.workers != 1:
+            with metrics.span('run', mode='parallel'):
+                run_parallel_batch(position_ids, args, oracle, history, snapshots)
+        elif position_ids:
+            with metrics.span('run', mode='batch'):
+                run_batch(position_ids, args, oracle, history, snapshots)
+        else:
+            with metrics.span('run', mode='single'):
+                analyze_position(args, oracle, history, snapshots)
+    finally:
+        if history is not None:
+            history.close()
+        close_snapshot_writer(snapshots)
+        if args.profile:
+            write_profile(args.profile)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file